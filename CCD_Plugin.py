@@ -35,6 +35,8 @@ class CCD_Plugin:
     """QGIS Plugin Implementation."""
 
     inst: ClassVar[dict] = {}
+    # the Processing provider is one per QGIS session, however many instances there are
+    provider: ClassVar = None
 
     def __init__(self, iface):
         """Constructor.
@@ -84,7 +86,18 @@ class CCD_Plugin:
         # noinspection PyTypeChecker,PyArgumentList,PyCallByClass
         return QCoreApplication.translate("CCD_Plugin", message)
 
+    def initProcessing(self):
+        """Register the CCD algorithms; QGIS calls this on its own for qgis_process."""
+        from CCD_Plugin.processing_provider.provider import CcdProvider
+        from qgis.core import QgsApplication
+
+        # the registry refuses a second "ccd" provider, so only the first instance registers one
+        if CCD_Plugin.provider is None:
+            CCD_Plugin.provider = CcdProvider()
+            QgsApplication.processingRegistry().addProvider(CCD_Plugin.provider)
+
     def initGui(self):
+        self.initProcessing()
         # Main widget menu
         # Create action that will start plugin configuration
         icon_path = ":/plugins/CCD_Plugin/icons/ccd_plugin.svg"
@@ -184,6 +197,16 @@ class CCD_Plugin:
             self.widget = None
         self.pluginIsActive = False
         CCD_Plugin.inst.pop(self.id, None)
+        # the worker pool, the HTTP connections and the Processing provider are shared by every
+        # instance, so they go with the last
+        if not CCD_Plugin.inst:
+            from CCD_Plugin.core.gee_session import reset_session
+            from qgis.core import QgsApplication
+
+            if CCD_Plugin.provider is not None:
+                QgsApplication.processingRegistry().removeProvider(CCD_Plugin.provider)
+                CCD_Plugin.provider = None
+            reset_session()
 
     def removes_temporary_files(self):
         # the CCD cache holds the whole time series and coefficient set per entry, and the module
@@ -0,0 +1,545 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+
+Running CCD over many points, for the vector-layer batch mode.
+
+A batch task splits its points among subtasks, each of which runs its share through run_points;
+the task then writes the summaries back to the layer. Points are planned into clusters of
+neighbours first (plan_clusters): a cluster's first point goes through compute_ccd, its neighbours
+reuse that point's collection and native grid in one multi-point request, and points sharing a
+native pixel are computed once for all of them (collapse_pixels). Results land in the results
+cache either way, so points already there cost nothing and each new one is left there for the
+plot. Runs without a task manager go through run_parallel, or run_pipeline, which streams a run
+of any size through bounded stages. Nothing here touches Qt.
+"""
+
+import concurrent.futures
+import queue
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Final
+
+import numpy as np
+
+from .ccd_process import (
+    CCDComputationError,
+    FetchedPoints,
+    compute_ccd,
+    fetch_ccd_points,
+    lookup_grid,
+    lookup_result,
+    make_cache_key,
+    resolve_ccd_bands,
+    resolve_computed_indices,
+    store_ccd_points,
+)
+from .diagnostics import RunDiagnostics
+from .gee_quota import Priority
+from .gee_session import batch_limit
+from .pixel_grid import pixel_of, utm_xy, utm_zone, zone_of
+from .plot_data import CONFIRMED_CHANGE_PROBABILITY, CcdcResult
+
+# Attributes a batch run writes to each feature. Names stay within the 10 characters a shapefile
+# allows, so the run works on any writable point layer.
+BATCH_FIELDS: Final = (
+    ("ccd_segs", int),  # model segments fitted
+    ("ccd_breaks", int),  # confirmed breaks
+    ("ccd_dates", str),  # confirmed break dates, ISO, ";"-separated
+    ("ccd_probs", str),  # change probability at the end of each segment, ";"-separated
+    ("ccd_maxpr", float),  # highest change probability, a change still pending included
+    ("ccd_status", str),  # empty, or why the point has no result
+)
+FIELD_SEPARATOR: Final = ";"
+# Side of the UTM cells points are clustered in. A cluster shares one collection of the scenes over
+# any of its points and the grid of its first point; scenes are far wider (Landsat ~185 km,
+# Sentinel-2 110 km), so at this size nearly every cluster sits on one or two scenes a day.
+CLUSTER_CELL_METERS: Final = 10_000
+# Points fetched in one multi-point request; the response of a long series grows with each one
+MAX_CLUSTER_POINTS: Final = 25
+# Clusters each queue of run_pipeline holds per fetch worker before the stage feeding it waits
+PIPELINE_QUEUE_CLUSTERS: Final = 2
+
+
+def iso_date(milliseconds):
+    """The UTC day of a unix-milliseconds time, as YYYY-MM-DD."""
+    return datetime.fromtimestamp(milliseconds / 1000, tz=UTC).date().isoformat()
+
+
+def summarize(ccdc_info) -> dict:
+    """The BATCH_FIELDS attributes of one CCDC result, as compute_ccd returns it."""
+    result = CcdcResult.of(ccdc_info)
+    segments = int(np.isfinite(result.t_start).sum())
+    probabilities = result.change_prob[:segments]
+    # tBreak is 0 on a segment that simply ended; only a confirmed change is a break
+    confirmed = (result.t_break[:segments] > 0) & (probabilities >= CONFIRMED_CHANGE_PROBABILITY)
+    break_dates = [iso_date(moment) for moment in result.t_break[:segments][confirmed]]
+    known = probabilities[np.isfinite(probabilities)]
+    return {
+        "ccd_segs": segments,
+        "ccd_breaks": len(break_dates),
+        "ccd_dates": FIELD_SEPARATOR.join(break_dates),
+        "ccd_probs": FIELD_SEPARATOR.join("" if not np.isfinite(p) else f"{p:g}" for p in probabilities),
+        "ccd_maxpr": float(known.max()) if known.size else None,
+        "ccd_status": "",
+    }
+
+
+def failed(message) -> dict:
+    """The attributes of a point that has no result, saying why."""
+    return {
+        "ccd_segs": None,
+        "ccd_breaks": None,
+        "ccd_dates": "",
+        "ccd_probs": "",
+        "ccd_maxpr": None,
+        "ccd_status": message,
+    }
+
+
+def plan_clusters(points, cell_meters=CLUSTER_CELL_METERS, max_points=MAX_CLUSTER_POINTS) -> list:
+    """(feature_id, (lon, lat)) `points` grouped into clusters of neighbours, to be computed together.
+
+    Points are grouped by UTM zone and a `cell_meters` square cell within it, so a cluster never
+    straddles a zone or a hemisphere, then ordered north-west to south-east and cut into runs of at
+    most `max_points`. Clusters come in the order their first point appears.
+    """
+    cells = OrderedDict()
+    for point in points:
+        lon, lat = point[1]
+        zone, southern = zone_of(lon, lat)
+        x, y = utm_xy(lon, lat, zone, southern)
+        cells.setdefault((zone, southern, x // cell_meters, y // cell_meters), []).append((-y, x, point))
+    clusters = []
+    for members in cells.values():
+        ordered = [point for _, _, point in sorted(members, key=lambda member: member[:2])]
+        clusters.extend(ordered[start : start + max_points] for start in range(0, len(ordered), max_points))
+    return clusters
+
+
+def collapse_pixels(points, grid=None) -> list:
+    """`points` grouped by the native pixel of `grid` they fall in: [(coords, [feature_id, ...]), ...].
+
+    The coords of a group are its first point's, which is the one computed for all of them. With
+    no grid, or a grid in a CRS other than UTM, only points at identical coordinates are grouped.
+    """
+    zone = utm_zone(grid["crs"]) if grid else None
+    groups = OrderedDict()
+    for feature_id, coords in points:
+        coords = tuple(coords)
+        pixel = pixel_of(*utm_xy(*coords, *zone), grid["crsTransform"]) if zone else coords
+        groups.setdefault(pixel, (coords, []))[1].append(feature_id)
+    return list(groups.values())
+
+
+def split_points(points, parts):
+    """`points` split into at most `parts` non-empty shares, one per subtask, keeping clusters whole.
+
+    Each cluster of plan_clusters goes, largest first, to the share with the fewest points so far,
+    so a cluster's multi-point request is made once and the shares stay about even. Neighbouring
+    clusters still land in different shares, spreading one busy area across the subtasks.
+    """
+    clusters = sorted(plan_clusters(points), key=len, reverse=True)
+    shares = [[] for _ in range(max(1, min(int(parts), len(clusters))))] if clusters else []
+    for cluster in clusters:
+        min(shares, key=len).extend(cluster)
+    return shares
+
+
+class BatchProgress:
+    """How far a batch run has got, and when it should finish; updated from every subtask."""
+
+    def __init__(self, total: int, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self._clock = clock
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.cached = 0
+        self.started = clock()
+
+    def advance(self, failed: bool = False, cached: bool = False) -> None:
+        with self._lock:
+            self.done += 1
+            self.failed += failed
+            self.cached += cached
+
+    @property
+    def percent(self) -> float:
+        return 100.0 * self.done / self.total if self.total else 100.0
+
+    def eta_seconds(self) -> float | None:
+        """Seconds left at the pace so far, or None before the first point has finished."""
+        with self._lock:
+            if not self.done:
+                return None
+            elapsed = self._clock() - self.started
+            return elapsed / self.done * (self.total - self.done)
+
+    def summary(self) -> str:
+        eta = self.eta_seconds()
+        parts = [f"{self.done} of {self.total} points"]
+        if self.cached:
+            parts.append(f"{self.cached} from the cache")
+        if self.failed:
+            parts.append(f"{self.failed} without a result")
+        if eta is not None and self.done < self.total:
+            minutes, seconds = divmod(round(eta), 60)
+            parts.append(f"about {minutes} min {seconds:02d} s left" if minutes else f"about {seconds} s left")
+        return ", ".join(parts)
+
+
+def ccd_settings(config) -> dict:
+    """The compute_ccd arguments the dock's `config` sets, shared by every point of a run."""
+    return {
+        "date_range": (config["start_date"], config["end_date"]),
+        "doy_range": (config["start_doy"], config["end_doy"]),
+        "dataset": config["dataset"],
+        "breakpoint_bands": config["breakpoint_bands"],
+        "tmask_bands": config.get("tmask_bands"),
+        "num_obs": config["num_obs"],
+        "chi_square": config["chi_square"],
+        "min_years": config["min_years"],
+        "lambda_lasso": config["lambda_lasso"],
+        "cloud_filter": config["cloud_filter"],
+        "plot_band": config["band_or_index_to_plot"],
+    }
+
+
+def cache_key(coords, settings):
+    """make_cache_key of the point at `coords` under ccd_settings' `settings`."""
+    return make_cache_key(
+        coords,
+        settings["date_range"],
+        settings["doy_range"],
+        settings["dataset"],
+        settings["breakpoint_bands"],
+        num_obs=settings["num_obs"],
+        chi_square=settings["chi_square"],
+        min_years=settings["min_years"],
+        lambda_lasso=settings["lambda_lasso"],
+        tmask_bands=settings["tmask_bands"],
+        cloud_filter=settings["cloud_filter"],
+    )
+
+
+def _is_cached(coords, settings) -> bool:
+    key = cache_key(coords, settings)
+    _, tmask_bands = resolve_ccd_bands(settings["breakpoint_bands"], settings["tmask_bands"])
+    indices = resolve_computed_indices(settings["breakpoint_bands"], settings["plot_band"], tmask_bands)
+    return lookup_result(key, indices) is not None
+
+
+def _compute_point(coords, settings, cancelled):
+    """(computed, attributes, cached) for one point; computed None with the error in attributes."""
+    diagnostics = RunDiagnostics()
+    try:
+        computed = compute_ccd(
+            coords=coords,
+            **settings,
+            cancelled=cancelled,
+            diagnostics=diagnostics,
+            priority=Priority.BATCH,
+        )
+    # one bad point (no images there, a request that kept failing) must not lose the rest
+    except Exception as error:
+        return None, failed(str(error)), False
+    if computed is None:
+        return None, None, False
+    return computed, summarize(computed[0]), bool(diagnostics.counters.get("cache_hits"))
+
+
+@dataclass(frozen=True, slots=True)
+class _ClusterFetch:
+    """What the requests for one cluster brought back, before it is parsed and handed out."""
+
+    pixels: list  # collapse_pixels of the cluster
+    resolved: dict  # coords: _compute_point outcome, for every pixel `fetched` does not hold
+    fetched: FetchedPoints | None
+
+
+def _fetch_cluster(cluster, settings, cancelled) -> _ClusterFetch | None:
+    """Run the requests for `cluster`, or None on cancel.
+
+    The first point goes through compute_ccd; the native grid it was sampled on then collapses the
+    cluster to one point per pixel, and the pixels not cached yet are fetched in one
+    fetch_ccd_points on that grid. Every other pixel goes through compute_ccd here as well - a
+    cache hit, or a run of its own when the first point has no result - so every request of the
+    cluster is made under the caller's batch_limit slot and parsing it makes none.
+    """
+    anchor = tuple(cluster[0][1])
+    first = _compute_point(anchor, settings, cancelled)
+    if first[1] is None:
+        return None
+    grid = lookup_grid(cache_key(anchor, settings))
+    pixels = collapse_pixels(cluster, grid if first[0] is not None else None)
+    fetched = None
+    if grid is not None and first[0] is not None:
+        filled = [coords for coords, _ in pixels[1:] if not _is_cached(coords, settings)]
+        if filled:
+            fetched = fetch_ccd_points(
+                filled,
+                grid,
+                **settings,
+                cancelled=cancelled,
+                priority=Priority.BATCH,
+            )
+    held = set(fetched.points) if fetched is not None else set()
+    resolved = {anchor: first}
+    for coords, _ in pixels:
+        if coords in held or coords in resolved:
+            continue
+        resolved[coords] = _compute_point(coords, settings, cancelled)
+        if resolved[coords][1] is None:
+            return None
+    return _ClusterFetch(pixels, resolved, fetched)
+
+
+def _finish_cluster(fetch: _ClusterFetch, cancelled):
+    """Yield (feature_ids, computed, attributes, cached) for each pixel of a fetched cluster, None on cancel.
+
+    The multi-point responses are parsed into the results cache and each pixel they held is given
+    its result, or the reason it has none; the other pixels were resolved by _fetch_cluster.
+    """
+    parsed = {}
+    if fetch.fetched is not None:
+        results = store_ccd_points(fetch.fetched, cancelled)
+        if results is None:
+            yield None
+            return
+        parsed = dict(zip(fetch.fetched.points, results, strict=True))
+    for coords, feature_ids in fetch.pixels:
+        result = parsed.get(coords)
+        if result is None:
+            yield feature_ids, *fetch.resolved[coords]
+        elif isinstance(result, CCDComputationError):
+            yield feature_ids, None, failed(str(result)), False
+        else:
+            yield feature_ids, result, summarize(result[0]), False
+
+
+def _deliver(outcome, progress: BatchProgress, on_result, results=None) -> None:
+    """Hand one pixel's outcome of _finish_cluster to every feature in it."""
+    feature_ids, computed, attributes, cached = outcome
+    for feature_id in feature_ids:
+        if results is not None:
+            results[feature_id] = attributes
+        progress.advance(failed=computed is None, cached=cached)
+        if on_result is not None:
+            on_result(feature_id, attributes, computed)
+
+
+def run_points(
+    points,
+    config,
+    progress: BatchProgress,
+    cancelled: Callable[[], bool] = lambda: False,
+    on_result: Callable | None = None,
+) -> dict:
+    """Compute CCD at each (feature_id, (lon, lat)) of `points` under the dock's `config`.
+
+    Returns {feature_id: attributes} for the points that finished before a cancel. Points are run a
+    cluster at a time (plan_clusters), each cluster holding a batch_limit slot and queueing its
+    requests in the batch lane, so however many subtasks there are, the run stays within the batch
+    concurrency and behind interactive picks. Features in one native pixel share one result. A point
+    that fails is recorded with its error and the run goes on. `on_result` is called with
+    (feature_id, attributes, computed) as each point finishes, computed None for a failed one.
+    """
+    settings = ccd_settings(config)
+    results = {}
+    for cluster in plan_clusters(points):
+        with batch_limit.slot(cancelled) as acquired:
+            if not acquired:
+                break
+            fetch = _fetch_cluster(cluster, settings, cancelled)
+            for outcome in [None] if fetch is None else _finish_cluster(fetch, cancelled):
+                if outcome is None:
+                    return results
+                _deliver(outcome, progress, on_result, results)
+    return results
+
+
+def run_parallel(
+    points,
+    config,
+    progress: BatchProgress,
+    parts: int,
+    cancelled: Callable[[], bool] = lambda: False,
+    on_result: Callable | None = None,
+    on_wait: Callable[[], None] | None = None,
+    wait_seconds: float = 0.5,
+) -> dict:
+    """run_points over `points` split into `parts` shares, each on its own thread.
+
+    For the callers without a task manager to run the shares (Processing, the command line). The
+    shares get threads of their own, not the shared pool: their compute_ccd calls submit their
+    requests to that pool, and waiting on it from inside it could take every worker. `on_wait` is
+    called every `wait_seconds` until all shares finish, to report progress.
+    """
+    results = {}
+    shares = split_points(points, parts)
+    if not shares:
+        return results
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(shares)) as pool:
+        futures = [pool.submit(run_points, share, config, progress, cancelled, on_result) for share in shares]
+        pending = set(futures)
+        while pending:
+            _, pending = concurrent.futures.wait(pending, timeout=wait_seconds)
+            if on_wait is not None:
+                on_wait()
+        for future in futures:
+            results.update(future.result())
+    return results
+
+
+class _Pipeline:
+    """The bounded queues between the stages of run_pipeline, and a stop any stage can pull."""
+
+    def __init__(self, cancelled: Callable[[], bool], wait_seconds: float):
+        self.cancelled = cancelled
+        self.wait_seconds = wait_seconds
+        self.stopped = threading.Event()
+        self.error = None
+
+    def halted(self) -> bool:
+        return self.stopped.is_set() or self.cancelled()
+
+    def put(self, channel: queue.Queue, item) -> bool:
+        """Queue `item`, waiting while `channel` is full; False if the run halted first."""
+        while not self.halted():
+            try:
+                channel.put(item, timeout=self.wait_seconds)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, channel: queue.Queue):
+        """The next item of `channel`, or None if the run halted first."""
+        while not self.halted():
+            try:
+                return channel.get(timeout=self.wait_seconds)
+            except queue.Empty:
+                continue
+        return None
+
+    def thread(self, work: Callable[[], None]) -> threading.Thread:
+        def run():
+            try:
+                work()
+            # a stage that dies would leave the others waiting on it
+            except BaseException as error:
+                self.error = error
+                self.stopped.set()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+
+def run_pipeline(
+    points,
+    config,
+    progress: BatchProgress,
+    workers: int,
+    cancelled: Callable[[], bool] = lambda: False,
+    on_result: Callable | None = None,
+    on_wait: Callable[[], None] | None = None,
+    wait_seconds: float = 0.5,
+) -> None:
+    """Compute CCD at `points` like run_points, as a pipeline of stages for runs of any size.
+
+    Clusters are fetched by `workers` threads, each holding a batch_limit slot for its requests,
+    parsed by one thread, and handed to `on_result` on the calling thread, which is also where
+    `on_wait` is called every `wait_seconds`. Every queue between the stages is bounded, so a slow
+    stage holds back the ones feeding it, and no result is kept once `on_result` has it: memory
+    stays flat however many points there are, and requests stay within the batch concurrency and
+    the request quota. Nothing is returned; `on_result` is where the results go.
+    """
+    settings = ccd_settings(config)
+    workers = max(1, int(workers))
+    pipeline = _Pipeline(cancelled, wait_seconds)
+    clusters = queue.Queue(workers * PIPELINE_QUEUE_CLUSTERS)
+    fetched = queue.Queue(workers * PIPELINE_QUEUE_CLUSTERS)
+    finished = queue.Queue(workers * PIPELINE_QUEUE_CLUSTERS * MAX_CLUSTER_POINTS)
+    done = object()
+
+    def feed():
+        for cluster in plan_clusters(points):
+            if not pipeline.put(clusters, cluster):
+                return
+        for _ in range(workers):
+            pipeline.put(clusters, done)
+
+    def fetch_clusters():
+        while (cluster := pipeline.get(clusters)) is not None and cluster is not done:
+            with batch_limit.slot(pipeline.halted) as acquired:
+                fetch = _fetch_cluster(cluster, settings, pipeline.halted) if acquired else None
+            if fetch is None:
+                pipeline.stopped.set()
+                return
+            if not pipeline.put(fetched, fetch):
+                return
+        pipeline.put(fetched, done)
+
+    def parse_clusters():
+        fetchers_done = 0
+        while fetchers_done < workers:
+            fetch = pipeline.get(fetched)
+            if fetch is None:
+                return
+            if fetch is done:
+                fetchers_done += 1
+                continue
+            for outcome in _finish_cluster(fetch, pipeline.halted):
+                if outcome is None:
+                    pipeline.stopped.set()
+                    return
+                if not pipeline.put(finished, outcome):
+                    return
+        pipeline.put(finished, done)
+
+    threads = [
+        pipeline.thread(feed),
+        *(pipeline.thread(fetch_clusters) for _ in range(workers)),
+        pipeline.thread(parse_clusters),
+    ]
+    try:
+        while True:
+            try:
+                outcome = finished.get(timeout=wait_seconds)
+            except queue.Empty:
+                if on_wait is not None:
+                    on_wait()
+                if pipeline.halted():
+                    break
+                continue
+            if outcome is done:
+                break
+            _deliver(outcome, progress, on_result)
+    finally:
+        pipeline.stopped.set()
+        for thread in threads:
+            thread.join()
+    if pipeline.error is not None:
+        raise pipeline.error
@@ -0,0 +1,368 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+CCDC over a small rectangle, downloaded pixel by pixel, for the break-date raster mode.
+
+The CCDC array image is flattened into plain bands - AREA_MAX_SEGMENTS slots per segment array,
+zero where a pixel has fewer segments - and fetched on the dataset's native grid in square tiles
+through ee.data.computePixels, in parallel. What comes back holds every segment's dates and
+coefficients, so the summary rasters are computed here and a later pick inside the rectangle can
+plot its model without asking Earth Engine for the fit again. Nothing here touches Qt.
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Final
+
+import numpy as np
+
+from .ccd_process import (
+    CCDComputationError,
+    _ccdc,
+    _no_images_message,
+    resolve_ccd_bands,
+    resolve_computed_indices,
+)
+from .diagnostics import RunDiagnostics, timed
+from .gee_common import OPTICAL_BANDS, resolve_indices
+from .gee_data_landsat import get_gee_data_landsat
+from .gee_data_sentinel import DEFAULT_CLOUD_FILTER, get_gee_data_sentinel
+from .gee_quota import Priority
+from .gee_session import get_info, run_diagnostics, submit
+from .pixel_grid import pixel_of
+from .plot_data import CCDC_COEFFICIENT_COUNT, CONFIRMED_CHANGE_PROBABILITY, MILLISECONDS_PER_YEAR
+
+# Segment slots downloaded per pixel. A pixel with more segments is marked truncated: its summary
+# still counts what fits, but a pick there fetches the full fit instead of plotting a partial one.
+AREA_MAX_SEGMENTS: Final = 8
+# Side of one computePixels tile, in pixels. With coefficients for every fitted band a tile is a
+# few hundred bands deep, and this keeps each response well under the 48 MB request limit.
+AREA_TILE_PIXELS: Final = 64
+# Largest rectangle accepted, in native pixels: about 10 km² of Sentinel-2, 90 km² of Landsat.
+MAX_AREA_PIXELS: Final = 100_000
+# Area results kept for picks, oldest dropped first; each holds its arrays in memory.
+AREA_RESULTS_MAX: Final = 4
+
+SEGMENTS_BAND: Final = "segments"
+DATE_LAYERS: Final = ("tStart", "tEnd", "tBreak")
+SEGMENT_LAYERS: Final = (*DATE_LAYERS, "changeProb")
+# The GeoTIFF's bands, in order: decimal years, a count, and the index or reflectance change
+SUMMARY_BANDS: Final = ("first_break", "last_break", "breaks", "magnitude")
+
+area_results: OrderedDict = OrderedDict()
+_AREA_LOCK = threading.Lock()
+
+
+def _slot_names(name):
+    return [f"{name}_{slot}" for slot in range(AREA_MAX_SEGMENTS)]
+
+
+def _flattened(ccdc, bands, magnitude_band):
+    """The CCDC arrays as plain bands: AREA_MAX_SEGMENTS slots each, coefficients eight per slot."""
+    import ee
+
+    def vector(name):
+        return ccdc.select(name).arrayPad([AREA_MAX_SEGMENTS]).arraySlice(0, 0, AREA_MAX_SEGMENTS)
+
+    # dates stay doubles: as float32 a millisecond timestamp is only good to a couple of minutes
+    dates = [vector(name).arrayFlatten([_slot_names(name)]).toDouble() for name in DATE_LAYERS]
+    values = [
+        vector(name).arrayFlatten([_slot_names(name)])
+        for name in ("changeProb", *(f"{band}_rmse" for band in bands), f"{magnitude_band}_magnitude")
+    ]
+    values += [
+        ccdc.select(f"{band}_coefs")
+        .arrayPad([AREA_MAX_SEGMENTS, CCDC_COEFFICIENT_COUNT])
+        .arraySlice(0, 0, AREA_MAX_SEGMENTS)
+        .arrayFlatten([_slot_names(f"{band}_coefs"), [str(index) for index in range(CCDC_COEFFICIENT_COUNT)]])
+        for band in bands
+    ]
+    segments = ccdc.select("tStart").arrayLength(0).rename(SEGMENTS_BAND).toFloat()
+    # a masked pixel - outside every footprint - comes back as no segments at all
+    return ee.Image.cat([*dates, ee.Image.cat([*values, segments]).toFloat()]).unmask(0)
+
+
+class _PixelRequest:
+    """A computePixels call in the shape get_info expects, so it queues and retries like the rest."""
+
+    def __init__(self, request):
+        self.request = request
+
+    def getInfo(self):
+        import ee
+
+        return ee.data.computePixels(self.request)
+
+
+def pixel_window(corners, transform):
+    """(column, row, width, height) of the native pixels covering a rectangle's `corners`."""
+    pixels = [pixel_of(x, y, transform) for x, y in corners]
+    columns = [column for column, _ in pixels]
+    rows = [row for _, row in pixels]
+    return min(columns), min(rows), max(columns) - min(columns) + 1, max(rows) - min(rows) + 1
+
+
+def window_transform(transform, column, row):
+    """The affine transform of a window whose top-left pixel is (column, row) of `transform`."""
+    a, b, c, d, e, f = transform
+    return [a, b, a * column + b * row + c, d, e, d * column + e * row + f]
+
+
+def tiles(width, height, size=AREA_TILE_PIXELS):
+    """(column, row, width, height) of the tiles covering a width x height window."""
+    return [
+        (column, row, min(size, width - column), min(size, height - row))
+        for row in range(0, height, size)
+        for column in range(0, width, size)
+    ]
+
+
+def decimal_years(milliseconds):
+    """Epoch milliseconds as decimal years (2015.5 is mid-2015), the unit of the break rasters."""
+    return 1970 + np.asarray(milliseconds, dtype=float) / MILLISECONDS_PER_YEAR
+
+
+class AreaResult:
+    """The downloaded CCDC fit of a rectangle, as per-pixel arrays on the dataset's native grid.
+
+    `layers` maps each flattened band to a (rows, columns) array: the segment layers of
+    SEGMENT_LAYERS, rmse and magnitude as "<name>_<slot>", coefficients as "<band>_coefs_<slot>_<i>".
+    """
+
+    def __init__(self, layers, grid, bands, magnitude_band, indices):
+        self.layers = layers
+        self.grid = grid
+        self.bands = tuple(bands)
+        self.magnitude_band = magnitude_band
+        self.indices = tuple(indices)
+        self.shape = layers[SEGMENTS_BAND].shape
+
+    def _stack(self, name):
+        return np.stack([self.layers[slot] for slot in _slot_names(name)])
+
+    def summary(self) -> dict:
+        """SUMMARY_BANDS as float arrays, NaN where a pixel has no confirmed break."""
+        starts = self._stack("tStart")
+        breaks = self._stack("tBreak")
+        probabilities = self._stack("changeProb")
+        magnitudes = self._stack(f"{self.magnitude_band}_magnitude")
+        # an empty slot is all zeros, and no real segment starts on 1970-01-01
+        confirmed = (starts != 0) & (breaks > 0) & (probabilities >= CONFIRMED_CHANGE_PROBABILITY)
+        count = confirmed.sum(axis=0)
+        any_break = count > 0
+        first = np.where(confirmed, breaks, np.inf).min(axis=0)
+        last = np.where(confirmed, breaks, -np.inf).max(axis=0)
+        # the magnitude of the largest confirmed change, sign kept
+        largest = np.where(confirmed, np.abs(magnitudes), -1).argmax(axis=0)
+        magnitude = np.take_along_axis(magnitudes, largest[np.newaxis], axis=0)[0]
+        return {
+            "first_break": np.where(any_break, decimal_years(np.where(any_break, first, 0)), np.nan),
+            "last_break": np.where(any_break, decimal_years(np.where(any_break, last, 0)), np.nan),
+            "breaks": count.astype(float),
+            "magnitude": np.where(any_break, magnitude, np.nan),
+        }
+
+    def pixel_at(self, x, y):
+        """(column, row) within the result of the point (x, y) in the grid's CRS, or None outside."""
+        column, row = pixel_of(x, y, self.grid["crsTransform"])
+        rows, columns = self.shape
+        return (column, row) if 0 <= column < columns and 0 <= row < rows else None
+
+    def ccdc_info_at(self, column, row):
+        """The pixel's fit as compute_ccd's reduceRegion returns it, or None if it was truncated."""
+        segments = int(self.layers[SEGMENTS_BAND][row, column])
+        if segments > AREA_MAX_SEGMENTS:
+            return None
+
+        def values(name):
+            return [float(self.layers[slot][row, column]) for slot in _slot_names(name)[:segments]]
+
+        info = {name: [values(name)] for name in SEGMENT_LAYERS}
+        for band in self.bands:
+            info[f"{band}_rmse"] = [values(f"{band}_rmse")]
+            info[f"{band}_coefs"] = [
+                [
+                    [
+                        float(self.layers[f"{band}_coefs_{slot}_{index}"][row, column])
+                        for index in range(CCDC_COEFFICIENT_COUNT)
+                    ]
+                    for slot in range(segments)
+                ]
+            ]
+        info[f"{self.magnitude_band}_magnitude"] = [values(f"{self.magnitude_band}_magnitude")]
+        return info
+
+    def write_geotiff(self, path) -> None:
+        """Write the SUMMARY_BANDS to a float32 GeoTIFF on the native grid, NaN as nodata."""
+        from osgeo import gdal, osr
+
+        rows, columns = self.shape
+        a, b, c, d, e, f = self.grid["crsTransform"]
+        reference = osr.SpatialReference()
+        reference.SetFromUserInput(self.grid["crs"])
+        dataset = gdal.GetDriverByName("GTiff").Create(
+            str(path), columns, rows, len(SUMMARY_BANDS), gdal.GDT_Float32, ["COMPRESS=DEFLATE"]
+        )
+        dataset.SetGeoTransform([c, a, b, f, d, e])
+        dataset.SetProjection(reference.ExportToWkt())
+        for number, (name, values) in enumerate(self.summary().items(), start=1):
+            band = dataset.GetRasterBand(number)
+            band.SetDescription(name)
+            band.SetNoDataValue(float("nan"))
+            band.WriteArray(values.astype(np.float32))
+        dataset.FlushCache()
+        dataset = None
+
+
+def register_area_result(settings_key, result: AreaResult) -> None:
+    """Keep `result` for picks under the settings it was computed with (a cache key minus coords)."""
+    with _AREA_LOCK:
+        area_results[(settings_key, id(result))] = result
+        while len(area_results) > AREA_RESULTS_MAX:
+            area_results.popitem(last=False)
+
+
+def area_results_for(settings_key, indices=()):
+    """The kept area results computed with `settings_key` that fitted every index in `indices`."""
+    with _AREA_LOCK:
+        return [
+            result
+            for (key, _), result in reversed(area_results.items())
+            if key == settings_key and set(indices) <= set(result.indices)
+        ]
+
+
+def clear_area_results() -> None:
+    with _AREA_LOCK:
+        area_results.clear()
+
+
+def _assemble(parts, width, height):
+    """Whole-window arrays from (column, row, data) tiles of computePixels structured arrays."""
+    names = parts[0][2].dtype.names
+    layers = {name: np.zeros((height, width), dtype=parts[0][2][name].dtype) for name in names}
+    for column, row, data in parts:
+        for name in names:
+            layers[name][row : row + data.shape[0], column : column + data.shape[1]] = data[name]
+    return layers
+
+
+def compute_ccd_area(
+    rectangle,
+    date_range,
+    doy_range,
+    dataset,
+    breakpoint_bands,
+    tmask_bands,
+    num_obs,
+    chi_square,
+    min_years,
+    lambda_lasso,
+    cloud_filter=DEFAULT_CLOUD_FILTER,
+    plot_band=None,
+    cancelled: Callable[[], bool] = lambda: False,
+    diagnostics: RunDiagnostics | None = None,
+    priority: Priority | Callable[[], Priority] = Priority.INTERACTIVE,
+):
+    """Fit CCDC on every native pixel of `rectangle` (west, south, east, north in degrees).
+
+    Returns an AreaResult, or None when the run was cancelled. The scenes are the ones covering
+    the rectangle's centre, so keep it well inside a scene: pixels of the rectangle outside a
+    scene's footprint miss that scene's observations.
+    """
+    import ee
+
+    west, south, east, north = rectangle
+    centre = ((west + east) / 2, (south + north) / 2)
+    ccd_bands, tmask_bands = resolve_ccd_bands(breakpoint_bands, tmask_bands)
+    indices = resolve_indices(resolve_computed_indices(breakpoint_bands, plot_band, tmask_bands))
+    if dataset == "Sentinel-2":
+        # masks over the whole rectangle, not only the window around its centre
+        gee_data = get_gee_data_sentinel(
+            centre, date_range, doy_range, dataset, cloud_filter, indices, point_local=False
+        )
+    elif dataset == "Landsat C2":
+        gee_data = get_gee_data_landsat(centre, date_range, doy_range, indices)
+    else:
+        raise CCDComputationError(f"Unsupported dataset: {dataset}. Use 'Landsat C2' or 'Sentinel-2'.")
+
+    first = gee_data.first()
+    projection = ee.Image(first).select(0).projection()
+    region = ee.Geometry.Rectangle([west, south, east, north], None, False)
+    with timed(diagnostics, "catalog_request"), run_diagnostics(diagnostics):
+        catalog = get_info(
+            ee.Dictionary(
+                {
+                    "size": gee_data.size(),
+                    "projection": ee.Algorithms.If(first, projection, None),
+                    "corners": ee.Algorithms.If(
+                        first, region.bounds(1, ee.Projection(projection.crs())).coordinates().get(0), None
+                    ),
+                }
+            ),
+            priority,
+            cancelled,
+        )
+    if cancelled() or catalog is None:
+        return None
+    if not catalog["size"]:
+        raise CCDComputationError(_no_images_message(dataset, date_range))
+
+    crs, transform = catalog["projection"]["crs"], catalog["projection"]["transform"]
+    column, row, width, height = pixel_window(catalog["corners"], transform)
+    if width * height > MAX_AREA_PIXELS:
+        raise CCDComputationError(
+            f"The area covers {width * height:,} pixels of {dataset}; draw one under {MAX_AREA_PIXELS:,}."
+        )
+    origin = window_transform(transform, column, row)
+    bands = (*OPTICAL_BANDS, *indices)
+    magnitude_band = plot_band if plot_band in ccd_bands else ccd_bands[0]
+    image = _flattened(
+        _ccdc(gee_data, ccd_bands, tmask_bands, num_obs, chi_square, min_years, lambda_lasso), bands, magnitude_band
+    )
+
+    def get_tile(tile_column, tile_row, tile_width, tile_height):
+        a, b, c, d, e, f = window_transform(origin, tile_column, tile_row)
+        request = {
+            "expression": image,
+            "fileFormat": "NUMPY_NDARRAY",
+            "grid": {
+                "dimensions": {"width": tile_width, "height": tile_height},
+                "affineTransform": {
+                    "scaleX": a,
+                    "shearX": b,
+                    "translateX": c,
+                    "shearY": d,
+                    "scaleY": e,
+                    "translateY": f,
+                },
+                "crsCode": crs,
+            },
+        }
+        with timed(diagnostics, "area_tile_request"):
+            return get_info(_PixelRequest(request), priority, cancelled)
+
+    with run_diagnostics(diagnostics):
+        futures = [(tile[0], tile[1], submit(get_tile, *tile)) for tile in tiles(width, height)]
+    parts = [(tile_column, tile_row, future.result()) for tile_column, tile_row, future in futures]
+    if cancelled() or any(data is None for _, _, data in parts):
+        return None
+    grid = {"crs": crs, "crsTransform": origin}
+    return AreaResult(_assemble(parts, width, height), grid, bands, magnitude_band, indices)
@@ -21,17 +21,24 @@ with the collaboration of Daniel Moraes <moraesd90@gmail.com>
 
 """
 
-import concurrent.futures
 import threading
 from collections import OrderedDict
 from collections.abc import Callable
+from dataclasses import dataclass
 from typing import Final
 
 import numpy as np
 
-from .gee_common import OPTICAL_BANDS, resolve_indices
+from .diagnostics import RunDiagnostics, count, timed
+from .gee_common import OPTICAL_BANDS, SAME_DAY_SCENES, resolve_indices
 from .gee_data_landsat import get_gee_data_landsat
 from .gee_data_sentinel import DEFAULT_CLOUD_FILTER, get_gee_data_sentinel
+from .gee_quota import Priority
+from .gee_session import get_info, run_diagnostics, submit
+from .gee_templates import templated_collection
+from .local_indices import with_indices
+from .plot_data import CcdcResult, refit_harmonic_model
+from .timeseries import TEXT_COLUMNS, TimeSeries
 
 # TMask is CCDC's iterative temporal cloud screen: it removes residual clouds and shadows that got
 # past the per-image QA masks, which is what lets those masks stay permissive. Green and SWIR1 are
@@ -56,16 +63,35 @@ DATASET_AVAILABILITY: Final = {
     "Sentinel-2": ("2017-03-28", "Global only from late 2018; use Landsat C2 for earlier years."),
 }
 
-# Each entry holds the full coefficient set and the whole time series, so it is tens of MB for a
-# multi-decade series; keep only enough to make band switching and small parameter tweaks instant.
-CACHE_MAX_ENTRIES: Final = 8
+# Each entry holds the full coefficient set and the whole time series as float columns, a few
+# hundred KB for a multi-decade series. Enough for band switching and small parameter tweaks to be
+# instant, and for a clicked pixel, its eight prefetched neighbours and the ring around the pixel
+# stepped to next to all stay cached together.
+CACHE_MAX_ENTRIES: Final = 32
 ccd_results: "OrderedDict[tuple, tuple]" = OrderedDict()
+# The native grid ({"crs", "crsTransform"}) each cached result was sampled on, under the same key,
+# so the pixels around it can be found and computed without asking for the catalog again.
+pixel_grids: "OrderedDict[tuple, dict]" = OrderedDict()
+# Landsat series fetched with raw_qa, by (coords, date_range, doy_range): one fetch serves every
+# MaskProfile, so it is kept apart from the results, which are each for one.
+raw_series: "OrderedDict[tuple, dict]" = OrderedDict()
+# An optional second tier under ccd_results that outlives the process (a disk_cache.DiskCache):
+# misses fall through to it and every stored result is written to it. None in the plugin.
+persistent_results = None
 _RESULTS_LOCK = threading.Lock()
 
 
+def set_persistent_cache(cache) -> None:
+    """Put `cache` under the in-memory results, or take it away with None."""
+    global persistent_results
+    persistent_results = cache
+
+
 def clear_results_cache() -> None:
     with _RESULTS_LOCK:
         ccd_results.clear()
+        pixel_grids.clear()
+        raw_series.clear()
 
 
 def has_cached_results() -> bool:
@@ -155,39 +181,87 @@ def lookup_result(key, indices):
     """
     with _RESULTS_LOCK:
         entry = ccd_results.get(key)
-        if entry is None:
-            return None
-        built, ccdc_info, timeseries = entry
-        if not set(indices) <= set(built):
-            return None
+        if entry is not None and set(indices) <= set(entry[0]):
+            ccd_results.move_to_end(key)
+            return entry[1], entry[2]
+    persistent = persistent_results
+    if persistent is None:
+        return None
+    # read outside the lock: a slow disk must not hold up the picks served from memory
+    stored = persistent.load(key, indices)
+    if stored is None:
+        return None
+    built, ccdc_info, timeseries = stored
+    _remember(key, built, (ccdc_info, timeseries))
+    return ccdc_info, timeseries
+
+
+def _remember(key, indices, value):
+    """Put a result in memory, unless the entry there covers more indices. Needs _RESULTS_LOCK free."""
+    with _RESULTS_LOCK:
+        _remember_locked(key, indices, value)
+
+
+def _remember_locked(key, indices, value):
+    existing = ccd_results.get(key)
+    if existing is not None and set(indices) < set(existing[0]):
         ccd_results.move_to_end(key)
-        return ccdc_info, timeseries
+        return
+    ccd_results[key] = (tuple(indices), *value)
+    ccd_results.move_to_end(key)
+    while len(ccd_results) > CACHE_MAX_ENTRIES:
+        ccd_results.popitem(last=False)
 
 
 def _store_result(key, indices, value, cancelled: Callable[[], bool] = lambda: False):
     """Record a result with the index set it was built from.
 
     Keeps whichever run for this key covers more indices, and evicts the least recently used
-    entry once the cache is over its bound.
+    entry once the cache is over its bound. The result also goes to the persistent tier, if set.
     """
     with _RESULTS_LOCK:
         if cancelled():
             return False
-        existing = ccd_results.get(key)
-        if existing is not None and set(indices) < set(existing[0]):
-            ccd_results.move_to_end(key)
-            return True
-        ccd_results[key] = (tuple(indices), *value)
+        _remember_locked(key, indices, value)
+    persistent = persistent_results
+    if persistent is not None:
+        persistent.store(key, indices, *value)
+    return True
+
+
+def lookup_derived(key, indices, dataset, num_obs=0):
+    """The cached result for this key whatever indices it was built with, or None.
+
+    Any index it lacks is completed locally: its observations from the optical bands (see
+    local_indices), and its model fitted on the segments CCDC found, under the run's `num_obs`
+    (see refit_harmonic_model).
+    """
+    with _RESULTS_LOCK:
+        entry = ccd_results.get(key)
+        if entry is None:
+            return None
         ccd_results.move_to_end(key)
-        while len(ccd_results) > CACHE_MAX_ENTRIES:
-            ccd_results.popitem(last=False)
-        return True
+        _, ccdc_info, timeseries = entry
+    timeseries = with_indices(timeseries, indices, dataset)
+    unfitted = [name for name in resolve_indices(indices) if f"{name}_coefs" not in ccdc_info]
+    refit = refit_harmonic_model(ccdc_info, timeseries, unfitted, num_obs)
+    if isinstance(ccdc_info, CcdcResult):
+        return ccdc_info.merged(refit), timeseries
+    return {**ccdc_info, **refit}, timeseries
+
+
+def lookup_grid(key):
+    """The grid the result for this key was sampled on, or None."""
+    with _RESULTS_LOCK:
+        return pixel_grids.get(key)
 
 
-# getRegion's only textual column. Named rather than detected, because a scene id that happens to
-# be all digits would otherwise be converted to float and lose its identity (and, past ~15 digits,
-# its value). Everything else - longitude, latitude, time and the bands - is numeric.
-TEXT_COLUMNS: Final = frozenset({"id"})
+def _store_grid(key, grid) -> None:
+    with _RESULTS_LOCK:
+        pixel_grids[key] = grid
+        pixel_grids.move_to_end(key)
+        while len(pixel_grids) > CACHE_MAX_ENTRIES:
+            pixel_grids.popitem(last=False)
 
 
 def _column_array(name, values):
@@ -209,7 +283,7 @@ def _column_array(name, values):
 
 
 def _build_timeseries(region_rows):
-    """Turn a getRegion result into a column dictionary, rejecting fully masked points."""
+    """Turn a getRegion result into a TimeSeries, rejecting fully masked points."""
     if len(region_rows) < 2:
         raise CCDComputationError("No observations at this point. Try a wider date or DOY range.")
 
@@ -233,7 +307,51 @@ def _build_timeseries(region_rows):
         pairs = list(zip(header, columns, strict=True))
     except ValueError:
         raise CCDComputationError("Malformed result from Earth Engine: the rows do not match the header.")
-    return {name: _column_array(name, column) for name, column in pairs}
+    return TimeSeries({name: _column_array(name, column) for name, column in pairs})
+
+
+def _builder(dataset, date_range, doy_range, cloud_filter, indices):
+    """The collection builder of `dataset`, as a function of the point or points to sample."""
+    if dataset == "Sentinel-2":
+
+        def build(at):
+            return get_gee_data_sentinel(at, date_range, doy_range, dataset, cloud_filter, indices)
+
+    elif dataset == "Landsat C2":
+
+        def build(at):
+            return get_gee_data_landsat(at, date_range, doy_range, indices)
+
+    else:
+        raise CCDComputationError(f"Unsupported dataset: {dataset}. Use 'Landsat C2' or 'Sentinel-2'.")
+    return build
+
+
+def _collection(dataset, date_range, doy_range, cloud_filter, indices, coords, diagnostics=None):
+    """The collection compute_ccd samples around `coords`, built from its cached graph template."""
+    build = _builder(dataset, date_range, doy_range, cloud_filter, indices)
+    # the cloud filter only shapes the Sentinel-2 graph, so Landsat runs share one template for all
+    template_key = (dataset, tuple(date_range), tuple(doy_range), cloud_filter if dataset == "Sentinel-2" else None)
+    return templated_collection((*template_key, indices), coords, build, diagnostics)
+
+
+def _ccdc(gee_data, ccd_bands, tmask_bands, num_obs, chi_square, min_years, lambda_lasso):
+    """The CCDC fit of `gee_data`, as an image of per-segment arrays."""
+    import ee
+
+    # The whole collection is passed, not just the breakpoint bands: CCDC fits coefficients for
+    # every band it is handed and the plot needs the coefficients of whichever band the user
+    # selects, not only the ones driving detection.
+    return ee.Algorithms.TemporalSegmentation.Ccdc(
+        gee_data,
+        list(ccd_bands),
+        list(tmask_bands),
+        num_obs,
+        chi_square,
+        min_years,
+        CCDC_DATE_FORMAT,
+        lambda_lasso,
+    )
 
 
 def compute_ccd(
@@ -250,7 +368,20 @@ def compute_ccd(
     cloud_filter=DEFAULT_CLOUD_FILTER,
     plot_band=None,
     cancelled: Callable[[], bool] = lambda: False,
+    diagnostics: RunDiagnostics | None = None,
+    priority: Priority | Callable[[], Priority] = Priority.INTERACTIVE,
+    extra_indices=(),
+    known_fit=None,
 ):
+    """Fit CCDC at one point and fetch its time series, or a cached result for the same inputs.
+
+    Returns (ccdc_info, timeseries), or None when the run was cancelled. Every request waits its
+    turn in the shared request quota under `priority`, so work the user is not watching (prefetch,
+    batch) yields to the plot they are. A RunPriority lets a run be demoted while it is in progress.
+    `extra_indices` are built on top of the ones this view needs, so later views can reuse the run.
+    `known_fit` is the point's CCDC result when it is already at hand (an area run downloaded it):
+    only the time series is fetched then, and the pair is cached as if both had been.
+    """
     # documentation: https://developers.google.com/earth-engine/apidocs/ee-algorithms-temporalsegmentation-ccdc
     import ee
 
@@ -271,7 +402,12 @@ def compute_ccd(
         tmask_bands=tmask_bands,
         cloud_filter=cloud_filter,
     )
-    indices = resolve_computed_indices(breakpoint_bands, plot_band, tmask_bands)
+    indices = resolve_indices([*resolve_computed_indices(breakpoint_bands, plot_band, tmask_bands), *extra_indices])
+    # a neighbour prefetched in the background, or a pick repeated while its run was finishing
+    cached = lookup_result(cache_key, indices)
+    if cached is not None:
+        count(diagnostics, "cache_hits")
+        return cached
     # Fold in whatever a previous run for this exact configuration already built, so this result is
     # always a superset of it and replaces it without losing a view. Only the plotted band can
     # differ within one key, so without this two runs that plot different indices (NDVI, then EVI)
@@ -281,13 +417,11 @@ def compute_ccd(
         existing = ccd_results.get(cache_key)
         if existing is not None:
             indices = resolve_indices([*existing[0], *indices])
+    # a known fit without the coefficients of every index now built would cache a plot without a model
+    if known_fit is not None and not all(f"{index}_coefs" in known_fit for index in indices):
+        known_fit = None
 
-    if dataset == "Sentinel-2":
-        gee_data = get_gee_data_sentinel(coords, date_range, doy_range, dataset, cloud_filter, indices)
-    elif dataset == "Landsat C2":
-        gee_data = get_gee_data_landsat(coords, date_range, doy_range, indices)
-    else:
-        raise CCDComputationError(f"Unsupported dataset: {dataset}. Use 'Landsat C2' or 'Sentinel-2'.")
+    gee_data = _collection(dataset, date_range, doy_range, cloud_filter, indices, coords, diagnostics)
 
     # One round trip that both proves the collection is non-empty and fetches the grid to sample
     # on. Both are needed before the parallel calls below, and asking for them together keeps it
@@ -298,16 +432,27 @@ def compute_ccd(
     first = gee_data.first()
     if cancelled():
         return None
-    catalog = ee.Dictionary(
-        {
-            "size": gee_data.size(),
-            "projection": ee.Algorithms.If(first, ee.Image(first).select(0).projection(), ee.Projection("EPSG:4326")),
-        }
-    ).getInfo()
-    if cancelled():
+    with timed(diagnostics, "catalog_request"), run_diagnostics(diagnostics):
+        catalog = get_info(
+            ee.Dictionary(
+                {
+                    "size": gee_data.size(),
+                    "duplicates": gee_data.aggregate_sum(SAME_DAY_SCENES).subtract(gee_data.size()),
+                    "projection": ee.Algorithms.If(
+                        first, ee.Image(first).select(0).projection(), ee.Projection("EPSG:4326")
+                    ),
+                }
+            ),
+            priority,
+            cancelled,
+        )
+    if cancelled() or catalog is None:
         return None
     if not catalog["size"]:
         raise CCDComputationError(_no_images_message(dataset, date_range))
+    # same-day scenes of overlapping tiles or rows, each one a getRegion row and a CCDC input saved
+    if catalog["duplicates"]:
+        count(diagnostics, "duplicate_scenes", int(catalog["duplicates"]))
     # Sample the observations and the CCDC fit on exactly the same pixels, and on the pixels the
     # source images actually have. Asking for a nominal `scale` makes Earth Engine derive a fresh
     # grid whose origin is not the source grid's: Landsat products are aligned to the 15 m
@@ -323,40 +468,301 @@ def compute_ccd(
     def get_time_series():
         if cancelled():
             return None
-        rows = ee.List(gee_data.getRegion(geometry=point, **grid)).getInfo()
-        if cancelled():
+        with timed(diagnostics, "time_series_request"):
+            rows = get_info(ee.List(gee_data.getRegion(geometry=point, **grid)), priority, cancelled)
+        if cancelled() or rows is None:
             return None
         return _build_timeseries(rows)
 
     def get_ccdc():
         if cancelled():
             return None
-        # The whole collection is passed, not just the breakpoint bands: CCDC fits coefficients for
-        # every band it is handed and the plot needs the coefficients of whichever band the user
-        # selects, not only the ones driving detection.
-        ccdc = ee.Algorithms.TemporalSegmentation.Ccdc(
-            gee_data,
-            list(ccd_bands),
-            list(tmask_bands),
-            num_obs,
-            chi_square,
-            min_years,
-            CCDC_DATE_FORMAT,
-            lambda_lasso,
-        )
-        result = ccdc.reduceRegion(ee.Reducer.toList(), point, **grid).getInfo()
-        return None if cancelled() else result
-
-    # both are independent round trips to Earth Engine, so overlap them
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_timeseries = executor.submit(get_time_series)
-        future_ccdc = executor.submit(get_ccdc)
-        timeseries = future_timeseries.result()
-        ccdc_info = future_ccdc.result()
+        ccdc = _ccdc(gee_data, ccd_bands, tmask_bands, num_obs, chi_square, min_years, lambda_lasso)
+        with timed(diagnostics, "ccdc_request"):
+            result = get_info(ccdc.reduceRegion(ee.Reducer.toList(), point, **grid), priority, cancelled)
+        # parsed here, once, so no plot or summary of the cached result walks the raw lists again
+        return None if cancelled() or result is None else CcdcResult(result)
+
+    # both are independent round trips to Earth Engine, so overlap them on the shared pool
+    with run_diagnostics(diagnostics):
+        future_timeseries = submit(get_time_series)
+        future_ccdc = submit(get_ccdc) if known_fit is None else None
+    timeseries = future_timeseries.result()
+    ccdc_info = future_ccdc.result() if future_ccdc is not None else CcdcResult.of(known_fit)
 
     if cancelled() or timeseries is None or ccdc_info is None:
         return None
     if not _store_result(cache_key, indices, (ccdc_info, timeseries), cancelled=cancelled):
         return None
+    _store_grid(cache_key, grid)
 
     return ccdc_info, timeseries
+
+
+# property carrying each point's position through reduceRegions
+POINT_INDEX: Final = "point_index"
+
+
+def _split_region_rows(region_rows, points):
+    """Split one getRegion over several points into a getRegion result per point.
+
+    getRegion reports the centre of the pixel it sampled, not the point asked for, so each row goes
+    to the nearest requested point. Longitudes are scaled by cos(latitude) so "nearest" is measured
+    on the ground; the points are a pixel apart, which is far more than the sampling offset.
+    """
+    header = list(region_rows[0])
+    rows = region_rows[1:]
+    split = [[header] for _ in points]
+    if not rows:
+        return split
+    lon, lat = header.index("longitude"), header.index("latitude")
+    requested = np.asarray(points, dtype=float)
+    sampled = np.array([(row[lon], row[lat]) for row in rows], dtype=float)
+    scale = np.cos(np.radians(requested[:, 1].mean()))
+    distance = ((sampled[:, None, 0] - requested[None, :, 0]) * scale) ** 2 + (
+        sampled[:, None, 1] - requested[None, :, 1]
+    ) ** 2
+    for row, nearest in zip(rows, distance.argmin(axis=1), strict=True):
+        split[nearest].append(row)
+    return split
+
+
+@dataclass(frozen=True, slots=True)
+class FetchedPoints:
+    """The raw responses of fetch_ccd_points, for store_ccd_points to parse."""
+
+    points: list
+    keys: list
+    indices: tuple
+    grid: dict
+    rows: list
+    fits: dict
+
+
+def fetch_ccd_points(
+    points,
+    grid,
+    date_range,
+    doy_range,
+    dataset,
+    breakpoint_bands,
+    tmask_bands,
+    num_obs,
+    chi_square,
+    min_years,
+    lambda_lasso,
+    cloud_filter=DEFAULT_CLOUD_FILTER,
+    plot_band=None,
+    cancelled: Callable[[], bool] = lambda: False,
+    diagnostics: RunDiagnostics | None = None,
+    priority: Priority | Callable[[], Priority] = Priority.BACKGROUND,
+) -> FetchedPoints | None:
+    """The two requests of compute_ccd_points, unparsed; None when there is nothing to fetch or on cancel.
+
+    Split from the parsing so a batch pipeline can fetch the next points while the last ones parse.
+    """
+    import ee
+
+    ccd_bands, tmask_bands = resolve_ccd_bands(breakpoint_bands, tmask_bands)
+    indices = resolve_computed_indices(breakpoint_bands, plot_band, tmask_bands)
+
+    def key_of(coords):
+        return make_cache_key(
+            coords,
+            date_range,
+            doy_range,
+            dataset,
+            breakpoint_bands,
+            num_obs=num_obs,
+            chi_square=chi_square,
+            min_years=min_years,
+            lambda_lasso=lambda_lasso,
+            tmask_bands=tmask_bands,
+            cloud_filter=cloud_filter,
+        )
+
+    points = [tuple(coords) for coords in points if lookup_result(key_of(coords), indices) is None]
+    if cancelled() or not points:
+        return None
+    # Built over the points themselves, not around the run that gave the grid: a scene, or the
+    # Sentinel-2 quality window, that holds one of them need not hold that run's point. A point
+    # set has no graph template, so this pays for tracing the graph.
+    with timed(diagnostics, "graph_build"):
+        gee_data = _builder(dataset, date_range, doy_range, cloud_filter, indices)(points)
+
+    def get_time_series():
+        with timed(diagnostics, "time_series_request"):
+            region = gee_data.getRegion(geometry=ee.Geometry.MultiPoint(points), **grid)
+            return get_info(ee.List(region), priority, cancelled)
+
+    def get_ccdc():
+        ccdc = _ccdc(gee_data, ccd_bands, tmask_bands, num_obs, chi_square, min_years, lambda_lasso)
+        features = ee.FeatureCollection(
+            [ee.Feature(ee.Geometry.Point(coords), {POINT_INDEX: index}) for index, coords in enumerate(points)]
+        )
+        with timed(diagnostics, "ccdc_request"):
+            return get_info(ccdc.reduceRegions(features, ee.Reducer.toList(), **grid), priority, cancelled)
+
+    with run_diagnostics(diagnostics):
+        future_rows = submit(get_time_series)
+        future_fits = submit(get_ccdc)
+    rows = future_rows.result()
+    fits = future_fits.result()
+    if cancelled() or rows is None or fits is None:
+        return None
+    return FetchedPoints(points, [key_of(coords) for coords in points], indices, grid, rows, fits)
+
+
+def store_ccd_points(fetched: FetchedPoints, cancelled: Callable[[], bool] = lambda: False) -> list | None:
+    """Parse what fetch_ccd_points fetched into the results cache.
+
+    Returns each point's (ccdc_info, timeseries), or the CCDComputationError saying why it has none
+    (no usable observations; such a point is not stored); None when cancelled before all were stored.
+    """
+    series_rows = _split_region_rows(fetched.rows, fetched.points)
+    results = [CCDComputationError("Earth Engine returned no CCDC result for this point.")] * len(fetched.points)
+    for feature in fetched.fits["features"]:
+        properties = dict(feature["properties"])
+        index = properties.pop(POINT_INDEX)
+        try:
+            timeseries = _build_timeseries(series_rows[index])
+        except CCDComputationError as error:
+            results[index] = error
+            continue
+        computed = (CcdcResult(properties), timeseries)
+        key = fetched.keys[index]
+        if not _store_result(key, fetched.indices, computed, cancelled=cancelled):
+            return None
+        _store_grid(key, fetched.grid)
+        results[index] = computed
+    return results
+
+
+def compute_ccd_points(
+    points,
+    grid,
+    date_range,
+    doy_range,
+    dataset,
+    breakpoint_bands,
+    tmask_bands,
+    num_obs,
+    chi_square,
+    min_years,
+    lambda_lasso,
+    cloud_filter=DEFAULT_CLOUD_FILTER,
+    plot_band=None,
+    cancelled: Callable[[], bool] = lambda: False,
+    diagnostics: RunDiagnostics | None = None,
+    priority: Priority | Callable[[], Priority] = Priority.BACKGROUND,
+) -> int:
+    """Compute and cache CCD at several points, in two requests for all of them.
+
+    Meant for the pixels around one compute_ccd already ran at: they reuse its native `grid`, so
+    there is no catalog request, one getRegion fetches every series and one reduceRegions every
+    fit, each from a collection of the scenes over any of the points. Points already cached, and
+    points without usable observations, are skipped. Returns how many results were stored.
+    """
+    fetched = fetch_ccd_points(
+        points,
+        grid,
+        date_range,
+        doy_range,
+        dataset,
+        breakpoint_bands,
+        tmask_bands,
+        num_obs,
+        chi_square,
+        min_years,
+        lambda_lasso,
+        cloud_filter=cloud_filter,
+        plot_band=plot_band,
+        cancelled=cancelled,
+        diagnostics=diagnostics,
+        priority=priority,
+    )
+    results = store_ccd_points(fetched, cancelled) if fetched is not None else None
+    return 0 if results is None else sum(not isinstance(result, CCDComputationError) for result in results)
+
+
+def _fetch_unmasked(dataset, variant, build, coords, date_range, doy_range, grid, cancelled, diagnostics, priority):
+    """One getRegion of an unmasked `variant` collection at a point, cached in raw_series."""
+    import ee
+
+    key = (dataset, variant, tuple(coords), tuple(date_range), tuple(doy_range))
+    with _RESULTS_LOCK:
+        cached = raw_series.get(key)
+        if cached is not None:
+            raw_series.move_to_end(key)
+            count(diagnostics, "cache_hits")
+            return cached
+    if cancelled():
+        return None
+
+    collection = templated_collection(
+        (dataset, tuple(date_range), tuple(doy_range), variant), coords, build, diagnostics
+    )
+    if grid is None:
+        first = collection.first()
+        grid = {"crs": ee.Algorithms.If(first, ee.Image(first).select(0).projection(), ee.Projection("EPSG:4326"))}
+    with timed(diagnostics, "time_series_request"), run_diagnostics(diagnostics):
+        rows = get_info(ee.List(collection.getRegion(geometry=ee.Geometry.Point(coords), **grid)), priority, cancelled)
+    if cancelled() or rows is None:
+        return None
+    timeseries = _build_timeseries(rows)
+    with _RESULTS_LOCK:
+        if cancelled():
+            return None
+        raw_series[key] = timeseries
+        while len(raw_series) > CACHE_MAX_ENTRIES:
+            raw_series.popitem(last=False)
+    return timeseries
+
+
+def fetch_landsat_raw(
+    coords,
+    date_range,
+    doy_range,
+    grid=None,
+    cancelled: Callable[[], bool] = lambda: False,
+    diagnostics: RunDiagnostics | None = None,
+    priority: Priority | Callable[[], Priority] = Priority.INTERACTIVE,
+):
+    """The Landsat series at a point with nothing masked and its quality bands, in one request.
+
+    Mask it with landsat_masks.apply_mask_profile, under as many profiles as needed: the fetch is
+    cached, so comparing them costs no further Earth Engine work. Sampled on `grid` when given
+    (lookup_grid has it for a point already computed), else on the first scene's own grid, which
+    is the same one without the catalog round trip. None when the run was cancelled.
+    """
+
+    def build(at):
+        return get_gee_data_landsat(at, date_range, doy_range, raw_qa=True)
+
+    return _fetch_unmasked(
+        "Landsat C2", "raw_qa", build, coords, date_range, doy_range, grid, cancelled, diagnostics, priority
+    )
+
+
+def fetch_sentinel_flags(
+    coords,
+    date_range,
+    doy_range,
+    grid=None,
+    cancelled: Callable[[], bool] = lambda: False,
+    diagnostics: RunDiagnostics | None = None,
+    priority: Priority | Callable[[], Priority] = Priority.INTERACTIVE,
+):
+    """The Sentinel-2 series at a point with every cloud filter's verdict, in one request.
+
+    sentinel_masks.apply_cloud_filter then gives the series under any CLOUD_FILTERS entry without
+    another Earth Engine run; only CCDC has to be rerun for the filter that is chosen. Sampled as
+    fetch_landsat_raw is. None when the run was cancelled.
+    """
+
+    def build(at):
+        return get_gee_data_sentinel(at, date_range, doy_range, "Sentinel-2", indices=(), filter_flags=True)
+
+    return _fetch_unmasked(
+        "Sentinel-2", "filter_flags", build, coords, date_range, doy_range, grid, cancelled, diagnostics, priority
+    )
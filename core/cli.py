@@ -0,0 +1,372 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+Run CCD jobs without QGIS, for scheduled batch runs on a server.
+
+From the plugin directory (the package __init__ imports QGIS, so run the module, not the package):
+
+    python -m core.cli job.yaml --output results/ [--settings base.yaml] [--plots] [--export parquet]
+
+A job uses the keys of utils.config.get_plugin_config, so a configuration saved from the dock
+is a valid one. A YAML job is one mapping: its `points` list ([lon, lat] pairs, or mappings with
+lon, lat and an optional id) or else its own lon/lat. A CSV job has a row per point with lon, lat,
+an optional id and any setting as a column, overriding the --settings file for that row; a list
+setting such as breakpoint_bands is ";"-separated there. Any other key is an error, except the
+dock's own ones (DOCK_KEYS), which a job ignores.
+
+Results are streamed to the output directory as each point finishes: points.csv with the batch
+summary of every point, segments.csv with one row per model segment of the plotted band and,
+with --plots, one HTML plot per point. --export adds the observation and segment tables of
+every point as Parquet or a GeoPackage (see core.export). Results are kept in a disk cache (<output>/cache unless
+--cache-dir says otherwise), so rerunning a job only computes the points that are new. Points go
+through batch.run_pipeline, so a job of any size runs in flat memory.
+
+A Landsat job can compare quality mask profiles: `mask_profiles` maps a name to the fields of a
+gee_data_landsat.MaskProfile (qa_pixel_bits, saturation, sr_min, sr_max, haze), for example
+
+    mask_profiles:
+      no_haze: {haze: false}
+      strict_cloud: {qa_pixel_bits: [0, 1, 2, 3, 4, 5, 9]}
+
+and mask_profiles.csv then has, for every point, how many observations the run's own profile
+("default") and each of these keep. Each point is fetched once unmasked and masked under every
+profile locally (see core.landsat_masks); a mapping has no CSV form, so set it in the YAML.
+"""
+
+import argparse
+import csv
+import datetime
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Final
+
+import numpy as np
+
+from .batch import BATCH_FIELDS, BatchProgress, cache_key, ccd_settings, iso_date, run_pipeline
+from .ccd_process import DEFAULT_BREAKPOINT_BANDS, fetch_landsat_raw, lookup_grid, set_persistent_cache
+from .disk_cache import DiskCache
+from .export import EXPORT_FORMATS, ColumnarExport
+from .gee_data_landsat import DEFAULT_MASK_PROFILE, MaskProfile
+from .gee_data_sentinel import DEFAULT_CLOUD_FILTER
+from .gee_quota import DEFAULT_MAX_CONCURRENT_REQUESTS, DEFAULT_REQUESTS_PER_SECOND, Priority
+from .gee_session import DEFAULT_BATCH_CONCURRENCY, batch_limit, endpoint_url, initialize_earth_engine, request_quota
+from .landsat_masks import apply_mask_profile
+from .plot_data import build_model_segments
+
+# The dock's defaults, for whatever a job leaves out
+DEFAULT_JOB: Final = {
+    "dataset": "Landsat C2",
+    "band_or_index_to_plot": "SWIR1",
+    "plot_style": "light",
+    "breakpoint_bands": list(DEFAULT_BREAKPOINT_BANDS),
+    "tmask_bands": [],  # none: the CCD's own default bands
+    "start_date": "2010-01-01",
+    "end_date": None,  # today
+    "start_doy": 1,
+    "end_doy": 365,
+    "num_obs": 6,
+    "chi_square": 0.99,
+    "min_years": 1.33,
+    "lambda_lasso": 0.002,
+    "cloud_filter": DEFAULT_CLOUD_FILTER,
+    "high_volume_endpoint": False,
+    "endpoint_url": "",
+    "batch_concurrency": DEFAULT_BATCH_CONCURRENCY,
+    "requests_per_second": DEFAULT_REQUESTS_PER_SECOND,
+    "max_concurrent_requests": DEFAULT_MAX_CONCURRENT_REQUESTS,
+    # job-only: {name: MaskProfile fields} to compare at every point of a Landsat job
+    "mask_profiles": {},
+}
+# what identifies a point rather than configuring the run
+POINT_KEYS: Final = ("id", "lon", "lat")
+# what a configuration saved from the dock also holds, but only steers the dock itself
+DOCK_KEYS: Final = (
+    "finish_superseded_in_background",
+    "prefetch_neighbours",
+    "precompute_indices",
+    "auto_generate_plot",
+)
+LIST_SEPARATOR: Final = ";"
+POINT_COLUMNS: Final = (*POINT_KEYS, *(name for name, _ in BATCH_FIELDS))
+SEGMENT_COLUMNS: Final = (*POINT_KEYS, "band", "segment", "start", "end", "break", "change_prob", "confirmed", "rmse")
+PROFILE_COLUMNS: Final = (*POINT_KEYS, "profile", "observations", "kept")
+
+
+def _setting(name, value):
+    """A job value in the type the dock's config holds for `name`."""
+    if name not in DEFAULT_JOB:
+        raise ValueError(f"unknown setting {name!r}")
+    default = DEFAULT_JOB[name]
+    if isinstance(value, datetime.date):
+        # YAML reads an unquoted 2010-01-01 as a date
+        return value.isoformat()
+    if not isinstance(value, str):
+        return list(value) if isinstance(default, list) else value
+    if isinstance(default, dict):
+        raise ValueError(f"{name} is a mapping, which only a YAML job or --settings file can hold")
+    if isinstance(default, bool):
+        return value.strip().lower() in ("1", "true", "yes")
+    if isinstance(default, list):
+        return [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+def job_config(*layers) -> dict:
+    """DEFAULT_JOB updated by each mapping of `layers` in turn, values in the dock's types."""
+    config = dict(DEFAULT_JOB)
+    for layer in layers:
+        config.update(
+            {name: _setting(name, value) for name, value in layer.items() if name not in (*POINT_KEYS, *DOCK_KEYS)}
+        )
+    if not config["end_date"]:
+        config["end_date"] = datetime.date.today().isoformat()
+    return config
+
+
+def mask_profiles(config) -> dict:
+    """{name: MaskProfile} of the job's mask_profiles, after the run's own profile as "default"."""
+    profiles = {"default": DEFAULT_MASK_PROFILE}
+    for name, fields in config["mask_profiles"].items():
+        fields = dict(fields)
+        if fields.get("qa_pixel_bits") is not None:
+            fields["qa_pixel_bits"] = tuple(int(bit) for bit in fields["qa_pixel_bits"])
+        try:
+            profiles[str(name)] = MaskProfile(**fields)
+        except TypeError as error:
+            raise ValueError(f"mask profile {name}: {error}") from None
+    return profiles
+
+
+def read_job(path, settings=None):
+    """[(config, [(point id, (lon, lat)), ...]), ...] for the job at `path`, points grouped by config."""
+    path = Path(path)
+    settings = settings or {}
+    if path.suffix.lower() == ".csv":
+        with open(path, newline="") as stream:
+            rows = [
+                {name: value for name, value in row.items() if value not in ("", None)}
+                for row in csv.DictReader(stream)
+            ]
+    else:
+        import yaml
+
+        with open(path) as stream:
+            job = yaml.safe_load(stream) or {}
+        settings = {**settings, **{name: value for name, value in job.items() if name != "points"}}
+        points = job.get("points")
+        if points is None:
+            points = [[job["lon"], job["lat"]]] if "lon" in job and "lat" in job else []
+        rows = [point if isinstance(point, dict) else {"lon": point[0], "lat": point[1]} for point in points]
+
+    groups = OrderedDict()
+    for index, row in enumerate(rows):
+        if "lon" not in row or "lat" not in row:
+            raise ValueError(f"{path}: point {index + 1} has no lon/lat")
+        config = job_config(settings, row)
+        if config["mask_profiles"]:
+            if config["dataset"] != "Landsat C2":
+                raise ValueError(f"{path}: mask_profiles only apply to Landsat C2, not {config['dataset']}")
+            mask_profiles(config)
+        point = (str(row.get("id", index)), (float(row["lon"]), float(row["lat"])))
+        groups.setdefault(repr(sorted(config.items())), (config, []))[1].append(point)
+    return list(groups.values())
+
+
+class ResultWriter:
+    """Streams each finished point to points.csv, segments.csv and, optionally, plots and an export."""
+
+    def __init__(self, directory, plots=False, export_format=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.plots = plots
+        self._export = ColumnarExport(self.directory, export_format) if export_format else None
+        self._lock = threading.Lock()
+        self._points_file = open(self.directory / "points.csv", "w", newline="")  # noqa: SIM115
+        self._segments_file = open(self.directory / "segments.csv", "w", newline="")  # noqa: SIM115
+        self._points = csv.DictWriter(self._points_file, POINT_COLUMNS)
+        self._segments = csv.DictWriter(self._segments_file, SEGMENT_COLUMNS)
+        self._points.writeheader()
+        self._segments.writeheader()
+        self._profiles_file = None
+        self._profiles = None
+
+    def write(self, config, point_id, coords, attributes, computed) -> None:
+        where = {"id": point_id, "lon": coords[0], "lat": coords[1]}
+        band = config["band_or_index_to_plot"]
+        segments = build_model_segments(computed[0], band) if computed is not None else []
+        rows = [
+            {
+                **where,
+                "band": band,
+                "segment": segment.number,
+                "start": iso_date(segment.start_ms),
+                "end": iso_date(segment.end_ms),
+                "break": iso_date(segment.break_ms) if segment.break_ms is not None else "",
+                "change_prob": segment.change_probability,
+                "confirmed": segment.is_confirmed_break,
+                "rmse": segment.rmse,
+            }
+            for segment in segments
+        ]
+        if self.plots and computed is not None:
+            self._write_plot(config, point_id, coords, computed)
+        if self._export is not None and computed is not None:
+            self._export.write(point_id, *computed)
+        with self._lock:
+            self._points.writerow({**where, **attributes})
+            self._segments.writerows(rows)
+            # a server job may be killed at any point; what finished is on disk
+            self._points_file.flush()
+            self._segments_file.flush()
+
+    def write_profiles(self, point_id, coords, counts) -> None:
+        """One mask_profiles.csv row per (profile, observations, kept) of `counts` at the point."""
+        where = {"id": point_id, "lon": coords[0], "lat": coords[1]}
+        with self._lock:
+            if self._profiles is None:
+                self._profiles_file = open(self.directory / "mask_profiles.csv", "w", newline="")  # noqa: SIM115
+                self._profiles = csv.DictWriter(self._profiles_file, PROFILE_COLUMNS)
+                self._profiles.writeheader()
+            self._profiles.writerows(
+                {**where, "profile": profile, "observations": observations, "kept": kept}
+                for profile, observations, kept in counts
+            )
+            self._profiles_file.flush()
+
+    def _write_plot(self, config, point_id, coords, computed):
+        from .plot import PlotSpec, PlotStyle, build_figure, resolve_plot_style, write_plot_html
+
+        style = resolve_plot_style(config.get("plot_style"), PlotStyle.LIGHT)
+        spec = PlotSpec(config["dataset"], config["band_or_index_to_plot"], coords[0], coords[1])
+        plots = self.directory / "plots"
+        plots.mkdir(exist_ok=True)
+        figure = build_figure(computed[0], computed[1], spec, style=style)
+        safe_id = "".join(character if character.isalnum() or character in "-_" else "_" for character in point_id)
+        write_plot_html(figure, plots / f"ccd_{safe_id}.html", image_filename=f"ccd_{safe_id}", style=style)
+
+    def close(self) -> None:
+        self._points_file.close()
+        self._segments_file.close()
+        if self._profiles_file is not None:
+            self._profiles_file.close()
+        if self._export is not None:
+            self._export.close()
+
+
+def connect(config) -> None:
+    """Initialize Earth Engine and the request limits for `config`, as the dock does."""
+    initialize_earth_engine(endpoint_url(config["high_volume_endpoint"], config["endpoint_url"]))
+    batch_limit.set_limit(config["batch_concurrency"])
+    request_quota.configure(config["requests_per_second"], config["max_concurrent_requests"])
+
+
+def compare_profiles(config, points, writer: ResultWriter, report=lambda message: None) -> None:
+    """Write how many observations each of the job's mask profiles keeps at each point.
+
+    One unmasked fetch per point, on the grid its run was sampled on, masked locally under every
+    profile. A point whose fetch fails is reported and left out.
+    """
+    profiles = mask_profiles(config)
+    settings = ccd_settings(config)
+    for point_id, coords in points:
+        try:
+            raw = fetch_landsat_raw(
+                coords,
+                settings["date_range"],
+                settings["doy_range"],
+                grid=lookup_grid(cache_key(coords, settings)),
+                priority=Priority.BATCH,
+            )
+        except Exception as error:
+            report(f"No mask profile comparison at {point_id}: {error}")
+            continue
+        if raw is None:
+            continue
+        counts = []
+        for name, profile in profiles.items():
+            masked = apply_mask_profile(raw, profile)
+            counts.append((name, len(masked["time"]), int(np.isfinite(masked["Red"]).sum())))
+        writer.write_profiles(point_id, coords, counts)
+
+
+def run_job(groups, writer: ResultWriter, workers=None, report=lambda message: None) -> BatchProgress:
+    """Compute every group of read_job, streaming each point to `writer`."""
+    progress = BatchProgress(sum(len(points) for _, points in groups))
+    for config, points in groups:
+        connect(config)
+        coords_of = dict(points)
+
+        def on_result(point_id, attributes, computed, config=config, coords_of=coords_of):
+            writer.write(config, point_id, coords_of[point_id], attributes, computed)
+
+        run_pipeline(
+            points,
+            config,
+            progress,
+            workers or config["batch_concurrency"],
+            on_result=on_result,
+            on_wait=lambda: report(progress.summary()),
+            wait_seconds=10,
+        )
+        if config["mask_profiles"]:
+            compare_profiles(config, points, writer, report)
+    return progress
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m core.cli", description="Run a CCD job without QGIS.")
+    parser.add_argument("job", help="YAML or CSV job, with the keys of a configuration saved from the plugin")
+    parser.add_argument("-o", "--output", required=True, help="directory the results are written to")
+    parser.add_argument("--settings", help="YAML configuration under the job's own settings")
+    parser.add_argument("--workers", type=int, help="points computed at once (default: batch_concurrency)")
+    parser.add_argument("--cache-dir", help="disk cache directory (default: <output>/cache)")
+    parser.add_argument("--plots", action="store_true", help="also write an HTML plot per point")
+    parser.add_argument("--export", choices=EXPORT_FORMATS, help="also export observations and segments")
+    args = parser.parse_args(argv)
+
+    settings = {}
+    if args.settings:
+        import yaml
+
+        with open(args.settings) as stream:
+            settings = yaml.safe_load(stream) or {}
+    try:
+        groups = read_job(args.job, settings)
+    except (OSError, ValueError, KeyError) as error:
+        parser.error(str(error))
+
+    set_persistent_cache(DiskCache(args.cache_dir or Path(args.output) / "cache"))
+    writer = ResultWriter(args.output, plots=args.plots, export_format=args.export)
+    try:
+        progress = run_job(groups, writer, args.workers, report=lambda message: print(message, file=sys.stderr))
+    finally:
+        writer.close()
+        set_persistent_cache(None)
+    print(progress.summary(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
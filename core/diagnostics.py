@@ -0,0 +1,80 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+Counters and timings for a CCD run, so that where the time went can be read off a finished run
+instead of guessed at. Nothing here touches Qt or Earth Engine.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RunDiagnostics:
+    """Counters and accumulated timings recorded while one run executes.
+
+    Thread-safe: the two Earth Engine requests of a run record into it from different threads.
+    """
+
+    __slots__ = ("_lock", "counters", "timings")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[str, int] = {}
+        self.timings: dict[str, float] = {}
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    @contextmanager
+    def timed(self, name: str):
+        """Accumulate the wall time spent inside the block under `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def summary(self) -> str:
+        """One line per run, in the order things were first recorded."""
+        with self._lock:
+            parts = [f"{name} {seconds:.3f}s" for name, seconds in self.timings.items()]
+            parts += [f"{name} {value}" for name, value in self.counters.items()]
+        return ", ".join(parts)
+
+
+@contextmanager
+def timed(diagnostics: RunDiagnostics | None, name: str):
+    """RunDiagnostics.timed that tolerates runs nobody is measuring."""
+    if diagnostics is None:
+        yield
+        return
+    with diagnostics.timed(name):
+        yield
+
+
+def count(diagnostics: RunDiagnostics | None, name: str, amount: int = 1) -> None:
+    """RunDiagnostics.count that tolerates runs nobody is measuring."""
+    if diagnostics is not None:
+        diagnostics.count(name, amount)
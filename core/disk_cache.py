@@ -0,0 +1,108 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+CCD results kept on disk, under the in-memory cache of ccd_process, so a rerun costs nothing.
+
+One .npz file per cache key: the time series columns as arrays, the CCDC result and the index
+set it was built with as JSON. Nothing is pickled, so a cache directory shared between servers
+cannot run code. Files are written to a temporary name and renamed, so a reader never sees half
+of one and concurrent writers of the same key just replace each other's complete entry.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Final
+
+import numpy as np
+
+from .plot_data import CcdcResult
+from .timeseries import TEXT_COLUMNS, TimeSeries
+
+# bump when the stored layout changes; older entries then read as misses
+DISK_CACHE_VERSION: Final = 1
+_SERIES_PREFIX: Final = "series_"
+
+
+class DiskCache:
+    """A directory of CCD results, keyed and served like ccd_process.lookup_result."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key) -> Path:
+        # repr of the key is stable: it only holds tuples, strings and numbers
+        digest = hashlib.sha256(repr((DISK_CACHE_VERSION, key)).encode()).hexdigest()
+        return self.directory / f"{digest[:40]}.npz"
+
+    def _read(self, key):
+        path = self.path(key)
+        if not path.is_file():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                # a digest collision, or a file from something else
+                if str(data["key"]) != repr(key):
+                    return None
+                built = tuple(json.loads(str(data["indices"])))
+                ccdc_info = CcdcResult(json.loads(str(data["ccdc_info"])))
+                timeseries = {}
+                for name in data.files:
+                    if name.startswith(_SERIES_PREFIX):
+                        column = name.removeprefix(_SERIES_PREFIX)
+                        values = data[name]
+                        timeseries[column] = values.astype(object) if column in TEXT_COLUMNS else values
+        except (OSError, ValueError, KeyError):
+            # truncated by a crash mid-write on a filesystem without atomic rename, or not ours
+            return None
+        return built, ccdc_info, TimeSeries(timeseries)
+
+    def load(self, key, indices):
+        """(built, ccdc_info, timeseries) when the entry carries every index in `indices`, else None."""
+        entry = self._read(key)
+        if entry is None or not set(indices) <= set(entry[0]):
+            return None
+        return entry
+
+    def store(self, key, indices, ccdc_info, timeseries) -> None:
+        """Write a result, unless the entry on disk already covers more indices."""
+        existing = self._read(key)
+        if existing is not None and set(indices) < set(existing[0]):
+            return
+        arrays = {
+            f"{_SERIES_PREFIX}{name}": np.asarray(column, dtype=str if name in TEXT_COLUMNS else float)
+            for name, column in timeseries.items()
+        }
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as stream:
+                np.savez(
+                    stream,
+                    key=np.array(repr(key)),
+                    indices=np.array(json.dumps(list(indices))),
+                    ccdc_info=np.array(json.dumps(dict(ccdc_info))),
+                    **arrays,
+                )
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            Path(temporary).unlink(missing_ok=True)
+            raise
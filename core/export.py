@@ -0,0 +1,231 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+
+Columnar exports of CCD results, for analysis outside QGIS: Parquet, or a GeoPackage.
+
+Two tables, each built from the cached arrays of a result rather than row by row:
+
+- observations: a row per observation of each point - point_id, scene_id, the sampled pixel's
+  longitude/latitude, time and every band and index of the time series.
+- segments: a row per model segment of each point - point_id, segment, tStart, tEnd, tBreak,
+  changeProb, numObs and, for each fitted band, its rmse, magnitude and coefficients.
+
+Times are epoch milliseconds, as Earth Engine reports them. Rows are buffered and written a row
+group at a time, so an export of any number of points holds at most one row group per table in
+memory. pyarrow (Parquet) and GDAL (GeoPackage; QGIS ships it) are imported only when used.
+"""
+
+import math
+import threading
+from pathlib import Path
+from typing import Final
+
+import numpy as np
+
+from .plot_data import CCDC_COEFFICIENT_COUNT, SEGMENT_VALUES, CcdcResult
+from .timeseries import TEXT_COLUMNS
+
+EXPORT_FORMATS: Final = ("parquet", "gpkg")
+# rows buffered per table before they are written as one row group (or one GeoPackage transaction)
+EXPORT_ROW_GROUP_ROWS: Final = 65_536
+
+
+def observation_columns(point_id, timeseries) -> dict:
+    """The observations table of one point: {column: array}, from compute_ccd's time series."""
+    rows = len(timeseries.get("time", ()))
+    columns = {"point_id": np.full(rows, str(point_id), dtype=object)}
+    for name, values in timeseries.items():
+        text = name in TEXT_COLUMNS
+        columns["scene_id" if name == "id" else name] = np.asarray(values, dtype=object if text else float)
+    return columns
+
+
+def segment_columns(point_id, ccdc_info) -> dict:
+    """The segments table of one point: {column: array}, from compute_ccd's CCDC result."""
+    result = CcdcResult.of(ccdc_info)
+    columns = {
+        "point_id": np.full(result.segments, str(point_id), dtype=object),
+        "segment": np.arange(1, result.segments + 1, dtype=np.int64),
+    }
+    columns.update({name: getattr(result, attribute) for name, attribute in SEGMENT_VALUES.items()})
+    for index, band in enumerate(result.bands):
+        columns[f"{band}_rmse"] = result.rmse[:, index]
+        columns[f"{band}_magnitude"] = result.magnitude[:, index]
+        columns.update(
+            {f"{band}_coef_{term}": result.coefficients[:, index, term] for term in range(CCDC_COEFFICIENT_COUNT)}
+        )
+    return columns
+
+
+class TableStream:
+    """Buffers tables of one schema and hands them to `sink` a row group at a time.
+
+    The schema is the first table's columns: a later table's extra columns are dropped and its
+    missing ones filled with NaN (or empty text), so every row group matches.
+    """
+
+    def __init__(self, sink, row_group_rows=EXPORT_ROW_GROUP_ROWS):
+        self.sink = sink
+        self.row_group_rows = row_group_rows
+        self._schema = None
+        self._buffered = []
+        self._rows = 0
+
+    def append(self, columns: dict) -> None:
+        if self._schema is None:
+            self._schema = {name: values.dtype for name, values in columns.items()}
+        rows = len(next(iter(columns.values()))) if columns else 0
+        if not rows:
+            return
+        self._buffered.append(
+            {
+                name: columns[name] if name in columns else np.full(rows, "" if dtype.kind == "O" else np.nan, dtype)
+                for name, dtype in self._schema.items()
+            }
+        )
+        self._rows += rows
+        if self._rows >= self.row_group_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffered:
+            return
+        group = {name: np.concatenate([table[name] for table in self._buffered]) for name in self._schema}
+        self._buffered = []
+        self._rows = 0
+        self.sink.write(group)
+
+    def close(self) -> None:
+        self.flush()
+        self.sink.close()
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+
+    def write(self, columns) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table(columns)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+class _GeoPackageSink:
+    """One table of a GeoPackage; a point layer when the rows carry longitude/latitude."""
+
+    def __init__(self, dataset, name):
+        self.dataset = dataset
+        self.name = name
+        self._layer = None
+
+    def _create_layer(self, columns):
+        from osgeo import ogr, osr
+
+        point = "longitude" in columns and "latitude" in columns
+        reference = osr.SpatialReference()
+        reference.ImportFromEPSG(4326)
+        layer = self.dataset.CreateLayer(
+            self.name, reference if point else None, ogr.wkbPoint if point else ogr.wkbNone
+        )
+        for name, values in columns.items():
+            if values.dtype.kind == "O":
+                kind = ogr.OFTString
+            elif np.issubdtype(values.dtype, np.integer):
+                kind = ogr.OFTInteger64
+            else:
+                kind = ogr.OFTReal
+            layer.CreateField(ogr.FieldDefn(name, kind))
+        return layer
+
+    def write(self, columns) -> None:
+        from osgeo import ogr
+
+        if self._layer is None:
+            self._layer = self._create_layer(columns)
+        layer = self._layer
+        definition = layer.GetLayerDefn()
+        names = list(columns)
+        # OGR takes features one at a time; a transaction per row group keeps that fast
+        values = [columns[name].tolist() for name in names]
+        point = layer.GetGeomType() == ogr.wkbPoint
+        layer.StartTransaction()
+        for row in zip(*values, strict=True):
+            feature = ogr.Feature(definition)
+            for index, value in enumerate(row):
+                if value is None or (isinstance(value, float) and math.isnan(value)):
+                    feature.SetFieldNull(index)
+                else:
+                    feature.SetField(index, value)
+            if point:
+                fields = dict(zip(names, row, strict=True))
+                geometry = ogr.Geometry(ogr.wkbPoint)
+                geometry.AddPoint_2D(fields["longitude"], fields["latitude"])
+                feature.SetGeometry(geometry)
+            layer.CreateFeature(feature)
+        layer.CommitTransaction()
+
+    def close(self) -> None:
+        pass
+
+
+class ColumnarExport:
+    """Streams the observations and segments of each finished point to `directory`.
+
+    observations.parquet and segments.parquet, or the two layers of ccd_results.gpkg.
+    """
+
+    def __init__(self, directory, export_format="parquet", row_group_rows=EXPORT_ROW_GROUP_ROWS):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {export_format!r}; expected one of {', '.join(EXPORT_FORMATS)}.")
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._dataset = None
+        if export_format == "parquet":
+            sinks = [_ParquetSink(directory / f"{name}.parquet") for name in ("observations", "segments")]
+        else:
+            from osgeo import ogr
+
+            ogr.UseExceptions()
+            self._dataset = ogr.GetDriverByName("GPKG").CreateDataSource(str(directory / "ccd_results.gpkg"))
+            sinks = [_GeoPackageSink(self._dataset, name) for name in ("observations", "segments")]
+        self.observations, self.segments = (TableStream(sink, row_group_rows) for sink in sinks)
+
+    def write(self, point_id, ccdc_info, timeseries) -> None:
+        observations = observation_columns(point_id, timeseries)
+        segments = segment_columns(point_id, ccdc_info)
+        with self._lock:
+            self.observations.append(observations)
+            self.segments.append(segments)
+
+    def close(self) -> None:
+        with self._lock:
+            self.observations.close()
+            self.segments.close()
+            self._dataset = None
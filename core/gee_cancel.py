@@ -0,0 +1,190 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+Aborting Earth Engine requests that are already on the wire.
+
+A getInfo blocks its thread until Earth Engine answers, which for a long series is tens of
+seconds, and checking cancelled() around it cannot shorten that. So each request made for a run
+that can be cancelled is watched: the connection carrying it registers itself, and a monitor
+thread that sees the run cancelled shuts that connection's socket down. The blocked read then
+fails at once, the request is reported as RequestCancelled, and the worker thread, the quota slot
+and the connection are all free again.
+"""
+
+import functools
+import socket
+import threading
+from collections.abc import Callable
+from contextlib import contextmanager
+from typing import Final
+
+# How often the monitor asks whether a watched run was cancelled.
+MONITOR_POLL_SECONDS: Final = 0.05
+
+
+class RequestCancelled(Exception):
+    """A request aborted because its run was cancelled. Not an OSError, so nothing retries it."""
+
+
+class InFlightRequest:
+    """One request of a cancellable run, and the connection carrying it once it has one."""
+
+    __slots__ = ("_connection", "_lock", "aborted", "cancelled")
+
+    def __init__(self, cancelled: Callable[[], bool]):
+        self._lock = threading.Lock()
+        self._connection = None
+        self.aborted = False
+        self.cancelled = cancelled
+
+    def attach(self, connection) -> None:
+        with self._lock:
+            if self.aborted:
+                raise RequestCancelled("The run was cancelled before the request was sent.")
+            self._connection = connection
+
+    def detach(self) -> None:
+        with self._lock:
+            self._connection = None
+
+    def abort(self) -> None:
+        """Unblock whatever is reading from this request's socket; it is never reused after."""
+        with self._lock:
+            self.aborted = True
+            connection = self._connection
+        sock = getattr(connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                # already closed: the request is over anyway
+                pass
+
+
+# the request the current thread is sending, for the connection that ends up carrying it
+_current = threading.local()
+
+
+class CancellationMonitor:
+    """Polls the runs behind in-flight requests and aborts those that were cancelled.
+
+    Its thread only exists while something is being watched.
+    """
+
+    def __init__(self, poll_seconds: float = MONITOR_POLL_SECONDS):
+        self._poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._watched: set[InFlightRequest] = set()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @contextmanager
+    def watch(self, cancelled: Callable[[], bool] | None):
+        """Send the requests made inside the block as ones `cancelled` can abort.
+
+        Yields the InFlightRequest, or None when there is nothing to watch for.
+        """
+        if cancelled is None:
+            yield None
+            return
+        request = InFlightRequest(cancelled)
+        previous = getattr(_current, "request", None)
+        _current.request = request
+        with self._lock:
+            self._watched.add(request)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="ccd-gee-cancel", daemon=True)
+                self._thread.start()
+        try:
+            yield request
+        finally:
+            _current.request = previous
+            request.detach()
+            with self._lock:
+                self._watched.discard(request)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._poll_seconds):
+            with self._lock:
+                if not self._watched:
+                    self._thread = None
+                    return
+                watched = [request for request in self._watched if not request.aborted]
+            for request in watched:
+                try:
+                    cancelled = request.cancelled()
+                except Exception:
+                    # a task object deleted under us: nobody is waiting for this request any more
+                    cancelled = True
+                if cancelled:
+                    request.abort()
+        with self._lock:
+            self._thread = None
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def _attach(connection) -> None:
+    in_flight = getattr(_current, "request", None)
+    if in_flight is not None:
+        in_flight.attach(connection)
+
+
+@functools.cache
+def _adapter_class():
+    """An HTTPAdapter whose connections register with the request being sent on them.
+
+    Built on first use, so importing this module does not import requests.
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class CancellableHTTPConnection(HTTPConnection):
+        def request(self, *args, **kwargs):
+            _attach(self)
+            return super().request(*args, **kwargs)
+
+    class CancellableHTTPSConnection(HTTPSConnection):
+        def request(self, *args, **kwargs):
+            _attach(self)
+            return super().request(*args, **kwargs)
+
+    class CancellableHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = CancellableHTTPConnection
+
+    class CancellableHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = CancellableHTTPSConnection
+
+    class CancellableAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": CancellableHTTPConnectionPool,
+                "https": CancellableHTTPSConnectionPool,
+            }
+
+    return CancellableAdapter
+
+
+def cancellable_adapter(**kwargs):
+    """An HTTPAdapter, taking the same arguments, whose requests CancellationMonitor can abort."""
+    return _adapter_class()(**kwargs)
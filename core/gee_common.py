@@ -21,6 +21,7 @@ Pieces shared by the Landsat and Sentinel-2 collection builders: the common band
 schema, the date/day-of-year filter and the spectral indices.
 """
 
+from numbers import Real
 from typing import Final
 
 OPTICAL_BANDS: Final = ("Blue", "Green", "Red", "NIR", "SWIR1", "SWIR2")
@@ -41,6 +42,11 @@ INDEX_RANGE: Final = (-1.0, 1.0)
 # they are disabled. Every scene in the date range is wanted, so no day-of-year filter is built.
 FULL_YEAR: Final = (1, 365)
 
+# How many scenes of one acquisition day each image of a collapsed collection stands for.
+SAME_DAY_SCENES: Final = "same_day_scenes"
+_SAME_DAY_KEY: Final = "same_day_key"
+_SAME_DAY_MATCHES: Final = "same_day_matches"
+
 
 def date_and_doy_filter(date_range, doy_range):
     """Filter for the date range, narrowed to a day-of-year window when one was asked for.
@@ -64,13 +70,65 @@ def date_and_doy_filter(date_range, doy_range):
     return ee.Filter.And(date_filter, doy_filter)
 
 
+def point_geometry(coords):
+    """An ee.Geometry.Point at a (lon, lat) pair, or a MultiPoint at a sequence of them."""
+    import ee
+
+    return ee.Geometry.Point(coords) if isinstance(coords[0], Real) else ee.Geometry.MultiPoint(list(coords))
+
+
 def filter_collection(collection_name, point, date_range, doy_range):
-    """Collection restricted to the images covering the point inside the date and DOY window."""
+    """Collection restricted to the images covering the point (any of the points) inside the date and DOY window."""
     import ee
 
     return ee.ImageCollection(collection_name).filterBounds(point).filter(date_and_doy_filter(date_range, doy_range))
 
 
+def collapse_same_day(collection, sensor_property=None):
+    """One image per acquisition day (and sensor, when `sensor_property` names it), masked first.
+
+    filterBounds keeps every scene whose footprint holds the point, so where Sentinel-2 MGRS tiles
+    or consecutive Landsat rows overlap the same acquisition comes back two or more times: the
+    plot shows it twice, getRegion returns it twice and CCDC weighs it twice. Duplicates are
+    mosaicked, which per pixel keeps the first scene the mask left a value in, so call this after
+    masking or a cloudy copy can hide a clear one. A day with a single scene is passed through
+    untouched. Every image gets SAME_DAY_SCENES, so the scenes saved can be totalled from the
+    collection without sampling it.
+    """
+    import ee
+
+    def keyed(image):
+        day = image.date().format("YYYY-MM-dd")
+        if sensor_property:
+            day = ee.String(image.get(sensor_property)).cat(" ").cat(day)
+        return image.set(_SAME_DAY_KEY, day)
+
+    keyed_collection = collection.map(keyed)
+    joined = ee.Join.saveAll(matchesKey=_SAME_DAY_MATCHES).apply(
+        primary=keyed_collection.distinct(_SAME_DAY_KEY),
+        secondary=keyed_collection,
+        condition=ee.Filter.equals(leftField=_SAME_DAY_KEY, rightField=_SAME_DAY_KEY),
+    )
+
+    def merge(image):
+        image = ee.Image(image)
+        scenes = ee.ImageCollection.fromImages(image.get(_SAME_DAY_MATCHES))
+        # a mosaic has no native grid of its own; give it the scene's, which the catalog request
+        # reads to pin getRegion and CCDC to the source pixels. Nor has it a footprint: clipped to
+        # its scenes', a getRegion over several points skips the day where none of them holds a
+        # point, as it skips a single scene that does not.
+        mosaic = (
+            scenes.mosaic()
+            .clip(scenes.geometry())
+            .setDefaultProjection(image.select(0).projection())
+            .copyProperties(image, ["system:time_start", "system:index"])
+        )
+        single = scenes.first()
+        return ee.Image(ee.Algorithms.If(scenes.size().gt(1), mosaic, single)).set(SAME_DAY_SCENES, scenes.size())
+
+    return ee.ImageCollection(joined).map(merge)
+
+
 def add_indices(image, tc_coefficients, indices=INDEX_BANDS):
     """Add the requested spectral indices to a scaled image, in the canonical INDEX_BANDS order.
 
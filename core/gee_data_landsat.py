@@ -28,7 +28,7 @@ C01 datasets were removed from the Google Earth Engine data catalog.
 from dataclasses import dataclass
 from typing import Final
 
-from .gee_common import INDEX_BANDS, OPTICAL_BANDS, add_indices, filter_collection
+from .gee_common import INDEX_BANDS, OPTICAL_BANDS, add_indices, collapse_same_day, filter_collection, point_geometry
 
 # Collection 2 Level-2 scaling (USGS): SR = DN * 2.75e-5 - 0.2 over the valid DN range
 # 7273-43636, which maps exactly onto surface reflectance [0.0, 1.0].
@@ -107,6 +107,33 @@ SENSORS: Final = (
 )
 
 
+@dataclass(frozen=True, slots=True)
+class MaskProfile:
+    """Which pixel-level quality rules reject an observation.
+
+    prepare_image applies a profile on the server, and landsat_masks applies the same one to a
+    series fetched with raw_qa, so the two readings of a profile cannot drift apart.
+    """
+
+    # QA_PIXEL bits rejected; None for each sensor's own set, QA_BITS_TM or QA_BITS_OLI
+    qa_pixel_bits: tuple[int, ...] | None = None
+    saturation: bool = True
+    sr_min: float = SR_MIN
+    sr_max: float = SR_MAX
+    haze: bool = True
+
+    def qa_bitmask(self, spec: SensorSpec) -> int:
+        # ANDing "bit N is 0" over a set of bits is the same as testing the whole bitmask at once
+        bits = spec.qa_pixel_bits if self.qa_pixel_bits is None else self.qa_pixel_bits
+        return sum(1 << bit for bit in bits)
+
+
+DEFAULT_MASK_PROFILE: Final = MaskProfile()
+# The quality columns of a raw_qa series. AEROSOL is the sensor's aerosol_band under one name, so
+# every scene of the merged collection has the same bands.
+RAW_QA_BANDS: Final = ("QA_PIXEL", "QA_RADSAT", "AEROSOL")
+
+
 def _haze_mask(image, spec):
     """Reject hazy retrievals using whichever aerosol product the sensor carries."""
     aerosol = image.select(spec.aerosol_band)
@@ -117,22 +144,29 @@ def _haze_mask(image, spec):
     return aerosol.unmask().lt(ATMOS_OPACITY_MAX)
 
 
-def prepare_image(image, spec):
+def _scaled(image, spec):
+    return image.select(list(spec.optical_bands)).multiply(SR_SCALE).add(SR_OFFSET).rename(list(OPTICAL_BANDS))
+
+
+def prepare_image(image, spec, profile=DEFAULT_MASK_PROFILE):
     """Scale, rename and mask one Collection 2 Level-2 image into the common band schema."""
     import ee
 
-    scaled = image.select(list(spec.optical_bands)).multiply(SR_SCALE).add(SR_OFFSET).rename(list(OPTICAL_BANDS))
+    scaled = _scaled(image, spec)
 
-    # ANDing "bit N is 0" over a set of bits is the same as testing the whole bitmask at once
-    qa_bitmask = sum(1 << bit for bit in spec.qa_pixel_bits)
-    clear = image.select("QA_PIXEL").bitwiseAnd(qa_bitmask).eq(0)
-    no_saturation = image.select("QA_RADSAT").bitwiseAnd(spec.saturation_mask).eq(0)
-    in_range = scaled.reduce(ee.Reducer.min()).gt(SR_MIN).And(scaled.reduce(ee.Reducer.max()).lte(SR_MAX))
+    clear = image.select("QA_PIXEL").bitwiseAnd(profile.qa_bitmask(spec)).eq(0)
+    in_range = (
+        scaled.reduce(ee.Reducer.min()).gt(profile.sr_min).And(scaled.reduce(ee.Reducer.max()).lte(profile.sr_max))
+    )
     # The Landsat 7 SLC-off gaps themselves are already fill, which the QA_PIXEL bit 0 test above
     # rejects. Eroding one further pixel to drop the gap rims as well was measured 1.5-3.5x slower
     # over a 40-year series - a focal op has to fetch a neighbourhood for every ETM+ scene - which
     # is not worth it for the rim alone.
-    mask = clear.And(no_saturation).And(in_range).And(_haze_mask(image, spec))
+    mask = clear.And(in_range)
+    if profile.saturation:
+        mask = mask.And(image.select("QA_RADSAT").bitwiseAnd(spec.saturation_mask).eq(0))
+    if profile.haze:
+        mask = mask.And(_haze_mask(image, spec))
 
     # Arithmetic operations do not carry image properties across, and system:time_start is what
     # sort(), CCDC and getRegion need.
@@ -144,19 +178,37 @@ def prepare_image(image, spec):
     return ee.Image(scaled.updateMask(mask).copyProperties(image, ["system:time_start"]))
 
 
-def get_gee_data_landsat(coords, date_range, doy_range, indices=INDEX_BANDS):
-    """Filtered, masked and index-augmented Landsat Collection 2 series at a point.
-
-    `indices` limits which spectral indices are computed; see gee_common.add_indices.
-    """
+def prepare_raw_image(image, spec):
+    """The scaled optical bands with nothing masked, and the quality bands the masks are made from."""
     import ee
 
-    point = ee.Geometry.Point(coords)
+    quality = image.select(["QA_PIXEL", "QA_RADSAT", spec.aerosol_band], list(RAW_QA_BANDS))
+    return ee.Image(_scaled(image, spec).addBands(quality).copyProperties(image, ["system:time_start"]))
+
+
+def get_gee_data_landsat(
+    coords, date_range, doy_range, indices=INDEX_BANDS, profile=DEFAULT_MASK_PROFILE, raw_qa=False
+):
+    """Filtered, masked and index-augmented Landsat Collection 2 series at a point, or at several.
+
+    `coords` is a (lon, lat) pair or a sequence of them; see gee_common.point_geometry. `indices`
+    limits which spectral indices are computed; see gee_common.add_indices. With `raw_qa`
+    nothing is masked and no index is built: the series carries RAW_QA_BANDS instead, for
+    landsat_masks to apply any MaskProfile to locally.
+    """
+    point = point_geometry(coords)
 
     def build(spec):
-        return filter_collection(spec.collection, point, date_range, doy_range).map(
-            lambda image: add_indices(prepare_image(image, spec), spec.tc_coefficients, indices)
-        )
+        collection = filter_collection(spec.collection, point, date_range, doy_range)
+        if raw_qa:
+            collection = collection.map(lambda image: prepare_raw_image(image, spec))
+        else:
+            collection = collection.map(
+                lambda image: add_indices(prepare_image(image, spec, profile), spec.tc_coefficients, indices)
+            )
+        # Consecutive rows of a path overlap; each collection is one sensor, so the day is the key.
+        # Unmasked, a cloudy copy would hide a clear one, so landsat_masks collapses raw_qa series.
+        return collection if raw_qa else collapse_same_day(collection)
 
     collections = [build(spec) for spec in SENSORS]
     merged = collections[0]
@@ -21,7 +21,15 @@
 
 from typing import Final
 
-from .gee_common import INDEX_BANDS, OPTICAL_BANDS, add_indices, filter_collection, resolve_indices
+from .gee_common import (
+    INDEX_BANDS,
+    OPTICAL_BANDS,
+    add_indices,
+    collapse_same_day,
+    filter_collection,
+    point_geometry,
+    resolve_indices,
+)
 
 S2_SR: Final = "COPERNICUS/S2_SR_HARMONIZED"
 S2_CLOUD_PROBABILITY: Final = "COPERNICUS/S2_CLOUD_PROBABILITY"
@@ -55,14 +63,25 @@ CS_PLUS_BAND: Final = "cs_cdf"
 CS_PLUS_THRESHOLD: Final = 0.60
 
 # s2cloudless tuning (Earth Engine community cloud-masking recipe)
+S2_CLOUD_PROBABILITY_BAND: Final = "probability"
 CLOUD_PROBABILITY_THRESHOLD: Final = 50
 DARK_NIR_THRESHOLD: Final = 0.15
 CLOUD_PROJECTION_DISTANCE_KM: Final = 1
 CLOUD_BUFFER_METERS: Final = 50
+# the shadow projection runs on a coarser grid than the masks, in metres per pixel
+SHADOW_PROJECTION_SCALE: Final = 100
+
+# How far from the point the quality inputs can still change its mask: a cloud one projection
+# distance away casts shadow here, and the buffer grows that rejection further. One coarse pixel
+# either side absorbs the grid alignment of the two reprojections, and one more keeps the prefetched
+# neighbouring pixels inside. Clipping the inputs to it leaves the verdict at the point unchanged.
+QUALITY_WINDOW_METERS: Final = CLOUD_PROJECTION_DISTANCE_KM * 1000 + CLOUD_BUFFER_METERS + 3 * SHADOW_PROJECTION_SCALE
 
 # Order matches the combo box in ui/advanced_settings.ui; the first entry is the default there too.
 CLOUD_FILTERS: Final = ("Cloud Score+", "s2cloudless", "Sen2Cor", "No Mask")
 DEFAULT_CLOUD_FILTER: Final = CLOUD_FILTERS[0]
+# Bit i of this band is set where CLOUD_FILTERS[i] keeps the pixel; see add_cloud_flags.
+CLOUD_FLAGS_BAND: Final = "CLOUD_FLAGS"
 
 # Tasseled cap for Sentinel-2 MSI - Shi, T. & Xu, H. (2019). Derivation of tasseled cap
 # transformation coefficients for Sentinel-2 MSI at-sensor reflectance data. IEEE JSTARS,
@@ -92,7 +111,11 @@ def scl_mask(image):
     return rejected.Not()
 
 
-def _grow_rejection(keep_mask, image, radius_meters):
+def _clipped(image, window):
+    return image if window is None else image.clip(window)
+
+
+def _grow_rejection(keep_mask, image, radius_meters, window=None):
     """Take a keep mask and return it with its rejected area grown by a radius.
 
     Cloud and shadow edges are systematically under-detected, and their rim pixels are a common
@@ -100,108 +123,162 @@ def _grow_rejection(keep_mask, image, radius_meters):
 
     Pinned to the 20 m SCL grid: without an explicit reproject a focal operation runs at whatever
     scale the consumer requests, so the same collection would be masked differently depending on
-    how it is sampled.
+    how it is sampled. Given a `window`, the mask is clipped to it first, so the focal operation
+    only reads the tiles around the point instead of a neighbourhood of every scene.
     """
     return (
-        keep_mask.Not()
+        _clipped(keep_mask, window)
+        .Not()
         .focal_max(radius_meters, "circle", "meters")
         .reproject(crs=image.select("SCL").projection(), scale=SCL_SCALE)
         .Not()
     )
 
 
-def _link_quality_band(collection, quality_name, point, date_range, doy_range, band, property_name):
-    """Attach a per-scene quality image, keeping scenes that have no match.
+def _link_quality_band(collection, quality_name, point, date_range, doy_range, band):
+    """Add each scene's quality band from its namesake in `quality_name`.
+
+    linkCollection matches on system:index as the old outer ee.Join.saveFirst did, but attaches
+    the band directly: the join stored a whole image in a property of every scene, which each
+    mask then had to unwrap behind an ee.Algorithms.If, and it dominated the server time of long
+    series. A scene with no quality image keeps its place with the band fully masked, so the
+    masks below treat a masked quality pixel as "no verdict" and fall back from it.
+    """
+    quality = filter_collection(quality_name, point, date_range, doy_range)
+    return collection.linkCollection(quality, [band])
+
+
+def _cloud_score_clear(image):
+    """Where Cloud Score+ calls the image clear; it scores cloud, cirrus, haze and shadow in one band."""
+    # scenes outside the Cloud Score+ archive keep only the SCL floor
+    return image.select(CS_PLUS_BAND).gte(CS_PLUS_THRESHOLD).unmask(1)
+
 
-    ee.Join.saveFirst defaults to an inner join, which silently drops every scene whose quality
-    image is missing - the series just ends early with no warning. An outer join keeps the scene
-    and leaves the property null so the caller can fall back.
+def _s2cloudless_clear(image, window=None):
+    """Where s2cloudless sees neither cloud nor the shadow the sun projects from it.
+
+    Both the shadow projection and the buffer read a neighbourhood; with a `window` their inputs
+    are clipped to it first.
     """
     import ee
 
-    quality = filter_collection(quality_name, point, date_range, doy_range).select(band)
-    return ee.ImageCollection(
-        ee.Join.saveFirst(matchKey=property_name, outer=True).apply(
-            primary=collection,
-            secondary=quality,
-            condition=ee.Filter.equals(leftField="system:index", rightField="system:index"),
+    quality = _clipped(image.select([S2_CLOUD_PROBABILITY_BAND, "SCL", "NIR"]), window)
+    # a missing probability must not be read as "no cloud everywhere", so fall back to the SCL
+    # cloud classes, which are always present
+    is_cloud = (
+        quality.select(S2_CLOUD_PROBABILITY_BAND)
+        .gt(CLOUD_PROBABILITY_THRESHOLD)
+        .unmask(quality.select("SCL").gte(8))
+        .rename("clouds")
+    )
+
+    # cloud shadows are dark NIR pixels lying where the sun projects the cloud
+    not_water = quality.select("SCL").neq(6)
+    dark = quality.select("NIR").lt(DARK_NIR_THRESHOLD).And(not_water)
+    shadow_azimuth = ee.Number(90).subtract(ee.Number(image.get("MEAN_SOLAR_AZIMUTH_ANGLE")))
+    projected = (
+        is_cloud.directionalDistanceTransform(
+            shadow_azimuth, CLOUD_PROJECTION_DISTANCE_KM * 1000 // SHADOW_PROJECTION_SCALE
         )
+        .reproject(crs=image.select("SCL").projection(), scale=SHADOW_PROJECTION_SCALE)
+        .select("distance")
+        .mask()
     )
+    cloud_or_shadow = is_cloud.Or(projected.And(dark))
+    return _grow_rejection(cloud_or_shadow.Not(), image, CLOUD_BUFFER_METERS, window)
+
+
+def _sen2cor_clear(image, window=None):
+    """The Sen2Cor scene classification, dilated to cover under-detected cloud edges."""
+    return _grow_rejection(scl_mask(image), image, CLOUD_BUFFER_METERS, window)
+
+
+def _link_cloud_score(collection, point, date_range, doy_range):
+    return _link_quality_band(collection, CLOUD_SCORE_PLUS, point, date_range, doy_range, CS_PLUS_BAND)
+
+
+def _link_cloud_probability(collection, point, date_range, doy_range):
+    return _link_quality_band(collection, S2_CLOUD_PROBABILITY, point, date_range, doy_range, S2_CLOUD_PROBABILITY_BAND)
 
 
 def apply_cloud_score_plus(collection, point, date_range, doy_range):
-    """Mask with Cloud Score+, which scores cloud, cirrus, haze and shadow in a single band."""
+    """Mask with Cloud Score+ over the SCL floor."""
     import ee
 
-    linked = _link_quality_band(collection, CLOUD_SCORE_PLUS, point, date_range, doy_range, CS_PLUS_BAND, "cloud_score")
-
     def mask_image(image):
         image = ee.Image(image)
-        score = image.get("cloud_score")
-        # scenes outside the Cloud Score+ archive keep only the SCL floor
-        clear = ee.Image(
-            ee.Algorithms.If(
-                score,
-                ee.Image(score).select(CS_PLUS_BAND).gte(CS_PLUS_THRESHOLD),
-                ee.Image.constant(1),
-            )
-        )
-        return image.updateMask(clear.And(scl_mask(image)))
+        return image.updateMask(_cloud_score_clear(image).And(scl_mask(image)))
 
-    return linked.map(mask_image)
+    return _link_cloud_score(collection, point, date_range, doy_range).map(mask_image)
 
 
-def apply_s2cloudless(collection, point, date_range, doy_range):
+def apply_s2cloudless(collection, point, date_range, doy_range, window=None):
     """Mask with s2cloudless probabilities plus a solar-geometry cloud-shadow projection."""
     import ee
 
-    linked = _link_quality_band(
-        collection, S2_CLOUD_PROBABILITY, point, date_range, doy_range, "probability", "cloud_probability"
-    )
-
     def mask_image(image):
         image = ee.Image(image)
-        probability = image.get("cloud_probability")
-        # a missing probability scene must not be read as "no cloud everywhere", so fall back to
-        # the SCL cloud classes, which are always present
-        is_cloud = ee.Image(
-            ee.Algorithms.If(
-                probability,
-                ee.Image(probability).select("probability").gt(CLOUD_PROBABILITY_THRESHOLD),
-                image.select("SCL").gte(8),
-            )
-        ).rename("clouds")
-
-        # cloud shadows are dark NIR pixels lying where the sun projects the cloud
-        not_water = image.select("SCL").neq(6)
-        dark = image.select("NIR").lt(DARK_NIR_THRESHOLD).And(not_water)
-        shadow_azimuth = ee.Number(90).subtract(ee.Number(image.get("MEAN_SOLAR_AZIMUTH_ANGLE")))
-        projected = (
-            is_cloud.directionalDistanceTransform(shadow_azimuth, CLOUD_PROJECTION_DISTANCE_KM * 10)
-            .reproject(crs=image.select("SCL").projection(), scale=100)
-            .select("distance")
-            .mask()
-        )
-        cloud_or_shadow = is_cloud.Or(projected.And(dark))
-        clear = _grow_rejection(cloud_or_shadow.Not(), image, CLOUD_BUFFER_METERS)
-        return image.updateMask(clear.And(scl_mask(image)))
+        return image.updateMask(_s2cloudless_clear(image, window).And(scl_mask(image)))
 
-    return linked.map(mask_image)
+    return _link_cloud_probability(collection, point, date_range, doy_range).map(mask_image)
 
 
-def apply_sen2cor(collection):
+def apply_sen2cor(collection, window=None):
     """Mask with the Sen2Cor scene classification, dilated to cover under-detected cloud edges."""
-    return collection.map(lambda image: image.updateMask(_grow_rejection(scl_mask(image), image, CLOUD_BUFFER_METERS)))
+    return collection.map(lambda image: image.updateMask(_sen2cor_clear(image, window)))
 
 
-def get_gee_data_sentinel(coords, date_range, doy_range, name, cloud_filter=DEFAULT_CLOUD_FILTER, indices=INDEX_BANDS):
-    """Filtered, masked and index-augmented Sentinel-2 L2A series at a point.
+def add_cloud_flags(collection, point, date_range, doy_range, window=None):
+    """Every cloud filter's verdict as bits of a CLOUD_FLAGS band, leaving the image unmasked.
 
-    `indices` limits which spectral indices are computed; see gee_common.add_indices.
+    Bit i is set where CLOUD_FILTERS[i] keeps the pixel, so one sample of the series answers for
+    every filter (see sentinel_masks.apply_cloud_filter). Both quality links and the SCL floor are
+    shared by all the verdicts, in one graph. A verdict that is itself masked counts as rejected,
+    as updateMask would have treated it.
     """
     import ee
 
-    point = ee.Geometry.Point(coords)
+    linked = _link_cloud_probability(
+        _link_cloud_score(collection, point, date_range, doy_range), point, date_range, doy_range
+    )
+
+    def flag_image(image):
+        image = ee.Image(image)
+        floor = scl_mask(image)
+        verdicts = {
+            "Cloud Score+": _cloud_score_clear(image).And(floor),
+            "s2cloudless": _s2cloudless_clear(image, window).And(floor),
+            "Sen2Cor": _sen2cor_clear(image, window),
+            "No Mask": ee.Image.constant(1),
+        }
+        flags = ee.Image.constant(0)
+        for bit, cloud_filter in enumerate(CLOUD_FILTERS):
+            flags = flags.bitwiseOr(verdicts[cloud_filter].unmask(0).gt(0).leftShift(bit))
+        return image.addBands(flags.toUint8().rename(CLOUD_FLAGS_BAND))
+
+    return linked.map(flag_image)
+
+
+def get_gee_data_sentinel(
+    coords,
+    date_range,
+    doy_range,
+    name,
+    cloud_filter=DEFAULT_CLOUD_FILTER,
+    indices=INDEX_BANDS,
+    filter_flags=False,
+    point_local=True,
+):
+    """Filtered, masked and index-augmented Sentinel-2 L2A series at a point, or at several.
+
+    `coords` is a (lon, lat) pair or a sequence of them; see gee_common.point_geometry. `indices`
+    limits which spectral indices are computed; see gee_common.add_indices. With `filter_flags`,
+    no cloud filter is applied and the series carries the CLOUD_FLAGS band of add_cloud_flags
+    instead, so `cloud_filter` is not used. With `point_local`, the masks are only valid within
+    QUALITY_WINDOW_METERS of the points; pass False to sample the collection elsewhere.
+    """
+    point = point_geometry(coords)
+    window = point.buffer(QUALITY_WINDOW_METERS) if point_local else None
     collection_name = S2_SR if name == "Sentinel-2" else name
 
     # No scene-level CLOUDY_PIXEL_PERCENTAGE filter: this is a point analysis, so a scene that is
@@ -210,17 +287,25 @@ def get_gee_data_sentinel(coords, date_range, doy_range, name, cloud_filter=DEFA
         lambda image: add_indices(prepare_bands(image), TC_S2, indices)
     )
 
-    if cloud_filter == "Cloud Score+":
+    if filter_flags:
+        collection = add_cloud_flags(collection, point, date_range, doy_range, window)
+    elif cloud_filter == "Cloud Score+":
         collection = apply_cloud_score_plus(collection, point, date_range, doy_range)
     elif cloud_filter == "s2cloudless":
-        collection = apply_s2cloudless(collection, point, date_range, doy_range)
+        collection = apply_s2cloudless(collection, point, date_range, doy_range, window)
     elif cloud_filter == "Sen2Cor":
-        collection = apply_sen2cor(collection)
+        collection = apply_sen2cor(collection, window)
     elif cloud_filter != "No Mask":
         raise ValueError(f"Unknown cloud filter: {cloud_filter}. Use one of {', '.join(CLOUD_FILTERS)}.")
 
+    # MGRS tiles overlap by about 10 km, and Sentinel-2A and 2B can both pass on one day. Which
+    # copy of a day is clear depends on the filter, so a flags series keeps them all for
+    # sentinel_masks to collapse once one is chosen.
+    if not filter_flags:
+        collection = collapse_same_day(collection, "SPACECRAFT_NAME")
+
     # Drop SCL and the raw L1C/L2A bands: CCDC fits coefficients for every band it is handed, and
     # the raw DN bands would be fitted at 10000x the scale the lambda is tuned for.
     # CCDC and the plot both need the series in chronological order.
-    schema = [*OPTICAL_BANDS, *resolve_indices(indices)]
+    schema = [*OPTICAL_BANDS, *resolve_indices(indices), *([CLOUD_FLAGS_BAND] if filter_flags else [])]
     return collection.select(schema).sort("system:time_start")
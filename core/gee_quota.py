@@ -0,0 +1,175 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+How fast, and how many at once, requests may be sent to Earth Engine.
+
+Every dock, every auto-generated click and every batch job draw from the same project quota, and
+Earth Engine answers a burst over it with 429 errors that fail the run. So requests take a token
+from one shared bucket first, and wait in line by priority when there is none: the plot the user
+is looking at goes ahead of work they are not waiting on.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Final
+
+# A point run is three requests, so this sustains a few clicks a second with room for batch work.
+DEFAULT_REQUESTS_PER_SECOND: Final = 10.0
+# The shared pool overlaps at most eight requests; the catalog requests come on top from task threads.
+DEFAULT_MAX_CONCURRENT_REQUESTS: Final = 8
+MAX_REQUESTS_PER_SECOND: Final = 100.0
+MAX_CONCURRENT_REQUESTS: Final = 40
+# How long nothing new is sent after Earth Engine said the quota is exhausted.
+THROTTLE_SECONDS: Final = 1.0
+
+
+class Priority(IntEnum):
+    """Lanes of the request queue; a lower value is served first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    BATCH = 2
+
+
+class RunPriority:
+    """The lane a run's requests queue in, which can change while the run is in progress.
+
+    A run the user stopped waiting for (a pick replaced by a newer one, but left to finish into
+    the cache) is demoted, so its remaining requests stop competing with the new pick.
+    """
+
+    __slots__ = ("priority",)
+
+    def __init__(self, priority: Priority = Priority.INTERACTIVE):
+        self.priority = priority
+
+    def __call__(self) -> Priority:
+        return self.priority
+
+    def demote(self, priority: Priority = Priority.BACKGROUND) -> None:
+        self.priority = max(self.priority, priority)
+
+
+class RequestQuota:
+    """A token bucket with a concurrency cap and a priority queue in front of it.
+
+    The bucket refills at `requests_per_second` and holds one second's worth, so an idle plugin
+    can still send a click's requests at once. Only the head of the queue may take a token, so a
+    waiting interactive request is never overtaken by batch work that arrived before it.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+        clock=time.monotonic,
+    ):
+        self._condition = threading.Condition()
+        self._clock = clock
+        self._rate = requests_per_second
+        self._max_concurrent = max_concurrent
+        self._tokens = self._capacity
+        self._refilled_at = clock()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._waiting: list[tuple[int, int]] = []
+        self._tickets = itertools.count()
+
+    @property
+    def _capacity(self) -> float:
+        return max(1.0, self._rate)
+
+    @property
+    def requests_per_second(self) -> float:
+        return self._rate
+
+    @property
+    def max_concurrent(self) -> int:
+        return self._max_concurrent
+
+    def configure(self, requests_per_second: float | None = None, max_concurrent: int | None = None) -> None:
+        """Change the limits; requests already sent are not affected."""
+        with self._condition:
+            self._refill(self._clock())
+            if requests_per_second is not None:
+                self._rate = max(0.1, min(float(requests_per_second), MAX_REQUESTS_PER_SECOND))
+                self._tokens = min(self._tokens, self._capacity)
+            if max_concurrent is not None:
+                self._max_concurrent = max(1, min(int(max_concurrent), MAX_CONCURRENT_REQUESTS))
+            self._condition.notify_all()
+
+    def throttle(self, seconds: float = THROTTLE_SECONDS) -> None:
+        """Hold every new request for `seconds`, e.g. after a 429 from Earth Engine."""
+        with self._condition:
+            now = self._clock()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._refilled_at = now
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._refilled_at)
+        self._tokens = min(self._capacity, self._tokens + elapsed * self._rate)
+        self._refilled_at = now
+
+    def acquire(
+        self, priority: Priority = Priority.INTERACTIVE, cancelled=lambda: False, poll_seconds: float = 0.1
+    ) -> bool:
+        """Wait for a turn to send one request; False if `cancelled` turned true first."""
+        ticket = (int(priority), next(self._tickets))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if cancelled():
+                        return False
+                    timeout = poll_seconds
+                    if self._waiting[0] == ticket and self._in_flight < self._max_concurrent:
+                        now = self._clock()
+                        self._refill(now)
+                        if now >= self._paused_until and self._tokens >= 1.0:
+                            self._tokens -= 1.0
+                            self._in_flight += 1
+                            return True
+                        refill_wait = (1.0 - self._tokens) / self._rate
+                        timeout = min(poll_seconds, max(self._paused_until - now, refill_wait))
+                    self._condition.wait(timeout)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                # whoever is at the head now has to look again
+                self._condition.notify_all()
+
+    def release(self) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority: Priority = Priority.INTERACTIVE, cancelled=lambda: False):
+        """Hold a request slot for the block; yields False, without one, if cancelled while waiting."""
+        acquired = self.acquire(priority, cancelled)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release()
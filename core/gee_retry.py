@@ -0,0 +1,218 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+What to do when an Earth Engine request fails: try again after a jittered, growing pause if the
+failure is one that passes (a dropped connection, a 5xx, a 429), give up once the call's deadline
+is near, and stop sending altogether for a while when Earth Engine keeps failing, so every run
+does not sit through the whole backoff only to fail the same way.
+"""
+
+import itertools
+import random
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Final
+
+from .diagnostics import RunDiagnostics, count, timed
+
+# 429 is Earth Engine's "too many requests"; the 5xx are its front end or backend having trouble.
+TRANSIENT_STATUSES: Final = frozenset({429, 500, 502, 503, 504})
+# EEException keeps only the server's message, not the status, so these are recognised by text.
+TRANSIENT_MESSAGES: Final = (
+    "too many concurrent",
+    "too many requests",
+    "rate limit",
+    "service unavailable",
+    "backend error",
+    "internal error",
+    "please try again",
+)
+
+
+class DeadlineExceeded(Exception):
+    """A call ran out of time. Not an OSError, so no layer underneath retries it."""
+
+
+class EarthEngineUnavailable(Exception):
+    """Requests are refused without being sent, because Earth Engine kept failing.
+
+    Carries a message written for the user, since the GUI shows it verbatim in the message bar.
+    """
+
+
+@dataclass(frozen=True, slots=True)
+class RetryPolicy:
+    """How often, and for how long, a failing call is tried again."""
+
+    # tries in total, the first one included
+    attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    # for one call, every attempt and pause included; past it the call fails with DeadlineExceeded
+    call_deadline: float = 180.0
+
+    def delay(self, retry: int, rand: Callable[[], float] = random.random) -> float:
+        """The pause before retry number `retry` (0-based): "full jitter" exponential backoff.
+
+        Spreading the pause over the whole interval, rather than around its end, keeps the
+        requests of runs that failed together from coming back together.
+        """
+        return rand() * min(self.max_delay, self.base_delay * 2**retry)
+
+
+DEFAULT_RETRY_POLICY: Final = RetryPolicy()
+
+
+def _status(error: BaseException) -> int | None:
+    """The HTTP status behind an error, looking through ee's translation of HttpError."""
+    while error is not None:
+        status = getattr(getattr(error, "resp", None), "status", None)
+        if status is not None:
+            return int(status)
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether trying the same request again can succeed."""
+    import ee
+
+    if isinstance(error, (DeadlineExceeded, EarthEngineUnavailable)):
+        return False
+    status = _status(error)
+    if status is not None:
+        return status in TRANSIENT_STATUSES
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, ee.EEException):
+        message = str(error).lower()
+        return any(marker in message for marker in TRANSIENT_MESSAGES)
+    return False
+
+
+class CircuitBreaker:
+    """Fails calls fast once Earth Engine has failed `threshold` times in a row.
+
+    While open, nothing is sent for `cooldown` seconds. After that calls go through again, and
+    the first transient failure opens it for another cooldown while a success closes it. Only
+    transient failures count: a bad request says nothing about whether the service is up.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and self._clock() - self._opened_at < self._cooldown
+
+    def check(self) -> None:
+        """Raise EarthEngineUnavailable if calls are being refused right now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._cooldown - (self._clock() - self._opened_at)
+        if remaining > 0:
+            raise EarthEngineUnavailable(
+                f"Earth Engine failed {self._threshold} requests in a row and looks unavailable, so "
+                f"nothing is sent for the next {remaining:.0f} s. "
+                "Check https://status.cloud.google.com or try again shortly."
+            )
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self._threshold:
+                self._opened_at = self._clock()
+
+    def reset(self) -> None:
+        self.record_success()
+
+
+def _pause(seconds: float, cancelled: Callable[[], bool], poll_seconds: float = 0.1) -> bool:
+    """Sleep for `seconds`, waking up to check `cancelled`; False if it turned true."""
+    end = time.monotonic() + seconds
+    while not cancelled():
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return True
+        time.sleep(min(poll_seconds, remaining))
+    return False
+
+
+def call_with_retry(
+    call: Callable[[], object],
+    cancelled: Callable[[], bool] = lambda: False,
+    policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+    breaker: CircuitBreaker | None = None,
+    deadline: float | None = None,
+    diagnostics: RunDiagnostics | None = None,
+):
+    """`call()`, tried again under `policy` while it fails transiently.
+
+    `deadline` is a time.monotonic() instant; a retry whose pause would reach it is not made.
+    Returns None if `cancelled` turned true during a call or a pause. The last error is raised once the
+    attempts or the time run out, so the message the user sees is Earth Engine's own.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + policy.call_deadline
+    for retry in itertools.count():
+        if breaker is not None:
+            try:
+                breaker.check()
+            except EarthEngineUnavailable:
+                count(diagnostics, "circuit_open")
+                raise
+        try:
+            result = call()
+        except Exception as error:
+            # whatever the error, a cancelled run is not waiting for an answer any more; this is
+            # also how a request aborted on the wire (RequestCancelled) ends
+            if cancelled():
+                return None
+            if not is_transient(error):
+                raise
+            if breaker is not None:
+                breaker.record_failure()
+            delay = policy.delay(retry)
+            if retry + 1 >= policy.attempts or time.monotonic() + delay >= deadline:
+                raise
+            count(diagnostics, "retries")
+            with timed(diagnostics, "retry_wait"):
+                if not _pause(delay, cancelled):
+                    return None
+        else:
+            # an attempt that gave up because the run was cancelled proves nothing about the service
+            if cancelled():
+                return None
+            if breaker is not None:
+                breaker.record_success()
+            return result
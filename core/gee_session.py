@@ -0,0 +1,398 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+The process-wide pieces every Earth Engine request goes through: one bounded worker pool, one
+HTTP transport whose connections are kept alive and reused between requests, the endpoint it
+talks to, the request quota, the retry policy and circuit breaker around each request, and the
+concurrency limit batch work runs under.
+
+Both are shared by every dock (the plugin can be embedded several times) and every batch job,
+so the number of threads and sockets the plugin holds does not grow with how it is used.
+"""
+
+import concurrent.futures
+import contextvars
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from typing import Final
+from urllib.parse import urlsplit
+
+from .diagnostics import RunDiagnostics
+from .gee_cancel import CancellationMonitor, RequestCancelled, cancellable_adapter
+from .gee_quota import Priority, RequestQuota
+from .gee_retry import DEFAULT_RETRY_POLICY, CircuitBreaker, DeadlineExceeded, RetryPolicy, call_with_retry
+
+# Each point run overlaps two requests, so this lets four runs fetch at once before they queue.
+EXECUTOR_MAX_WORKERS: Final = 8
+# One connection per worker that can be mid-request, plus the serial catalog request each run makes
+# from its own task thread. pool_block makes a request wait for a free connection instead of opening
+# an extra one that urllib3 would then discard ("Connection pool is full"), paying a fresh TCP and
+# TLS handshake every time.
+CONNECTION_POOL_SIZE: Final = EXECUTOR_MAX_WORKERS + 4
+
+# Earth Engine's endpoint for many small concurrent requests (batch work). The default endpoint is
+# tuned for interactive use, one request at a time, and throttles bursts much earlier.
+HIGH_VOLUME_URL: Final = "https://earthengine-highvolume.googleapis.com"
+# How many points a batch run computes at once; each one is two overlapped requests.
+DEFAULT_BATCH_CONCURRENCY: Final = 4
+MAX_BATCH_CONCURRENCY: Final = 40
+# Retries the ee library makes by itself, underneath the plugin's own. Its backoff sleeps up to 2^n
+# seconds and can neither be cancelled nor bounded, so it keeps only the one quick retry that
+# covers a kept-alive connection the server closed in the meantime; call_with_retry does the rest.
+EE_LIBRARY_RETRIES: Final = 1
+
+_executor: concurrent.futures.ThreadPoolExecutor | None = None
+_transport = None
+_initialized_url: str | None = None
+# runs in flight on the endpoint ee is initialized against, which no other run may switch
+_endpoint_runs = 0
+_SESSION_LOCK = threading.Lock()
+
+
+def shared_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """The worker pool Earth Engine requests are overlapped on, created on first use.
+
+    Only leaf work may be submitted here: a job that waits on another job of this pool can
+    deadlock it once every worker is waiting.
+    """
+    global _executor
+    with _SESSION_LOCK:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=EXECUTOR_MAX_WORKERS, thread_name_prefix="ccd-gee"
+            )
+        return _executor
+
+
+def submit(function, *args, **kwargs) -> concurrent.futures.Future:
+    """Run `function` on the shared pool, inside the caller's context.
+
+    Pool threads do not inherit context variables, so without this a request made on the pool
+    would not know which run it belongs to - see run_diagnostics.
+    """
+    return shared_executor().submit(contextvars.copy_context().run, function, *args, **kwargs)
+
+
+def shutdown_executor() -> None:
+    """Release the worker threads; the next shared_executor() starts a fresh pool."""
+    global _executor
+    with _SESSION_LOCK:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class EndpointStats:
+    """Requests, errors and latency per Earth Engine host, for the life of the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, float]] = {}
+
+    def record(self, host: str, seconds: float, failed: bool) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(host, {"requests": 0, "errors": 0, "seconds": 0.0})
+            stats["requests"] += 1
+            stats["errors"] += int(failed)
+            stats["seconds"] += seconds
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {host: dict(stats) for host, stats in self._stats.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+endpoint_stats = EndpointStats()
+_run_diagnostics: contextvars.ContextVar[RunDiagnostics | None] = contextvars.ContextVar(
+    "ccd_run_diagnostics", default=None
+)
+
+
+# when the call being made on this thread has to be answered by, as a time.monotonic() instant
+_call_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("ccd_call_deadline", default=None)
+# and what says its run was cancelled, so the transport can abort it mid-flight
+_call_cancelled: contextvars.ContextVar = contextvars.ContextVar("ccd_call_cancelled", default=None)
+cancel_monitor = CancellationMonitor()
+
+
+@contextmanager
+def run_diagnostics(diagnostics: RunDiagnostics | None):
+    """Attribute every request made inside the block (and on the pool, via submit) to `diagnostics`."""
+    token = _run_diagnostics.set(diagnostics)
+    try:
+        yield
+    finally:
+        _run_diagnostics.reset(token)
+
+
+def _record_request(uri: str, seconds: float, failed: bool) -> None:
+    host = urlsplit(uri).netloc
+    endpoint_stats.record(host, seconds, failed)
+    diagnostics = _run_diagnostics.get()
+    if diagnostics is not None:
+        diagnostics.count(f"{host} requests")
+        if failed:
+            diagnostics.count(f"{host} errors")
+        diagnostics.add_time(f"{host} latency", seconds)
+
+
+class PooledTransport:
+    """An httplib2-style transport over one keep-alive requests session.
+
+    The ee library accepts any object with httplib2's request() signature and wraps it for
+    authentication, so this is the one place the plugin can decide how connections are reused.
+    Exceptions are translated the way ee's own transport does, so googleapiclient still treats
+    connection drops and timeouts as transient. A request whose run is cancelled while it is in
+    flight is aborted and raises RequestCancelled instead, which nothing retries.
+    """
+
+    def __init__(self, pool_size: int = CONNECTION_POOL_SIZE, timeout: float | None = None):
+        import requests
+
+        self._timeout = timeout
+        self._session = requests.Session()
+        # retries are googleapiclient's job; urllib3 retrying underneath it would multiply them
+        adapter = cancellable_adapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        import httplib2
+        import requests
+
+        timeout = self._timeout
+        deadline = _call_deadline.get()
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Earth Engine did not answer in time.")
+            # a per-socket-operation timeout: no single connect or read can outlive the call
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        cancelled = _call_cancelled.get()
+        if cancelled is not None and cancelled():
+            raise RequestCancelled("The run was cancelled before the request was sent.")
+        start = time.perf_counter()
+        failed = True
+        try:
+            with cancel_monitor.watch(cancelled) as in_flight:
+                try:
+                    response = self._session.request(method, uri, data=body, headers=headers, timeout=timeout)
+                except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as error:
+                    # the socket was shut down under the read on purpose: not a network problem
+                    if in_flight is not None and in_flight.aborted:
+                        raise RequestCancelled("The run was cancelled while the request was in flight.") from error
+                    raise
+            failed = response.status_code >= 400
+        except RequestCancelled:
+            failed = False
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as error:
+            raise ConnectionError(error) from error
+        except requests.exceptions.Timeout as error:
+            raise TimeoutError(error) from error
+        finally:
+            _record_request(uri, time.perf_counter() - start, failed)
+        if response.status_code == 429:
+            # the project quota is spent: let it recover before anything else is sent
+            request_quota.throttle()
+        response_headers = dict(response.headers)
+        response_headers["status"] = response.status_code
+        return httplib2.Response(response_headers), response.content
+
+    def close(self) -> None:
+        self._session.close()
+
+
+# every getInfo of the plugin, from any dock or batch job, waits its turn here
+request_quota = RequestQuota()
+# and stops being sent while Earth Engine is down
+circuit_breaker = CircuitBreaker()
+
+
+def get_info(
+    computed,
+    priority: Priority | Callable[[], Priority] = Priority.INTERACTIVE,
+    cancelled=lambda: False,
+    policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+):
+    """`computed.getInfo()`, once the request quota gives this priority a turn.
+
+    `priority` may be a callable (a RunPriority), read again for every attempt.
+
+    Transient failures are retried under `policy`, each attempt queuing for the quota again, and
+    the whole call is bounded by the policy's deadline. None if `cancelled` turned true, whether
+    while waiting or with the request on the wire, which it aborts. The waits are recorded as
+    quota_wait and retry_wait for the run.
+    """
+    diagnostics = _run_diagnostics.get()
+
+    def attempt():
+        start = time.perf_counter()
+        lane = priority() if callable(priority) else priority
+        with request_quota.slot(lane, cancelled) as acquired:
+            if diagnostics is not None:
+                diagnostics.add_time("quota_wait", time.perf_counter() - start)
+            if not acquired:
+                return None
+            return computed.getInfo()
+
+    deadline = time.monotonic() + policy.call_deadline
+    deadline_token = _call_deadline.set(deadline)
+    cancelled_token = _call_cancelled.set(cancelled)
+    try:
+        return call_with_retry(attempt, cancelled, policy, circuit_breaker, deadline, diagnostics)
+    finally:
+        _call_cancelled.reset(cancelled_token)
+        _call_deadline.reset(deadline_token)
+
+
+def shared_transport() -> PooledTransport:
+    global _transport
+    with _SESSION_LOCK:
+        if _transport is None:
+            _transport = PooledTransport()
+        return _transport
+
+
+def endpoint_url(high_volume: bool, url: str | None = None) -> str | None:
+    """The base URL to initialize against: None keeps ee's interactive default.
+
+    A custom URL only applies in high-volume mode, where it stands in for HIGH_VOLUME_URL - a
+    regional deployment, or a local stand-in in tests.
+    """
+    if not high_volume:
+        return None
+    return (url or "").strip().rstrip("/") or HIGH_VOLUME_URL
+
+
+class ConcurrencyLimit:
+    """A semaphore whose size can change while it is in use.
+
+    Batch work holds one slot per point being computed. Lowering the limit never interrupts a
+    holder; it only stops new ones from starting until enough slots are released.
+    """
+
+    def __init__(self, limit: int):
+        self._condition = threading.Condition()
+        self._limit = limit
+        self._in_use = 0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def set_limit(self, limit: int) -> None:
+        with self._condition:
+            self._limit = max(1, min(int(limit), MAX_BATCH_CONCURRENCY))
+            self._condition.notify_all()
+
+    def acquire(self, cancelled=lambda: False, poll_seconds: float = 0.2) -> bool:
+        """Wait for a slot; False if `cancelled` turned true first."""
+        with self._condition:
+            while self._in_use >= self._limit:
+                if cancelled():
+                    return False
+                self._condition.wait(poll_seconds)
+            self._in_use += 1
+            return True
+
+    def release(self) -> None:
+        with self._condition:
+            self._in_use -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def slot(self, cancelled=lambda: False):
+        """Hold a slot for the block; yields False, without holding one, if cancelled while waiting."""
+        acquired = self.acquire(cancelled)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release()
+
+
+# every batch path (vector layers, processing, the command line) computes its points under this
+batch_limit = ConcurrencyLimit(DEFAULT_BATCH_CONCURRENCY)
+
+
+def initialize_earth_engine(url: str | None = None) -> None:
+    """Initialize ee on the shared transport, once per endpoint.
+
+    A bare ee.Initialize() resets the library to its default transport, and repeating it on every
+    run also re-fetches the API discovery document and the algorithm list - two extra round trips
+    before the first real request. So it only runs again when the endpoint changes.
+
+    ee holds one endpoint for the whole process, so while a run is in flight (endpoint_run) the
+    endpoint it started on is kept, whatever `url` asks for: a batch must not pull a pick onto the
+    high-volume endpoint, nor a pick pull a batch off it. The next call once they have finished
+    switches.
+    """
+    transport = shared_transport()
+    # held across the check and the switch, or two threads could both initialize
+    with _SESSION_LOCK:
+        _switch_endpoint(url, transport)
+
+
+@contextmanager
+def endpoint_run(url: str | None = None):
+    """A run on ee initialized against `url`, keeping the endpoint from switching until it ends.
+
+    When other runs are in flight on another endpoint, this one runs on theirs.
+    """
+    global _endpoint_runs
+    transport = shared_transport()
+    with _SESSION_LOCK:
+        _switch_endpoint(url, transport)
+        _endpoint_runs += 1
+    try:
+        yield
+    finally:
+        with _SESSION_LOCK:
+            _endpoint_runs -= 1
+
+
+def _switch_endpoint(url, transport) -> None:
+    # the caller holds _SESSION_LOCK
+    global _initialized_url
+    import ee
+
+    if _initialized_url is not None and ee.data.is_initialized():
+        if _endpoint_runs or _initialized_url == (url or ""):
+            return
+    ee.Initialize(url=url, http_transport=transport)
+    ee.data.setMaxRetries(EE_LIBRARY_RETRIES)
+    _initialized_url = url or ""
+
+
+def reset_session() -> None:
+    """Drop the worker pool and the connections, e.g. when the last plugin instance unloads."""
+    global _transport, _initialized_url
+    shutdown_executor()
+    cancel_monitor.stop()
+    with _SESSION_LOCK:
+        transport, _transport = _transport, None
+        _initialized_url = None
+    if transport is not None:
+        transport.close()
@@ -0,0 +1,123 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+Serialized collection graphs, reused across points.
+
+Building a collection is not free on the client: every .map() invokes its Python lambda to trace
+the function body, and the ee library serializes that body again to name its variables. Five
+mapped Landsat collections, the index builders and the Sentinel-2 cloud-mask links are rebuilt
+identically on every click, and the only thing that differs between two points is the point.
+So the graph is built once around a placeholder point, serialized, and each later point only
+swaps its coordinates into the serialized form.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Final
+
+from .diagnostics import RunDiagnostics, count, timed
+
+# A coordinate pair no real query uses (a few metres from the antimeridian at the south pole, to
+# thirteen decimals), so every occurrence of it in a serialized graph is the point and nothing else.
+PLACEHOLDER_COORDS: Final = (-179.9876543210123, -89.8765432101234)
+# A template is a JSON string of a few tens of KB, one per distinct collection configuration.
+TEMPLATE_MAX_ENTRIES: Final = 16
+
+
+def _placeholder_paths(node, path=()):
+    """Where the placeholder coordinates occur in an encoded graph, as key/index paths."""
+    if isinstance(node, list):
+        if node == list(PLACEHOLDER_COORDS):
+            yield path
+            return
+        for index, child in enumerate(node):
+            yield from _placeholder_paths(child, (*path, index))
+    elif isinstance(node, dict):
+        for key, child in node.items():
+            yield from _placeholder_paths(child, (*path, key))
+
+
+class GraphTemplate:
+    """An encoded Earth Engine graph with the point left as a hole."""
+
+    __slots__ = ("_encoded", "_paths")
+
+    def __init__(self, expression):
+        self._encoded = json.dumps(expression)
+        self._paths = tuple(_placeholder_paths(expression))
+        if not self._paths:
+            raise ValueError("The graph does not reference the placeholder point, so it cannot be reused.")
+
+    def instantiate(self, coords):
+        """The encoded graph with `coords` in place of the placeholder point."""
+        expression = json.loads(self._encoded)
+        for path in self._paths:
+            parent = expression
+            for key in path[:-1]:
+                parent = parent[key]
+            parent[path[-1]] = [float(coords[0]), float(coords[1])]
+        return expression
+
+
+_templates: "OrderedDict[Hashable, GraphTemplate]" = OrderedDict()
+_TEMPLATES_LOCK = threading.Lock()
+
+
+def clear_templates() -> None:
+    with _TEMPLATES_LOCK:
+        _templates.clear()
+
+
+def templated_collection(
+    key: Hashable,
+    coords,
+    build: Callable[[tuple[float, float]], object],
+    diagnostics: RunDiagnostics | None = None,
+):
+    """The collection `build(coords)` would return, built from the cached template for `key`.
+
+    `key` must hold every input of `build` except the point. Only the first call per key pays for
+    tracing the graph; the rest decode the serialized form with the coordinates swapped in, which
+    skips the lambda tracing entirely. graph_build/graph_instantiate in the diagnostics time the
+    two paths so the saving can be read off a run.
+    """
+    import ee
+
+    with _TEMPLATES_LOCK:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+
+    if template is None:
+        count(diagnostics, "graph_template_misses")
+        with timed(diagnostics, "graph_build"):
+            graph = build(PLACEHOLDER_COORDS)
+            template = GraphTemplate(ee.serializer.encode(graph, for_cloud_api=True))
+        with _TEMPLATES_LOCK:
+            _templates[key] = template
+            _templates.move_to_end(key)
+            while len(_templates) > TEMPLATE_MAX_ENTRIES:
+                _templates.popitem(last=False)
+    else:
+        count(diagnostics, "graph_template_hits")
+
+    with timed(diagnostics, "graph_instantiate"):
+        return ee.ImageCollection(ee.deserializer.decodeCloudApi(template.instantiate(coords)))
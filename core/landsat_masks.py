@@ -0,0 +1,111 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+The Landsat quality masks of gee_data_landsat.prepare_image, applied to a raw_qa series.
+
+Every rule there is pixel-local - QA_PIXEL bits, QA_RADSAT saturation, the valid reflectance range
+and the haze test - so a series fetched once with the quality bands and nothing masked can be
+masked here under any MaskProfile, and profiles compared without another Earth Engine run.
+"""
+
+from typing import Final
+
+import numpy as np
+
+from .gee_common import OPTICAL_BANDS
+from .gee_data_landsat import (
+    AEROSOL_LEVEL_HIGH,
+    AEROSOL_LEVEL_MASK,
+    ATMOS_OPACITY_MAX,
+    DEFAULT_MASK_PROFILE,
+    RAW_QA_BANDS,
+    SENSORS,
+    MaskProfile,
+)
+from .local_indices import with_indices
+from .timeseries import collapse_same_day_rows
+
+_DAY_MS: Final = 24 * 60 * 60 * 1000
+
+
+def sensor_of(scene_id):
+    """The SensorSpec of a scene, from the sensor code in its id ("LC08", ...), or None."""
+    return next((spec for spec in SENSORS if spec.collection.split("/")[1] in str(scene_id)), None)
+
+
+def _integer(column):
+    """A QA column as integers, and where it had a value; getRegion reports masked pixels as None."""
+    values = np.asarray(column, dtype=float)
+    present = np.isfinite(values)
+    return np.where(present, values, 0).astype(np.int64), present
+
+
+def observation_mask(timeseries, profile: MaskProfile = DEFAULT_MASK_PROFILE) -> np.ndarray:
+    """Which observations of a raw_qa series `profile` keeps, as prepare_image would.
+
+    A quality value Earth Engine reported as masked rejects the observation, as the masked band
+    would have on the server - except the TM/ETM+ opacity, which prepare_image unmasks to 0.
+    """
+    optical = np.column_stack([np.asarray(timeseries[band], dtype=float) for band in OPTICAL_BANDS])
+    qa_pixel, has_qa_pixel = _integer(timeseries["QA_PIXEL"])
+    radsat, has_radsat = _integer(timeseries["QA_RADSAT"])
+    aerosol, has_aerosol = _integer(timeseries["AEROSOL"])
+    specs = [sensor_of(scene_id) for scene_id in timeseries["id"]]
+
+    with np.errstate(invalid="ignore"):
+        keep = np.isfinite(optical).all(axis=1)
+        keep &= (optical.min(axis=1, initial=np.inf) > profile.sr_min) & (
+            optical.max(axis=1, initial=-np.inf) <= profile.sr_max
+        )
+    keep &= has_qa_pixel & np.array([spec is not None for spec in specs], dtype=bool)
+    if profile.saturation:
+        keep &= has_radsat
+
+    for spec in SENSORS:
+        rows = np.array([candidate is spec for candidate in specs], dtype=bool)
+        if not rows.any():
+            continue
+        rule = (qa_pixel & profile.qa_bitmask(spec)) == 0
+        if profile.saturation:
+            rule &= (radsat & spec.saturation_mask) == 0
+        if profile.haze:
+            if spec.aerosol_band == "SR_QA_AEROSOL":
+                rule &= has_aerosol & ((aerosol & AEROSOL_LEVEL_MASK) != AEROSOL_LEVEL_HIGH)
+            else:
+                rule &= aerosol < ATMOS_OPACITY_MAX
+        keep &= ~rows | rule
+    return keep
+
+
+def apply_mask_profile(timeseries, profile: MaskProfile = DEFAULT_MASK_PROFILE, indices=()):
+    """A raw_qa series masked under `profile`, the way a masked fetch returns it.
+
+    Rejected observations keep their row with the optical bands as NaN, like a masked scene in
+    getRegion, and the quality columns are dropped. Scenes of one sensor and day (overlapping
+    rows), which a raw_qa fetch leaves apart, are then collapsed as the masked fetch collapses
+    them. `indices` are derived from what is left.
+    """
+    keep = observation_mask(timeseries, profile)
+    masked = {name: column for name, column in timeseries.items() if name not in RAW_QA_BANDS}
+    for band in OPTICAL_BANDS:
+        masked[band] = np.where(keep, np.asarray(timeseries[band], dtype=float), np.nan)
+    days = np.asarray(timeseries["time"], dtype=np.int64) // _DAY_MS
+    sensors = [spec.collection if spec is not None else "" for spec in map(sensor_of, timeseries["id"])]
+    keys = [f"{sensor} {day}" for sensor, day in zip(sensors, days, strict=True)]
+    return with_indices(collapse_same_day_rows(masked, keys, keep), indices, "Landsat C2")
@@ -1,5 +1,6 @@
 import os
 import tempfile
+from collections import deque
 from collections.abc import Callable
 from dataclasses import dataclass
 from pathlib import Path
@@ -105,11 +106,20 @@ class TaskLifecycle:
         self.active_task: CancellableTask | None = None
         self._disposed = False
 
-    def start(self, task: CancellableTask) -> None:
+    def start(self, task: CancellableTask, *, cancel_previous: bool = True) -> CancellableTask | None:
+        """Make `task` the active one. The previous one is cancelled, or returned if left running.
+
+        A task left running can no longer finish the lifecycle, so it never touches the dock; it
+        only completes its work (into the results cache).
+        """
         previous = self.active_task
-        if previous is not None:
-            previous.cancel()
         self.active_task = task
+        if previous is None:
+            return None
+        if cancel_previous:
+            previous.cancel()
+            return None
+        return previous
 
     def finish(self, task: CancellableTask) -> bool:
         if self._disposed or task is not self.active_task:
@@ -123,3 +133,49 @@ class TaskLifecycle:
         self.active_task = None
         if task is not None:
             task.cancel()
+
+
+# Long enough to swallow the clicks of someone sweeping across a landscape, short enough that a
+# single deliberate click does not feel delayed next to a run that takes seconds.
+PICK_DEBOUNCE_MS = 350
+# Replaced picks kept to finish in the background; older ones are dropped, not queued forever.
+MAX_SUPERSEDED_PICKS = 3
+
+
+class PickScheduler:
+    """Debounce map picks and keep only the latest one.
+
+    Qt-free: the dock restarts a single-shot timer for the delay pick() returns and calls fire()
+    when it runs out, so a burst of clicks starts one run, for the last point. The picks the
+    burst replaced are handed back too, for the dock to finish at low priority or drop.
+    """
+
+    def __init__(self, delay_ms: int = PICK_DEBOUNCE_MS, max_superseded: int = MAX_SUPERSEDED_PICKS):
+        self.delay_ms = delay_ms
+        self._latest = None
+        self._superseded = deque(maxlen=max_superseded)
+
+    @property
+    def pending(self) -> bool:
+        return self._latest is not None
+
+    def pick(self, config) -> int:
+        """Record a pick, replacing any that has not run yet; returns the delay to (re)start."""
+        if self._latest is not None and self._latest != config:
+            self._superseded.append(self._latest)
+        self._latest = config
+        return self.delay_ms
+
+    def fire(self):
+        """The latest pick and the distinct ones it replaced, oldest first; both cleared."""
+        latest, self._latest = self._latest, None
+        superseded = []
+        for config in self._superseded:
+            if config != latest and config not in superseded:
+                superseded.append(config)
+        self._superseded.clear()
+        return latest, superseded
+
+    def cancel(self) -> None:
+        self._latest = None
+        self._superseded.clear()
@@ -0,0 +1,110 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+The spectral indices of gee_common.add_indices, computed from a cached time series.
+
+Every index is a function of one observation's six OPTICAL_BANDS, which every cached series
+carries, so a series fetched for one index gives the observations of any other without asking
+Earth Engine again. The arithmetic and the masking follow add_indices exactly; masked values are
+NaN here, as they are in the series.
+"""
+
+from typing import Final
+
+import numpy as np
+
+from .gee_common import INDEX_BANDS, INDEX_RANGE, OPTICAL_BANDS, resolve_indices
+from .gee_data_landsat import SENSORS
+from .gee_data_sentinel import TC_S2
+
+TASSELED_CAP: Final = ("BRIGHTNESS", "GREENNESS", "WETNESS")
+
+
+def _tasseled_cap_matrix(coefficients):
+    """(optical band, component) weights, so one matrix product gives all three components."""
+    return np.array([coefficients[component] for component in TASSELED_CAP], dtype=float).T
+
+
+# The sensor code in a Landsat scene id ("LC08" in "2_LC08_008058_20130411") and the tasseled cap
+# it is computed with, taken from the collection names so the two cannot disagree.
+LANDSAT_TC: Final = {spec.collection.split("/")[1]: _tasseled_cap_matrix(spec.tc_coefficients) for spec in SENSORS}
+SENTINEL_TC: Final = _tasseled_cap_matrix(TC_S2)
+_UNKNOWN_SENSOR: Final = np.full_like(SENTINEL_TC, np.nan)
+
+
+def _normalized_difference(first, second):
+    # ee.Image.normalizedDifference masks a negative input and a zero denominator
+    total = first + second
+    valid = (first >= 0) & (second >= 0) & (total != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(valid, (first - second) / total, np.nan)
+
+
+def _enhanced_vegetation(near_infrared, red, denominator):
+    # ee.Image.divide returns 0 where the divisor is 0; NaN (masked) inputs stay NaN
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(denominator == 0, 0.0, 2.5 * (near_infrared - red) / denominator)
+    return np.clip(ratio, *INDEX_RANGE)
+
+
+def tasseled_cap_matrix(scene_id, dataset):
+    """The tasseled cap weights add_indices used for this scene, or None for an unknown sensor."""
+    if dataset == "Sentinel-2":
+        return SENTINEL_TC
+    return next((matrix for code, matrix in LANDSAT_TC.items() if code in str(scene_id)), None)
+
+
+def _tasseled_cap(timeseries, dataset):
+    optical = np.column_stack([np.asarray(timeseries[band], dtype=float) for band in OPTICAL_BANDS])
+    matrices = [tasseled_cap_matrix(scene_id, dataset) for scene_id in timeseries["id"]]
+    weights = np.array([_UNKNOWN_SENSOR if matrix is None else matrix for matrix in matrices]).reshape(
+        -1, *SENTINEL_TC.shape
+    )
+    # a NaN band masks the whole row, as the all_bands_valid mask of add_indices does, and the
+    # result goes through float32 as its toFloat() does
+    components = np.einsum("ob,obc->oc", optical, weights).astype(np.float32).astype(float)
+    return dict(zip(TASSELED_CAP, components.T, strict=True))
+
+
+def index_columns(timeseries, indices, dataset):
+    """The requested index columns, computed from the optical columns of `timeseries`."""
+    wanted = resolve_indices(indices)
+    if not wanted:
+        return {}
+    blue, red, near_infrared, swir2 = (
+        np.asarray(timeseries[band], dtype=float) for band in ("Blue", "Red", "NIR", "SWIR2")
+    )
+    builders = {
+        "NDVI": lambda: _normalized_difference(near_infrared, red),
+        "NBR": lambda: _normalized_difference(near_infrared, swir2),
+        "EVI": lambda: _enhanced_vegetation(near_infrared, red, near_infrared + 6 * red - 7.5 * blue + 1),
+        "EVI2": lambda: _enhanced_vegetation(near_infrared, red, near_infrared + 2.4 * red + 1),
+    }
+    columns = {name: builders[name]() for name in wanted if name in builders}
+    if any(name in TASSELED_CAP for name in wanted):
+        columns.update({name: values for name, values in _tasseled_cap(timeseries, dataset).items() if name in wanted})
+    return {name: columns[name] for name in INDEX_BANDS if name in columns}
+
+
+def with_indices(timeseries, indices, dataset):
+    """`timeseries` with whichever of `indices` it lacks computed locally; the input is not modified."""
+    missing = [name for name in resolve_indices(indices) if name not in timeseries]
+    if not missing:
+        return timeseries
+    return {**timeseries, **index_columns(timeseries, missing, dataset)}
@@ -0,0 +1,110 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+Pixel arithmetic on a dataset's native grid, the one compute_ccd samples on.
+
+Earth Engine reports a grid as a CRS and an affine transform [a, b, c, d, e, f], mapping a pixel
+position (column, row) to x = a*column + b*row + c and y = d*column + e*row + f in that CRS. All
+coordinates here are in the grid's CRS; converting to and from longitude/latitude is the caller's
+job (the dock does it with QGIS, which knows every CRS Earth Engine may report). The one exception
+is WGS 84 / UTM, the CRS of nearly every Landsat and Sentinel-2 scene, which utm_xy projects for
+the batch planner, where QGIS may not be there.
+"""
+
+import math
+import re
+from typing import Final
+
+# (column, row) steps to the eight pixels around one
+NEIGHBOUR_STEPS: Final = tuple((column, row) for row in (-1, 0, 1) for column in (-1, 0, 1) if (column, row) != (0, 0))
+
+
+def pixel_of(x: float, y: float, transform) -> tuple[int, int]:
+    """The (column, row) of the pixel containing (x, y)."""
+    a, b, c, d, e, f = transform
+    determinant = a * e - b * d
+    column = (e * (x - c) - b * (y - f)) / determinant
+    row = (a * (y - f) - d * (x - c)) / determinant
+    return math.floor(column), math.floor(row)
+
+
+def pixel_centre(column: int, row: int, transform) -> tuple[float, float]:
+    a, b, c, d, e, f = transform
+    return a * (column + 0.5) + b * (row + 0.5) + c, d * (column + 0.5) + e * (row + 0.5) + f
+
+
+def step(x: float, y: float, transform, columns: int, rows: int) -> tuple[float, float]:
+    """The centre of the pixel `columns` and `rows` away from the one containing (x, y)."""
+    column, row = pixel_of(x, y, transform)
+    return pixel_centre(column + columns, row + rows, transform)
+
+
+def north_step(transform) -> int:
+    """The row step that moves north: -1 on the usual north-up grid, whose rows run south."""
+    return -1 if transform[4] < 0 else 1
+
+
+# WGS 84 and the UTM projection parameters
+_SEMI_MAJOR_AXIS: Final = 6378137.0
+_FLATTENING: Final = 1 / 298.257223563
+_SCALE_FACTOR: Final = 0.9996
+_FALSE_EASTING: Final = 500000.0
+_FALSE_NORTHING_SOUTH: Final = 10000000.0
+_UTM_EPSG: Final = re.compile(r"EPSG:32([67])(\d\d)$")
+
+
+def utm_zone(crs: str) -> tuple[int, bool] | None:
+    """(zone, southern) of a WGS 84 / UTM CRS code such as "EPSG:32618", or None for any other."""
+    match = _UTM_EPSG.match(str(crs).upper())
+    if match is None or not 1 <= int(match.group(2)) <= 60:
+        return None
+    return int(match.group(2)), match.group(1) == "7"
+
+
+def zone_of(lon: float, lat: float) -> tuple[int, bool]:
+    """The (zone, southern) of the standard UTM zone containing the point."""
+    return min(int((lon + 180) // 6) + 1, 60), lat < 0
+
+
+def utm_xy(lon: float, lat: float, zone: int, southern: bool) -> tuple[float, float]:
+    """Longitude/latitude projected to UTM `zone`, within a millimetre across the zone (Snyder 1987)."""
+    e2 = _FLATTENING * (2 - _FLATTENING)
+    ep2 = e2 / (1 - e2)
+    phi = math.radians(lat)
+    sin_phi, cos_phi, tan_phi = math.sin(phi), math.cos(phi), math.tan(phi)
+    n = _SEMI_MAJOR_AXIS / math.sqrt(1 - e2 * sin_phi**2)
+    t = tan_phi**2
+    c = ep2 * cos_phi**2
+    a = math.radians(lon - (zone * 6 - 183)) * cos_phi
+    m = _SEMI_MAJOR_AXIS * (
+        (1 - e2 / 4 - 3 * e2**2 / 64 - 5 * e2**3 / 256) * phi
+        - (3 * e2 / 8 + 3 * e2**2 / 32 + 45 * e2**3 / 1024) * math.sin(2 * phi)
+        + (15 * e2**2 / 256 + 45 * e2**3 / 1024) * math.sin(4 * phi)
+        - (35 * e2**3 / 3072) * math.sin(6 * phi)
+    )
+    x = _FALSE_EASTING + _SCALE_FACTOR * n * (
+        a + (1 - t + c) * a**3 / 6 + (5 - 18 * t + t**2 + 72 * c - 58 * ep2) * a**5 / 120
+    )
+    y = _SCALE_FACTOR * (
+        m
+        + n
+        * tan_phi
+        * (a**2 / 2 + (5 - t + 9 * c + 4 * c**2) * a**4 / 24 + (61 - 58 * t + t**2 + 600 * c - 330 * ep2) * a**6 / 720)
+    )
+    return x, y + _FALSE_NORTHING_SOUTH if southern else y
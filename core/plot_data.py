@@ -61,6 +61,160 @@ class ModelSegment:
         return self.change_probability >= CONFIRMED_CHANGE_PROBABILITY
 
 
+# per-segment values of a CCDC result, by their CcdcResult attribute
+SEGMENT_VALUES: Final = {
+    "tStart": "t_start",
+    "tEnd": "t_end",
+    "tBreak": "t_break",
+    "changeProb": "change_prob",
+    "numObs": "num_obs",
+}
+# per-segment values of each band, besides its coefficients
+BAND_VALUES: Final = ("rmse", "magnitude")
+_COEFFICIENTS: Final = "coefs"
+
+
+def _first_layer(result_info, name):
+    """The one pixel's list reduceRegion(toList()) reports for `name`, or () when there is none."""
+    layers = result_info.get(name, ())
+    if isinstance(layers, str) or not isinstance(layers, Sequence) or not layers:
+        return ()
+    layer = layers[0]
+    return layer if isinstance(layer, Sequence) and not isinstance(layer, str) else ()
+
+
+def _vector(layer, count) -> np.ndarray:
+    """`count` floats from a list of values, NaN for the placeholders, for anything else and past its end."""
+    values = np.full(count, np.nan)
+    try:
+        parsed = np.asarray(layer[:count], dtype=float)
+    except (TypeError, ValueError):
+        parsed = np.array([np.nan if (value := _finite_value(raw)) is None else value for raw in layer[:count]])
+    if parsed.ndim == 1:
+        values[: len(parsed)] = np.where(np.isfinite(parsed), parsed, np.nan)
+    return values
+
+
+def _matrix(layer, count) -> np.ndarray:
+    """(count, CCDC_COEFFICIENT_COUNT) coefficients, a NaN row for each one missing or malformed."""
+    rows = np.full((count, CCDC_COEFFICIENT_COUNT), np.nan)
+    for position, row in enumerate(layer[:count]):
+        if isinstance(row, Sequence) and not isinstance(row, str) and len(row) == CCDC_COEFFICIENT_COUNT:
+            rows[position] = _vector(row, CCDC_COEFFICIENT_COUNT)
+    return rows
+
+
+def _listed(values: np.ndarray) -> list:
+    return [None if not np.isfinite(value) else float(value) for value in values]
+
+
+def _read_only(values: np.ndarray) -> np.ndarray:
+    # a cached result is shared by every reader; a write to it would change them all
+    values.flags.writeable = False
+    return values
+
+
+class CcdcResult(Mapping):
+    """A CCDC result at one point, parsed once from the reduceRegion(toList()) dict into arrays.
+
+    t_start, t_end, t_break, change_prob and num_obs are vectors with a value per segment,
+    coefficients a (segments, bands, CCDC_COEFFICIENT_COUNT) tensor and rmse and magnitude
+    (segments, bands) matrices, bands ordered as `bands`. Anything unreadable is NaN. It stays a
+    Mapping of the dict it was parsed from, rebuilt in that layout when a key is read, for the
+    disk cache and whatever else wants the original.
+    """
+
+    __slots__ = (
+        "_names",
+        "_other",
+        "band_index",
+        "bands",
+        "change_prob",
+        "coefficients",
+        "magnitude",
+        "num_obs",
+        "rmse",
+        "t_break",
+        "t_end",
+        "t_start",
+    )
+
+    def __init__(self, result_info: Mapping[str, ReduceRegionValue]):
+        self._names = tuple(result_info)
+        count = len(_first_layer(result_info, "tStart"))
+        for name, attribute in SEGMENT_VALUES.items():
+            setattr(self, attribute, _read_only(_vector(_first_layer(result_info, name), count)))
+        suffix = f"_{_COEFFICIENTS}"
+        self.bands = tuple(name.removesuffix(suffix) for name in self._names if name.endswith(suffix))
+        self.band_index = {band: index for index, band in enumerate(self.bands)}
+        self.coefficients = _read_only(
+            np.stack([_matrix(_first_layer(result_info, f"{band}{suffix}"), count) for band in self.bands], axis=1)
+            if self.bands
+            else np.empty((count, 0, CCDC_COEFFICIENT_COUNT))
+        )
+        for kind in BAND_VALUES:
+            layers = [_vector(_first_layer(result_info, f"{band}_{kind}"), count) for band in self.bands]
+            setattr(self, kind, _read_only(np.stack(layers, axis=1) if layers else np.empty((count, 0))))
+        parsed = {
+            *SEGMENT_VALUES,
+            *(f"{band}_{kind}" for band in self.bands for kind in (_COEFFICIENTS, *BAND_VALUES)),
+        }
+        # a masked pixel reports its layers as empty lists, read back as they came rather than as [[]]
+        self._other = {
+            name: value
+            for name, value in result_info.items()
+            if name not in parsed or (isinstance(value, Sequence) and not value)
+        }
+
+    @classmethod
+    def of(cls, result_info: Mapping[str, ReduceRegionValue]) -> "CcdcResult":
+        """`result_info` itself when already parsed, else parsed."""
+        return result_info if isinstance(result_info, cls) else cls(result_info)
+
+    def merged(self, result_info: Mapping[str, ReduceRegionValue]) -> "CcdcResult":
+        """This result with the keys of `result_info`, such as refit_harmonic_model's, added or replaced."""
+        return CcdcResult({**self, **result_info})
+
+    @property
+    def segments(self) -> int:
+        return len(self.t_start)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (
+            self.coefficients,
+            self.rmse,
+            self.magnitude,
+            *(getattr(self, name) for name in SEGMENT_VALUES.values()),
+        )
+        return sum(array.nbytes for array in arrays)
+
+    def __getitem__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        if name in self._other:
+            return self._other[name]
+        if name in SEGMENT_VALUES:
+            return [_listed(getattr(self, SEGMENT_VALUES[name]))]
+        band, _, kind = name.rpartition("_")
+        index = self.band_index[band]
+        if kind == _COEFFICIENTS:
+            return [[_listed(row) for row in self.coefficients[:, index]]]
+        return [_listed(getattr(self, kind)[:, index])]
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __repr__(self) -> str:
+        return f"CcdcResult({self.segments} segments, bands: {', '.join(self.bands)})"
+
+
 def evaluate_ccdc_model(timestamps_ms, coefficients: Sequence[float] | np.ndarray):
     """CCDC harmonic model: intercept, linear trend and three annual harmonics.
 
@@ -108,45 +262,119 @@ def _finite_value(candidate) -> float | None:
 
 
 def build_model_segments(result_info: Mapping[str, ReduceRegionValue], band: str) -> list[ModelSegment]:
-    start_layers = result_info.get("tStart", ())
-    end_layers = result_info.get("tEnd", ())
-    coefficient_layers = result_info.get(f"{band}_coefs", ())
-    if not start_layers or not end_layers or not coefficient_layers:
+    result = CcdcResult.of(result_info)
+    index = result.band_index.get(band)
+    if index is None or not result.segments:
         return []
-
-    start_values, end_values, coefficient_rows = start_layers[0], end_layers[0], coefficient_layers[0]
-    break_layers = result_info.get("tBreak", ())
-    break_values = break_layers[0] if break_layers else ()
-    rmse_layers = result_info.get(f"{band}_rmse", ())
-    rmse_values = rmse_layers[0] if rmse_layers else ()
-    probability_layers = result_info.get("changeProb", ())
-    probability_values = probability_layers[0] if probability_layers else ()
-    segment_count = min(len(start_values), len(end_values), len(coefficient_rows))
+    coefficients = result.coefficients[:, index]
+    usable = (
+        np.isfinite(result.t_start)
+        & np.isfinite(result.t_end)
+        & (result.t_end >= result.t_start)
+        & np.isfinite(coefficients).all(axis=1)
+    )
+    # tBreak is 0 for the last segment, which has no break
+    breaks = np.where(result.t_break > 0, result.t_break, np.nan)
     segments: list[ModelSegment] = []
-
-    for index in range(segment_count):
-        start_ms = _finite_value(start_values[index])
-        end_ms = _finite_value(end_values[index])
-        coefficient_row = coefficient_rows[index]
-        if start_ms is None or end_ms is None or end_ms < start_ms:
-            continue
-        if not isinstance(coefficient_row, Sequence) or len(coefficient_row) != CCDC_COEFFICIENT_COUNT:
-            continue
-        if any(_finite_value(coefficient) is None for coefficient in coefficient_row):
-            continue
-
-        coefficients = np.asarray(coefficient_row, dtype=float)
-        # tBreak is 0 for the last segment, which has no break
-        break_ms = _finite_value(break_values[index]) if index < len(break_values) else None
-        if break_ms is not None and break_ms <= 0:
-            break_ms = None
-        rmse = _finite_value(rmse_values[index]) if index < len(rmse_values) else None
-        probability = _finite_value(probability_values[index]) if index < len(probability_values) else None
-
+    for position in np.flatnonzero(usable):
+        start_ms, end_ms = float(result.t_start[position]), float(result.t_end[position])
         dates_ms = sample_segment_dates(start_ms, end_ms)
-        values = np.asarray(evaluate_ccdc_model(dates_ms, coefficients), dtype=float)
         segments.append(
-            ModelSegment(len(segments) + 1, start_ms, end_ms, break_ms, probability, rmse, dates_ms, values)
+            ModelSegment(
+                len(segments) + 1,
+                start_ms,
+                end_ms,
+                _finite_value(breaks[position]),
+                _finite_value(result.change_prob[position]),
+                _finite_value(result.rmse[position, index]),
+                dates_ms,
+                np.asarray(evaluate_ccdc_model(dates_ms, coefficients[position]), dtype=float),
+            )
         )
-
     return segments
+
+
+# CCDC grows the model with the observations a segment has, three per coefficient: intercept,
+# slope and the annual harmonic from 12, the semiannual one from 18, the third harmonic from 24.
+# Below 12 it fits no model at all; four coefficients on fewer would just pass through the points.
+MODEL_SIZE_BY_OBSERVATIONS: Final = ((24, 8), (18, 6), (12, 4))
+
+
+def _harmonic_design(timestamps_ms: np.ndarray, origins_ms: np.ndarray) -> np.ndarray:
+    """The evaluate_ccdc_model basis for each segment, (segments, times, 8).
+
+    The slope column is in years from the segment's start rather than in milliseconds since the
+    epoch, which would make it 1e12 times the others and the normal equations singular in
+    practice; refit_harmonic_model converts the coefficients back.
+    """
+    phase = timestamps_ms * (2 * np.pi / MILLISECONDS_PER_YEAR)
+    harmonics = [function(order * phase) for order in (1, 2, 3) for function in (np.cos, np.sin)]
+    years = (timestamps_ms[None, :] - origins_ms[:, None]) / MILLISECONDS_PER_YEAR
+    shape = years.shape
+    return np.stack([np.ones(shape), years, *(np.broadcast_to(term, shape) for term in harmonics)], axis=-1)
+
+
+def refit_harmonic_model(
+    result_info: Mapping[str, ReduceRegionValue],
+    timeseries: Mapping[str, Sequence[NumericValue]],
+    bands,
+    num_obs: int = 0,
+) -> dict[str, ReduceRegionValue]:
+    """`<band>_coefs` and `<band>_rmse` for `bands`, fitted locally on CCDC's own segments.
+
+    For bands CCDC was not handed: the segments (tStart/tEnd) come from its run, and each one's
+    harmonic model is fitted by least squares to that band's observations inside it. Every
+    segment and band is solved in one batched call. CCDC itself fits with LASSO and after TMask
+    dropped outliers, so the curves track the observations slightly more closely than its own
+    would; the breaks are CCDC's either way. A segment with fewer observations than CCDC fits a
+    model on (see MODEL_SIZE_BY_OBSERVATIONS), or than the run's `num_obs`, gets None, which
+    build_model_segments skips. The result has the layout reduceRegion gives the CCDC output.
+    """
+    bands = list(bands)
+    if "tEnd" not in result_info or not bands:
+        return {}
+    result = CcdcResult.of(result_info)
+    if not result.segments:
+        return {}
+    starts, ends = result.t_start, result.t_end
+    times = np.asarray(timeseries["time"], dtype=float)
+    values = np.array([np.asarray(timeseries[band], dtype=float) for band in bands]).reshape(len(bands), -1)
+
+    origins = np.where(np.isfinite(starts), starts, 0.0)
+    design = _harmonic_design(times, origins)
+    # (segment, band, observation): inside the segment and not masked in the band
+    inside = (times[None, :] >= starts[:, None]) & (times[None, :] <= ends[:, None])
+    weights = (inside[:, None, :] & np.isfinite(values)[None, :, :]).astype(float)
+    observed = np.nan_to_num(values)
+    counts = weights.sum(axis=-1)
+    model_sizes = np.select(
+        [counts >= minimum for minimum, _ in MODEL_SIZE_BY_OBSERVATIONS],
+        [size for _, size in MODEL_SIZE_BY_OBSERVATIONS],
+        0,
+    )
+    # nor on fewer than the run asked CCDC for
+    model_sizes[counts < num_obs] = 0
+    used = (np.arange(CCDC_COEFFICIENT_COUNT) < model_sizes[..., None]).astype(float)
+
+    # normal equations of every (segment, band) pair, restricted to the terms its model uses
+    weighted = design[:, None, :, :] * weights[..., None]
+    normal = np.einsum("sbni,snj->sbij", weighted, design) * used[..., :, None] * used[..., None, :]
+    moments = np.einsum("sbni,bn->sbi", weighted, observed) * used
+    coefficients = np.einsum("sbij,sbj->sbi", np.linalg.pinv(normal), moments)
+
+    residuals = (observed[None, :, :] - np.einsum("snj,sbj->sbn", design, coefficients)) * weights
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rmse = np.sqrt((residuals**2).sum(axis=-1) / counts)
+
+    # back to the epoch-millisecond slope evaluate_ccdc_model expects
+    coefficients[..., 0] -= coefficients[..., 1] * (origins / MILLISECONDS_PER_YEAR)[:, None]
+    coefficients[..., 1] /= MILLISECONDS_PER_YEAR
+    unfitted = model_sizes == 0
+    coefficients[unfitted] = np.nan
+    rmse[unfitted] = np.nan
+
+    refit: dict[str, ReduceRegionValue] = {}
+    for index, band in enumerate(bands):
+        refit[f"{band}_coefs"] = [[_listed(row) for row in coefficients[:, index]]]
+        refit[f"{band}_rmse"] = [_listed(rmse[:, index])]
+    return refit
@@ -0,0 +1,63 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+
+Sentinel-2 cloud filters applied to a series fetched with every filter's verdict.
+
+gee_data_sentinel.add_cloud_flags records, per observation, which CLOUD_FILTERS entries keep it,
+so switching the filter only selects observations here; the bands themselves are never masked
+by a filter on the server in that mode.
+"""
+
+import numpy as np
+
+from .gee_common import OPTICAL_BANDS
+from .gee_data_sentinel import CLOUD_FILTERS, CLOUD_FLAGS_BAND
+from .local_indices import with_indices
+from .timeseries import collapse_same_day_rows
+
+
+def filter_mask(timeseries, cloud_filter) -> np.ndarray:
+    """Which observations of a filter_flags series `cloud_filter` keeps.
+
+    An observation without flags (the whole image masked at the point) is rejected by every filter.
+    """
+    if cloud_filter not in CLOUD_FILTERS:
+        raise ValueError(f"Unknown cloud filter: {cloud_filter}. Use one of {', '.join(CLOUD_FILTERS)}.")
+    flags = np.asarray(timeseries[CLOUD_FLAGS_BAND], dtype=float)
+    present = np.isfinite(flags)
+    bit = CLOUD_FILTERS.index(cloud_filter)
+    return present & ((np.where(present, flags, 0).astype(np.int64) >> bit) & 1).astype(bool)
+
+
+def apply_cloud_filter(timeseries, cloud_filter, indices=()):
+    """A filter_flags series under `cloud_filter`, the way a masked fetch returns it.
+
+    Rejected observations keep their row with the optical bands as NaN and the flags column is
+    dropped. The overlapping tiles of one pass, which a filter_flags fetch leaves apart, are then
+    collapsed as the masked fetch collapses them: the datatake that opens a scene id
+    ("20200101T152639_..._T18NWL") is one satellite on one day. `indices` are derived from what is
+    left.
+    """
+    keep = filter_mask(timeseries, cloud_filter)
+    filtered = {name: column for name, column in timeseries.items() if name != CLOUD_FLAGS_BAND}
+    for band in OPTICAL_BANDS:
+        filtered[band] = np.where(keep, np.asarray(timeseries[band], dtype=float), np.nan)
+    datatakes = [str(scene_id).split("_", 1)[0] for scene_id in timeseries["id"]]
+    return with_indices(collapse_same_day_rows(filtered, datatakes, keep), indices, "Sentinel-2")
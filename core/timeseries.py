@@ -0,0 +1,176 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+
+The compact, read-only form of a point's time series that compute_ccd caches.
+
+A getRegion table as a dict of numpy columns repeats the point's coordinates on every row, keeps
+each scene id as a Python string object and every band at float64. TimeSeries holds the same
+columns in a fraction of the memory:
+
+- longitude and latitude: one float each, when constant (always, for the rows of one point)
+- id: a code per observation into a small vocabulary of scene ids with their acquisition date
+  taken out ("3_LC08_008058_<date>", one entry per sensor and path/row), the date put back from
+  the observation's time when the column is read
+- time: int64 epoch milliseconds
+- every numeric band: a row of one float32 (bands, observations) array, found by `band_index`
+
+It is a Mapping of the same column names, so whatever read the dict (the plot, the masks, the
+local indices, the caches and exports) reads it unchanged; a column is rebuilt when it is read.
+"""
+
+from collections.abc import Mapping
+from typing import Final
+
+import numpy as np
+
+# getRegion's only textual column. Named rather than detected, because a scene id that happens to
+# be all digits would otherwise be converted to float and lose its identity (and, past ~15 digits,
+# its value). Everything else - longitude, latitude, time and the bands - is numeric.
+TEXT_COLUMNS: Final = frozenset({"id"})
+COORDINATE_COLUMNS: Final = ("longitude", "latitude")
+# where the acquisition date stood in a scene id of the vocabulary; no Earth Engine id has one
+_DATE_MARK: Final = "\x00"
+
+
+def _dates(time) -> np.ndarray:
+    """The UTC date of each epoch-millisecond time, as the YYYYMMDD in scene ids."""
+    return np.char.replace(np.datetime_as_string(time.astype("datetime64[ms]"), unit="D"), "-", "")
+
+
+def _read_only(values: np.ndarray) -> np.ndarray:
+    # columns are shared by every reader of the cache; a write to one would change them all
+    values.flags.writeable = False
+    return values
+
+
+class TimeSeries(Mapping):
+    """A point's time series, {column: array} like the getRegion columns it was built from."""
+
+    __slots__ = ("_names", "_other", "_size", "_text", "band_index", "latitude", "longitude", "time", "values")
+
+    def __init__(self, columns: Mapping):
+        self._names = tuple(columns)
+        arrays = {name: np.asarray(column) for name, column in columns.items()}
+        self._size = len(next(iter(arrays.values()))) if arrays else 0
+        self.longitude = self.latitude = self.time = None
+        # columns kept as given: anything that is neither text nor a number
+        self._other = {}
+        bands = []
+        for name, column in arrays.items():
+            numeric = column.dtype.kind in "biuf"
+            if name in COORDINATE_COLUMNS and numeric and self._size and (column == column[0]).all():
+                setattr(self, name, float(column[0]))
+            elif name == "time":
+                if numeric and np.isfinite(column).all() and (column == np.round(column)).all():
+                    self.time = _read_only(column.astype(np.int64))
+                else:
+                    # float32 would round a time to minutes; keep whatever this is as it came
+                    self._other[name] = column
+            elif numeric:
+                bands.append(name)
+            elif name not in TEXT_COLUMNS:
+                self._other[name] = column
+        self.band_index = {name: index for index, name in enumerate(bands)}
+        self.values = _read_only(
+            np.array([arrays[name] for name in bands], dtype=np.float32).reshape(len(bands), self._size)
+        )
+        dates = _dates(self.time) if self.time is not None else None
+        self._text = {}
+        for name in TEXT_COLUMNS & set(arrays):
+            if all(isinstance(value, str) and _DATE_MARK not in value for value in arrays[name]):
+                self._text[name] = self._encode(arrays[name], dates)
+            else:
+                self._other[name] = arrays[name]
+
+    @staticmethod
+    def _encode(column, dates):
+        vocabulary = {}
+        codes = np.empty(len(column), dtype=np.int32)
+        for position, value in enumerate(column):
+            date = dates[position] if dates is not None else ""
+            entry = value.replace(date, _DATE_MARK) if date and date in value else value
+            codes[position] = vocabulary.setdefault(entry, len(vocabulary))
+        return _read_only(codes), tuple(vocabulary)
+
+    def _decode(self, name) -> np.ndarray:
+        codes, vocabulary = self._text[name]
+        entries = np.array(vocabulary, dtype=object)[codes] if vocabulary else np.array([], dtype=object)
+        if self.time is None:
+            return entries
+        return np.array(
+            [entry.replace(_DATE_MARK, date) for entry, date in zip(entries, _dates(self.time), strict=True)],
+            dtype=object,
+        )
+
+    def __getitem__(self, name):
+        if name in self.band_index:
+            return self.values[self.band_index[name]]
+        if name == "time" and self.time is not None:
+            return self.time
+        if name in COORDINATE_COLUMNS and getattr(self, name) is not None:
+            return np.full(self._size, getattr(self, name))
+        if name in self._text:
+            return self._decode(name)
+        if name in self._other:
+            return self._other[name]
+        raise KeyError(name)
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @property
+    def observations(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the arrays and the scene id vocabulary."""
+        held = self.values.nbytes + (self.time.nbytes if self.time is not None else 0)
+        for codes, vocabulary in self._text.values():
+            held += codes.nbytes + sum(len(entry) for entry in vocabulary)
+        return held + sum(column.nbytes for column in self._other.values())
+
+    def __repr__(self) -> str:
+        return f"TimeSeries({self._size} observations: {', '.join(self._names)})"
+
+
+def collapse_same_day_rows(columns: Mapping, keys, keep) -> dict:
+    """`columns` with one row per distinct key, as gee_common.collapse_same_day mosaics a masked series.
+
+    For a series fetched unmasked and masked here, where the server could not collapse it without
+    letting a cloudy copy of a day hide a clear one. Each key keeps the id and time of its first row
+    and the values of its first row `keep` holds (its first row when none does), in the order the
+    keys first occur.
+    """
+    keys = np.asarray(keys)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    kept = np.flatnonzero(keep)
+    source = np.full(len(first), len(keys))
+    np.minimum.at(source, inverse[kept], kept)
+    source = np.where(source < len(keys), source, first)
+    order = np.argsort(first)
+    first, source = first[order], source[order]
+    return {name: np.asarray(column)[first if name in ("id", "time") else source] for name, column in columns.items()}
@@ -32,13 +32,15 @@ from qgis.core import (
     QgsApplication,
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
+    QgsMessageLog,
     QgsPointXY,
     QgsProject,
+    QgsRasterLayer,
     QgsTask,
 )
-from qgis.gui import QgsMapTool, QgsVertexMarker
+from qgis.gui import QgsMapTool, QgsMapToolExtent, QgsVertexMarker
 from qgis.PyQt import QtWidgets, uic
-from qgis.PyQt.QtCore import QDate, Qt, QUrl, pyqtSignal
+from qgis.PyQt.QtCore import QDate, Qt, QTimer, QUrl, pyqtSignal
 from qgis.PyQt.QtGui import QColor, QDesktopServices, QPalette
 from qgis.PyQt.QtWebEngineCore import QWebEngineLoadingInfo, QWebEngineSettings
 from qgis.PyQt.QtWebEngineWidgets import QWebEngineView  # noqa: F401
@@ -50,16 +52,43 @@ plugin_folder = os.path.dirname(os.path.dirname(__file__))
 FORM_CLASS, _ = uic.loadUiType(os.path.join(plugin_folder, "ui", "CCD_Plugin_dockwidget_QWebEngine.ui"))
 
 
+from CCD_Plugin.core.ccd_area import area_results_for, compute_ccd_area, register_area_result  # noqa: E402
 from CCD_Plugin.core.ccd_process import (  # noqa: E402
     DEFAULT_BREAKPOINT_BANDS,
     compute_ccd,
+    compute_ccd_points,
+    fetch_sentinel_flags,
+    lookup_grid,
+    lookup_result,
+    make_cache_key,
     resolve_ccd_bands,
+    resolve_computed_indices,
+)
+from CCD_Plugin.core.diagnostics import RunDiagnostics  # noqa: E402
+from CCD_Plugin.core.gee_common import CCD_BANDS, INDEX_BANDS  # noqa: E402
+from CCD_Plugin.core.gee_quota import Priority, RunPriority  # noqa: E402
+from CCD_Plugin.core.gee_session import (  # noqa: E402
+    batch_limit,
+    endpoint_run,
+    endpoint_url,
+    initialize_earth_engine,
+    request_quota,
+)
+from CCD_Plugin.core.lifecycle import (  # noqa: E402
+    MAX_SUPERSEDED_PICKS,
+    PickScheduler,
+    PlotFileLifecycle,
+    PlotLoadController,
+    TaskLifecycle,
 )
-from CCD_Plugin.core.gee_common import CCD_BANDS  # noqa: E402
-from CCD_Plugin.core.lifecycle import PlotFileLifecycle, PlotLoadController, TaskLifecycle  # noqa: E402
 from CCD_Plugin.core.loading import loading_page_html  # noqa: E402
+from CCD_Plugin.core.pixel_grid import NEIGHBOUR_STEPS, north_step, step  # noqa: E402
 from CCD_Plugin.core.plot import PlotSpec, PlotStyle, generate_plot  # noqa: E402
+from CCD_Plugin.core.plot_data import CcdcResult  # noqa: E402
+from CCD_Plugin.core.sentinel_masks import apply_cloud_filter  # noqa: E402
+from CCD_Plugin.core.timeseries import TimeSeries  # noqa: E402
 from CCD_Plugin.gui.advanced_settings import AdvancedSettings  # noqa: E402
+from CCD_Plugin.gui.batch_dialog import BatchDialog  # noqa: E402
 from CCD_Plugin.utils.config import get_plugin_config, get_plugin_tmp_dir, restore_plugin_config  # noqa: E402
 from CCD_Plugin.utils.system_utils import error_handler, wait_process  # noqa: E402
 
@@ -94,7 +123,23 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         self.config = None
         self.last_config = None
         self.task = None
+        self.task_priority = None
         self.task_lifecycle = TaskLifecycle()
+        # runs nobody is waiting on any more, kept referenced until they finish into the cache
+        self.background_tasks = set()
+        self.pick_scheduler = PickScheduler()
+        self.pick_timer = QTimer(self)
+        self.pick_timer.setSingleShot(True)
+        self.pick_timer.timeout.connect(self.run_scheduled_pick)
+        # whether the scheduled pick came from the keyboard, which stays in pick mode to keep stepping
+        self.keep_picking = False
+        # the grid of the last pixel stepped from, with the settings it holds for, so steps made
+        # faster than the runs behind them still have one
+        self.step_grid = None
+        self.prefetch_task = None
+        self.filter_preview_task = None
+        self.area_task = None
+        self.area_tool = None
         self.plot_files = PlotFileLifecycle(
             plot_directory if plot_directory is not None else lambda: get_plugin_tmp_dir(self.id)
         )
@@ -145,6 +190,15 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         # advanced settings dialog
         self.advanced_settings = AdvancedSettings()
         self.btm_advanced_settings.clicked.connect(self.advanced_settings.show)
+        # a new Sentinel-2 cloud filter shows at once which observations it keeps
+        self.advanced_settings.cloud_filter.currentTextChanged.connect(lambda: self.preview_cloud_filter())
+
+        # batch dialog, to run the same settings over every point of a layer
+        self.batch_dialog = BatchDialog(self.id, self.connect_earth_engine, decimals=self.longitude.decimals())
+        self.btm_batch.clicked.connect(self.batch_dialog.show)
+
+        # area mode, a rectangle drawn on the map computed pixel by pixel into a break-date raster
+        self.btm_area.toggled.connect(self.setup_area_tool)
 
         # restore the plugin configuration from a yaml file
         self.restore_configuration.clicked.connect(lambda: self.restore_plugin_from_yaml())
@@ -203,6 +257,7 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
 
     def setup_map_tool(self, checked):
         if checked:
+            self.btm_area.setChecked(False)
             # set the map tool to pick coordinates
             for canvas, default_map_tool in zip(self.canvas, self.default_map_tools, strict=True):
                 canvas.unsetMapTool(default_map_tool)
@@ -212,22 +267,54 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             for canvas, default_map_tool in zip(self.canvas, self.default_map_tools, strict=True):
                 canvas.setMapTool(default_map_tool, clean=True)
 
+    def setup_area_tool(self, checked):
+        """Switch the main canvas to drawing the rectangle of an area run, or back."""
+        canvas = self.canvas[0]
+        if checked:
+            self.finish_picking()
+            if self.area_tool is None:
+                self.area_tool = QgsMapToolExtent(canvas)
+                self.area_tool.extentChanged.connect(self.area_drawn)
+                self.area_tool.deactivated.connect(self.area_tool_deactivated)
+            canvas.setMapTool(self.area_tool)
+        elif self.area_tool is not None and canvas.mapTool() is self.area_tool:
+            canvas.setMapTool(self.default_map_tools[0], clean=True)
+
+    def area_tool_deactivated(self):
+        # another tool took the canvas: only the button has to follow, the canvas is settled
+        self.btm_area.blockSignals(True)
+        self.btm_area.setChecked(False)
+        self.btm_area.blockSignals(False)
+
     @error_handler
-    def new_plot(self):
-        # before start the process
-        # check import ee lib
-        try:
-            import ee
+    def area_drawn(self, extent):
+        self.btm_area.setChecked(False)
+        if extent.isEmpty():
+            return
+        config = get_plugin_config(self.id)
+        if not config:
+            return
+        self.connect_earth_engine(config)
+        to_wgs84 = QgsCoordinateTransform(
+            self.canvas[0].mapSettings().destinationCrs(), QgsCoordinateReferenceSystem(4326), QgsProject.instance()
+        )
+        box = to_wgs84.transformBoundingBox(extent)
+        self.start_area_task(config, (box.xMinimum(), box.yMinimum(), box.xMaximum(), box.yMaximum()))
 
-            ee.Initialize()
-        except Exception as err:
-            raise Exception(f"Error importing ee lib, check the installation or your internet connection|{err}")
+    @error_handler
+    def new_plot(self, keep_picking=False):
+        # a pick still waiting out its debounce reads these same widgets, so this run covers it
+        self.pick_timer.stop()
+        self.pick_scheduler.cancel()
 
         # get the current configuration of the plugin
         config = get_plugin_config(self.id)
         if not config:
             return
 
+        # before start the process
+        self.connect_earth_engine(config, interactive=True)
+
         # nothing but the plotted band changed since the last run, and that is redrawn from cache
         if self.last_config and self.settings_unchanged(config):
             # say so rather than returning silently, or the button just looks dead
@@ -245,7 +332,41 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         self.start_ccd_task(config)
 
         # after finish the process
-        self.finish_picking()
+        if not keep_picking:
+            self.finish_picking()
+
+    @staticmethod
+    def connect_earth_engine(config, interactive=False):
+        """Initialize ee and apply the request limits.
+
+        Batch and area runs go to the endpoint the advanced settings ask for, picks to the default
+        one. Neither switches it under a run still in flight (see gee_session.endpoint_run).
+        """
+        try:
+            initialize_earth_engine(
+                None if interactive else endpoint_url(config["high_volume_endpoint"], config["endpoint_url"])
+            )
+        except Exception as err:
+            raise Exception(f"Error importing ee lib, check the installation or your internet connection|{err}")
+        batch_limit.set_limit(config["batch_concurrency"])
+        request_quota.configure(config["requests_per_second"], config["max_concurrent_requests"])
+
+    def schedule_new_plot(self, keep_picking=False):
+        """new_plot for a map pick: quick successive picks start one run, for the last point."""
+        config = get_plugin_config(self.id)
+        if not config:
+            return
+        self.keep_picking = keep_picking
+        self.pick_timer.start(self.pick_scheduler.pick(config))
+
+    def run_scheduled_pick(self):
+        latest, superseded = self.pick_scheduler.fire()
+        if latest is None:
+            return
+        if latest["finish_superseded_in_background"]:
+            for config in superseded:
+                self.start_background_task(config)
+        self.new_plot(keep_picking=self.keep_picking)
 
     def finish_picking(self):
         """Leave pick-on-map mode, if it is what started this run.
@@ -259,8 +380,21 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
     # Presentation and UI preferences: none of these reach compute_ccd, so a change to one must not
     # look like a settings change. auto_generate_plot especially - it is a plain checkbox, and
     # counting it here made toggling it force a full Earth Engine recomputation on the next run.
+    # The request settings only decide where and how fast requests go, never what they return.
     NON_COMPUTATION_SETTINGS: ClassVar[frozenset] = frozenset(
-        {"band_or_index_to_plot", "plot_style", "auto_generate_plot"}
+        {
+            "band_or_index_to_plot",
+            "plot_style",
+            "auto_generate_plot",
+            "high_volume_endpoint",
+            "endpoint_url",
+            "batch_concurrency",
+            "requests_per_second",
+            "max_concurrent_requests",
+            "finish_superseded_in_background",
+            "prefetch_neighbours",
+            "precompute_indices",
+        }
     )
 
     @classmethod
@@ -272,6 +406,22 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         """True when computation settings match the run that produced the current plot."""
         return self.last_config == self.comparable_settings(config)
 
+    @staticmethod
+    def cache_key(config):
+        """The results cache key of the point and settings in `config`."""
+        return make_cache_key(
+            (config["lon"], config["lat"]),
+            (config["start_date"], config["end_date"]),
+            (config["start_doy"], config["end_doy"]),
+            config["dataset"],
+            config["breakpoint_bands"],
+            num_obs=config["num_obs"],
+            chi_square=config["chi_square"],
+            min_years=config["min_years"],
+            lambda_lasso=config["lambda_lasso"],
+            cloud_filter=config["cloud_filter"],
+        )
+
     def start_ccd_task(self, config):
         """Run CCD for this configuration as a background task."""
         self.clean_plot()
@@ -287,40 +437,362 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         def finished(exception, result=None):
             dock = dock_ref()
             if dock is not None:
+                dock.background_tasks.discard(task_holder[0])
                 dock.ccd_completed(task_holder[0], exception, result)
 
+        priority = RunPriority(Priority.INTERACTIVE)
         task = QgsTask.fromFunction(
             "Compute CCD",
             self.compute_ccd,
             on_finished=finished,
             config=config,
+            priority=priority,
+            known_fit=self.known_fit(config),
         )
         task_holder.append(task)
+        # with the option on, the run this one replaces finishes into the cache instead of being
+        # cancelled, behind everything the user is waiting on
+        keep_previous = config["finish_superseded_in_background"] and len(self.background_tasks) < MAX_SUPERSEDED_PICKS
+        superseded = self.task_lifecycle.start(task, cancel_previous=not keep_previous)
+        if superseded is not None:
+            self.task_priority.demote()
+            self.background_tasks.add(superseded)
         self.task = task
-        self.task_lifecycle.start(task)
+        self.task_priority = priority
         QgsApplication.taskManager().addTask(self.task)
 
+    def start_background_task(self, config, extra_indices=()):
+        """Compute `config` into the results cache at low priority, without plotting it."""
+        if len(self.background_tasks) >= MAX_SUPERSEDED_PICKS:
+            return
+        dock_ref = weakref.ref(self)
+        task_holder = []
+
+        def finished(exception, result=None):
+            dock = dock_ref()
+            if dock is not None:
+                dock.background_tasks.discard(task_holder[0])
+
+        task = QgsTask.fromFunction(
+            "Compute CCD (background)",
+            self.compute_ccd,
+            on_finished=finished,
+            config=config,
+            priority=Priority.BACKGROUND,
+            extra_indices=extra_indices,
+        )
+        task_holder.append(task)
+        self.background_tasks.add(task)
+        QgsApplication.taskManager().addTask(task)
+
+    def pixel_coords(self, config, grid, steps):
+        """Longitude/latitude of the pixels `steps` (column, row) away from the one at `config`'s point.
+
+        Rounded the way the coordinate boxes round, so picking one of them computes under the cache
+        key a prefetch stored it with. None when QGIS does not know the grid's CRS.
+        """
+        crs = QgsCoordinateReferenceSystem(grid["crs"])
+        if not crs.isValid():
+            return None
+        wgs84 = QgsCoordinateReferenceSystem(4326)
+        to_grid = QgsCoordinateTransform(wgs84, crs, QgsProject.instance())
+        from_grid = QgsCoordinateTransform(crs, wgs84, QgsProject.instance())
+        centre = to_grid.transform(QgsPointXY(config["lon"], config["lat"]))
+        coords = []
+        for columns, rows in steps:
+            x, y = step(centre.x(), centre.y(), grid["crsTransform"], columns, rows)
+            point = from_grid.transform(QgsPointXY(x, y))
+            coords.append((round(point.x(), self.longitude.decimals()), round(point.y(), self.latitude.decimals())))
+        return coords
+
+    def start_prefetch_task(self, config):
+        """Compute the eight pixels around `config`'s point into the cache, at low priority.
+
+        Replaces the prefetch for the previous plot: those pixels are no longer next to the user.
+        """
+        grid = lookup_grid(self.cache_key(config))
+        points = self.pixel_coords(config, grid, NEIGHBOUR_STEPS) if grid is not None else None
+        if not points:
+            return
+        if self.prefetch_task is not None:
+            self.prefetch_task.cancel()
+        dock_ref = weakref.ref(self)
+        task_holder = []
+
+        def finished(exception, result=None):
+            dock = dock_ref()
+            if dock is not None and dock.prefetch_task is task_holder[0]:
+                dock.prefetch_task = None
+            # nobody asked for these pixels yet, so a failure is logged rather than shown
+            if exception is not None:
+                QgsMessageLog.logMessage(
+                    f"Prefetching the pixels around {config['lon']}, {config['lat']} failed: {exception}",
+                    "CCD-Plugin",
+                    level=Qgis.MessageLevel.Warning,
+                )
+            elif result is not None:
+                stored, diagnostics = result
+                QgsMessageLog.logMessage(
+                    f"Prefetched {stored} pixels around {config['lon']}, {config['lat']}: {diagnostics.summary()}",
+                    "CCD-Plugin",
+                    level=Qgis.MessageLevel.Info,
+                )
+
+        task = QgsTask.fromFunction(
+            "Prefetch CCD neighbours",
+            self.compute_neighbours,
+            on_finished=finished,
+            config=config,
+            points=points,
+            grid=grid,
+        )
+        task_holder.append(task)
+        self.prefetch_task = task
+        QgsApplication.taskManager().addTask(task)
+
+    def preview_cloud_filter(self):
+        """Plot the observations the chosen Sentinel-2 cloud filter keeps at the plotted point.
+
+        Only the cloud filter may differ from the run on the plot. Every filter's verdict comes
+        from one fetch (fetch_sentinel_flags), cached, so switching between filters costs no
+        further Earth Engine run; the fit under the new one needs CCDC, which Generate runs.
+        """
+        config = get_plugin_config(self.id)
+        if not config or config["dataset"] != "Sentinel-2" or not self.last_config or self.task is not None:
+            return
+        previous = self.last_config
+        if any(
+            value != previous.get(name)
+            for name, value in self.comparable_settings(config).items()
+            if name != "cloud_filter"
+        ):
+            return
+        if self.filter_preview_task is not None:
+            self.filter_preview_task.cancel()
+            self.filter_preview_task = None
+        if config["cloud_filter"] == previous["cloud_filter"]:
+            # back to the filter on the plot, which is in the cache
+            self.repaint_plot()
+            return
+        dock_ref = weakref.ref(self)
+        task_holder = []
+
+        def finished(exception, result=None):
+            dock = dock_ref()
+            if dock is None or dock.filter_preview_task is not task_holder[0]:
+                return
+            dock.filter_preview_task = None
+            if exception is not None:
+                dock.MsgBar.clearWidgets()
+                dock.MsgBar.pushMessage(
+                    "CCD-Plugin", f"Error previewing the cloud filter: {exception}", level=Qgis.MessageLevel.Warning
+                )
+            elif result is not None:
+                dock.preview_completed(*result)
+
+        task = QgsTask.fromFunction(
+            "Preview Sentinel-2 cloud filter",
+            self.compute_filter_preview,
+            on_finished=finished,
+            config=config,
+            grid=lookup_grid(self.cache_key(previous)),
+        )
+        task_holder.append(task)
+        self.filter_preview_task = task
+        QgsApplication.taskManager().addTask(task)
+
     @staticmethod
-    def compute_ccd(task, config):
-        computed = compute_ccd(
-            coords=(config["lon"], config["lat"]),
-            date_range=(config["start_date"], config["end_date"]),
-            doy_range=(config["start_doy"], config["end_doy"]),
+    def compute_filter_preview(task, config, grid):
+        diagnostics = RunDiagnostics()
+        with endpoint_run():
+            flagged = fetch_sentinel_flags(
+                (config["lon"], config["lat"]),
+                (config["start_date"], config["end_date"]),
+                (config["start_doy"], config["end_doy"]),
+                grid=grid,
+                cancelled=task.isCanceled,
+                diagnostics=diagnostics,
+            )
+        if flagged is None or task.isCanceled():
+            return None
+        indices = resolve_computed_indices(config["breakpoint_bands"], config["band_or_index_to_plot"])
+        return config, TimeSeries(apply_cloud_filter(flagged, config["cloud_filter"], indices)), diagnostics
+
+    def preview_completed(self, config, timeseries, diagnostics):
+        # a run started since then has the plot
+        if self.task is not None:
+            return
+        QgsMessageLog.logMessage(
+            f"Cloud filter preview at {config['lon']}, {config['lat']}: {diagnostics.summary()}",
+            "CCD-Plugin",
+            level=Qgis.MessageLevel.Info,
+        )
+        self.clean_plot()
+        spec = PlotSpec(
             dataset=config["dataset"],
-            breakpoint_bands=config["breakpoint_bands"],
-            tmask_bands=None,
-            num_obs=config["num_obs"],
-            chi_square=config["chi_square"],
-            min_years=config["min_years"],
-            lambda_lasso=config["lambda_lasso"],
-            cloud_filter=config["cloud_filter"],
-            plot_band=config["band_or_index_to_plot"],
-            cancelled=task.isCanceled,
+            band=config["band_or_index_to_plot"],
+            longitude=float(config["lon"]),
+            latitude=float(config["lat"]),
+        )
+        pending_plot = generate_plot(CcdcResult({}), timeseries, spec, self.plot_files, style=self.plot_style)
+        # not staged as a config: the last fitted run stays the one Generate compares against
+        self.plot_loads.begin(Path(pending_plot))
+        self.plot_webview.load(QUrl.fromLocalFile(pending_plot))
+        self.MsgBar.clearWidgets()
+        self.MsgBar.pushMessage(
+            "CCD-Plugin",
+            f"The observations {config['cloud_filter']} keeps, without a model. Press Generate to fit CCDC with it.",
+            level=Qgis.MessageLevel.Info,
+            duration=10,
+        )
+
+    def known_fit(self, config):
+        """The CCDC fit at `config`'s point from an area run with the same settings, if one covers it."""
+        indices = resolve_computed_indices(config["breakpoint_bands"], config["band_or_index_to_plot"])
+        wgs84 = QgsCoordinateReferenceSystem(4326)
+        for result in area_results_for(self.cache_key(config)[1:], indices):
+            crs = QgsCoordinateReferenceSystem(result.grid["crs"])
+            if not crs.isValid():
+                continue
+            to_grid = QgsCoordinateTransform(wgs84, crs, QgsProject.instance())
+            point = to_grid.transform(QgsPointXY(config["lon"], config["lat"]))
+            pixel = result.pixel_at(point.x(), point.y())
+            if pixel is not None:
+                return result.ccdc_info_at(*pixel)
+        return None
+
+    def start_area_task(self, config, rectangle):
+        """Run CCD over every pixel of `rectangle` as a background task, replacing any area run."""
+        if self.area_task is not None:
+            self.area_task.cancel()
+        self.MsgBar.clearWidgets()
+        self.MsgBar.pushMessage("CCD-Plugin", "Computing CCD over the drawn area...", level=Qgis.MessageLevel.Info)
+        dock_ref = weakref.ref(self)
+        task_holder = []
+
+        def finished(exception, result=None):
+            dock = dock_ref()
+            if dock is not None:
+                dock.area_completed(task_holder[0], exception, result)
+
+        task = QgsTask.fromFunction(
+            "Compute CCD area",
+            self.compute_area,
+            on_finished=finished,
+            config=config,
+            rectangle=rectangle,
         )
+        task_holder.append(task)
+        self.area_task = task
+        QgsApplication.taskManager().addTask(task)
+
+    @staticmethod
+    def compute_area(task, config, rectangle):
+        diagnostics = RunDiagnostics()
+        with endpoint_run(endpoint_url(config["high_volume_endpoint"], config["endpoint_url"])):
+            result = compute_ccd_area(
+                rectangle,
+                date_range=(config["start_date"], config["end_date"]),
+                doy_range=(config["start_doy"], config["end_doy"]),
+                dataset=config["dataset"],
+                breakpoint_bands=config["breakpoint_bands"],
+                tmask_bands=None,
+                num_obs=config["num_obs"],
+                chi_square=config["chi_square"],
+                min_years=config["min_years"],
+                lambda_lasso=config["lambda_lasso"],
+                cloud_filter=config["cloud_filter"],
+                plot_band=config["band_or_index_to_plot"],
+                cancelled=task.isCanceled,
+                diagnostics=diagnostics,
+            )
+        if result is None or task.isCanceled():
+            return None
+        return config, result, diagnostics
+
+    def area_completed(self, task, exception, result=None):
+        if task is not self.area_task:
+            return
+        self.area_task = None
+        self.MsgBar.clearWidgets()
+        if exception is not None or result is None:
+            if task.isCanceled():
+                self.MsgBar.pushMessage("CCD-Plugin", "CCD area cancelled.", level=Qgis.MessageLevel.Info, duration=10)
+            else:
+                self.MsgBar.pushMessage(
+                    "CCD-Plugin", f"Error computing the CCD area: {exception}", level=Qgis.MessageLevel.Warning
+                )
+            return
+        config, area, diagnostics = result
+        register_area_result(self.cache_key(config)[1:], area)
+        path = Path(get_plugin_tmp_dir(self.id)) / f"ccd_area_{id(area):x}.tif"
+        area.write_geotiff(path)
+        rows, columns = area.shape
+        layer = QgsRasterLayer(str(path), f"CCD breaks ({config['dataset']}, {columns}x{rows} px)")
+        QgsProject.instance().addMapLayer(layer)
+        QgsMessageLog.logMessage(
+            f"CCD area of {columns}x{rows} pixels: {diagnostics.summary()}", "CCD-Plugin", level=Qgis.MessageLevel.Info
+        )
+        self.MsgBar.pushMessage(
+            "CCD-Plugin",
+            "Area done: the layer holds the first and last break (decimal years), the number of breaks and the "
+            "change magnitude. Picks inside it plot from the downloaded fit.",
+            level=Qgis.MessageLevel.Success,
+            duration=10,
+        )
+
+    @staticmethod
+    def compute_ccd(task, config, priority=Priority.INTERACTIVE, extra_indices=(), known_fit=None):
+        diagnostics = RunDiagnostics()
+        with endpoint_run():
+            computed = compute_ccd(
+                coords=(config["lon"], config["lat"]),
+                date_range=(config["start_date"], config["end_date"]),
+                doy_range=(config["start_doy"], config["end_doy"]),
+                dataset=config["dataset"],
+                breakpoint_bands=config["breakpoint_bands"],
+                tmask_bands=None,
+                num_obs=config["num_obs"],
+                chi_square=config["chi_square"],
+                min_years=config["min_years"],
+                lambda_lasso=config["lambda_lasso"],
+                cloud_filter=config["cloud_filter"],
+                plot_band=config["band_or_index_to_plot"],
+                cancelled=task.isCanceled,
+                diagnostics=diagnostics,
+                priority=priority,
+                extra_indices=extra_indices,
+                known_fit=known_fit,
+            )
         if computed is None or task.isCanceled():
             return None
         ccdc_result_info, timeseries = computed
-        return config, ccdc_result_info, timeseries
+        return config, ccdc_result_info, timeseries, diagnostics
+
+    @staticmethod
+    def compute_neighbours(task, config, points, grid):
+        diagnostics = RunDiagnostics()
+        with endpoint_run():
+            stored = compute_ccd_points(
+                points,
+                grid=grid,
+                date_range=(config["start_date"], config["end_date"]),
+                doy_range=(config["start_doy"], config["end_doy"]),
+                dataset=config["dataset"],
+                breakpoint_bands=config["breakpoint_bands"],
+                tmask_bands=None,
+                num_obs=config["num_obs"],
+                chi_square=config["chi_square"],
+                min_years=config["min_years"],
+                lambda_lasso=config["lambda_lasso"],
+                cloud_filter=config["cloud_filter"],
+                plot_band=config["band_or_index_to_plot"],
+                cancelled=task.isCanceled,
+                diagnostics=diagnostics,
+            )
+        if task.isCanceled():
+            return None
+        return stored, diagnostics
 
     def ccd_completed(self, task, exception, result=None):
         if not self.task_lifecycle.finish(task):
@@ -328,9 +800,14 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         self.task = None
         try:
             if exception is None and result is not None:
-                config, ccdc_result_info, timeseries = result
+                config, ccdc_result_info, timeseries, diagnostics = result
+                QgsMessageLog.logMessage(
+                    f"CCD run at {config['lon']}, {config['lat']}: {diagnostics.summary()}",
+                    "CCD-Plugin",
+                    level=Qgis.MessageLevel.Info,
+                )
                 notices = []
-                if not ccdc_result_info.get("tBreak"):
+                if CcdcResult.of(ccdc_result_info).segments == 0:
                     notices.append(
                         "Not enough data for this period to fit the change detection model, "
                         "plotting only the observed values."
@@ -346,23 +823,13 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
                     self.MsgBar.clearWidgets()
                     self.MsgBar.pushMessage("CCD-Plugin", " ".join(notices), level=Qgis.MessageLevel.Info, duration=10)
 
-                spec = PlotSpec(
-                    dataset=config["dataset"],
-                    band=config["band_or_index_to_plot"],
-                    longitude=float(config["lon"]),
-                    latitude=float(config["lat"]),
-                )
-                pending_plot = generate_plot(
-                    ccdc_result_info,
-                    timeseries,
-                    spec,
-                    self.plot_files,
-                    style=self.plot_style,
-                )
+                self.render_result(config, ccdc_result_info, timeseries)
 
-                pending = self.plot_loads.begin(Path(pending_plot))
-                self.pending_configs[pending.generation] = self.comparable_settings(config)
-                self.plot_webview.load(QUrl.fromLocalFile(pending_plot))
+                if config["prefetch_neighbours"]:
+                    self.start_prefetch_task(config)
+                # every other band switch at this point is then drawn from the cache
+                if config["precompute_indices"] and lookup_result(self.cache_key(config), INDEX_BANDS) is None:
+                    self.start_background_task(config, extra_indices=INDEX_BANDS)
             else:
                 if task.isCanceled():
                     msg = "CCD computation cancelled."
@@ -382,12 +849,30 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             self.generate_button.setEnabled(True)
             self.band_or_index_to_plot.setEnabled(True)
 
+    def render_result(self, config, ccdc_result_info, timeseries):
+        """Plot a CCD result for `config` and start loading it in the view."""
+        spec = PlotSpec(
+            dataset=config["dataset"],
+            band=config["band_or_index_to_plot"],
+            longitude=float(config["lon"]),
+            latitude=float(config["lat"]),
+        )
+        pending_plot = generate_plot(
+            ccdc_result_info,
+            timeseries,
+            spec,
+            self.plot_files,
+            style=self.plot_style,
+        )
+        pending = self.plot_loads.begin(Path(pending_plot))
+        self.pending_configs[pending.generation] = self.comparable_settings(config)
+        self.plot_webview.load(QUrl.fromLocalFile(pending_plot))
+
     @wait_process
     def repaint_plot(self):
         from CCD_Plugin.core.ccd_process import (
             has_cached_results,
-            lookup_result,
-            make_cache_key,
+            lookup_derived,
             resolve_computed_indices,
         )
 
@@ -400,24 +885,20 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         band_or_index_to_plot = config["band_or_index_to_plot"]
 
         # check if ccd results are already computed
-        key = make_cache_key(
-            (config["lon"], config["lat"]),
-            (config["start_date"], config["end_date"]),
-            (config["start_doy"], config["end_doy"]),
-            dataset,
-            config["breakpoint_bands"],
-            num_obs=config["num_obs"],
-            chi_square=config["chi_square"],
-            min_years=config["min_years"],
-            lambda_lasso=config["lambda_lasso"],
-            cloud_filter=config["cloud_filter"],
-        )
-        cached = lookup_result(key, resolve_computed_indices(config["breakpoint_bands"], band_or_index_to_plot))
+        indices = resolve_computed_indices(config["breakpoint_bands"], band_or_index_to_plot)
+        cached = lookup_result(self.cache_key(config), indices)
         if cached is None:
             if self.last_config and self.settings_unchanged(config):
-                # Only the plotted band differs, and it needs an index the last run did not build,
-                # so recompute rather than making the user press Generate for a band switch.
-                self.start_ccd_task(config)
+                # Only the plotted band differs, and it needs an index the last run did not build.
+                # Its observations come from the cached optical bands and its model is fitted on
+                # the cached segments, so it is drawn at once, without Earth Engine. Recompute
+                # only when there is nothing cached at this point to derive it from.
+                derived = lookup_derived(self.cache_key(config), indices, dataset, config["num_obs"])
+                if derived is not None:
+                    self.clean_plot()
+                    self.render_result(config, *derived)
+                else:
+                    self.start_ccd_task(config)
             else:
                 # Something else changed too. Recomputing here would silently apply settings the
                 # user never confirmed, so leave the current plot up and say why nothing happened.
@@ -427,23 +908,7 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             return
 
         self.clean_plot()
-        ccdc_result_info, timeseries = cached
-        spec = PlotSpec(
-            dataset=dataset,
-            band=band_or_index_to_plot,
-            longitude=float(self.longitude.value()),
-            latitude=float(self.latitude.value()),
-        )
-        pending_plot = generate_plot(
-            ccdc_result_info,
-            timeseries,
-            spec,
-            self.plot_files,
-            style=self.plot_style,
-        )
-        pending = self.plot_loads.begin(Path(pending_plot))
-        self.pending_configs[pending.generation] = self.comparable_settings(config)
-        self.plot_webview.load(QUrl.fromLocalFile(pending_plot))
+        self.render_result(config, *cached)
 
     @error_handler
     def restore_plugin_from_yaml(self):
@@ -467,14 +932,17 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         # the dates, DOY and advanced settings. Left connected, that repaint runs against a
         # half-restored configuration and reports the settings as changed. Restore first, then
         # repaint once, below.
+        # The cloud filter previews on change for the same reason.
         previous_band = self.band_or_index_to_plot.currentText()
         self.band_or_index_to_plot.blockSignals(True)
+        self.advanced_settings.cloud_filter.blockSignals(True)
         try:
             style_changed = restore_plugin_config(self.id, config)
         except Exception as err:
             raise Exception(f"Error restoring the configuration of the CCD plugin, see more:|{err}")
         finally:
             self.band_or_index_to_plot.blockSignals(False)
+            self.advanced_settings.cloud_filter.blockSignals(False)
 
         if style_changed or self.band_or_index_to_plot.currentText() != previous_band:
             self.repaint_plot()
@@ -510,7 +978,40 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             except yaml.YAMLError as err:
                 raise Exception(f"Error writing the YAML file to save the CCD plugin, see more:|{err}")
 
-    def show_and_go_to_the_coordinates(self):
+    def step_pixel(self, east, north):
+        """Move the point `east` and `north` pixels over on the current plot's grid, and plot there.
+
+        The grid is the one the plot was sampled on, so each step lands on the next pixel of the
+        dataset, and the prefetched neighbours are found under exactly their cache keys.
+        """
+        config = get_plugin_config(self.id)
+        if not config:
+            return
+        key = self.cache_key(config)
+        grid = lookup_grid(key)
+        if grid is None and self.step_grid is not None and self.step_grid[0] == key[1:]:
+            grid = self.step_grid[1]
+        coords = None
+        if grid is not None:
+            self.step_grid = (key[1:], grid)
+            coords = self.pixel_coords(config, grid, [(east, north * north_step(grid["crsTransform"]))])
+        if not coords:
+            self.MsgBar.clearWidgets()
+            self.MsgBar.pushMessage(
+                "CCD-Plugin",
+                "Generate a plot first: the arrow keys step to the pixels next to a computed one.",
+                level=Qgis.MessageLevel.Info,
+                duration=5,
+            )
+            return
+        lon, lat = coords[0]
+        self.longitude.setValue(lon)
+        self.latitude.setValue(lat)
+        self.mark_coordinates()
+        self.schedule_new_plot(keep_picking=True)
+
+    def mark_coordinates(self):
+        """Draw the marker at the coordinates in the boxes; returns its canvas and map point."""
         if PickerCoordsOnMap.marker_drawn["canvas"] is not None:
             canvas = PickerCoordsOnMap.marker_drawn["canvas"]
         else:
@@ -524,6 +1025,10 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
         point = xform.transform(point)
         # create a marker; drawing one needs no map tool, so do not build one just to place it
         PickerCoordsOnMap.create_marker(canvas, point)
+        return canvas, point
+
+    def show_and_go_to_the_coordinates(self):
+        canvas, point = self.mark_coordinates()
         canvas.setCenter(point)
         canvas.refresh()
 
@@ -569,8 +1074,25 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
             self.plot_webview.setHtml("")
 
     def dispose(self):
+        self.pick_timer.stop()
+        self.pick_scheduler.cancel()
         self.task_lifecycle.dispose()
         self.task = None
+        self.task_priority = None
+        for task in self.background_tasks:
+            task.cancel()
+        self.background_tasks.clear()
+        if self.prefetch_task is not None:
+            self.prefetch_task.cancel()
+            self.prefetch_task = None
+        if self.filter_preview_task is not None:
+            self.filter_preview_task.cancel()
+            self.filter_preview_task = None
+        self.batch_dialog.cancel()
+        if self.area_task is not None:
+            self.area_task.cancel()
+            self.area_task = None
+        self.btm_area.setChecked(False)
         self.plot_webview.setHtml("")
         self.plot_loads.cancel()
         self.pending_configs.clear()
@@ -586,6 +1108,13 @@ class CCD_PluginDockWidget(QtWidgets.QDockWidget, FORM_CLASS):
 
 class PickerCoordsOnMap(QgsMapTool):
     marker_drawn: ClassVar[dict] = {"marker": None, "canvas": None}
+    # arrow key -> (east, north) pixels to step the point by
+    PIXEL_STEPS: ClassVar[dict] = {
+        Qt.Key.Key_Left: (-1, 0),
+        Qt.Key.Key_Right: (1, 0),
+        Qt.Key.Key_Up: (0, 1),
+        Qt.Key.Key_Down: (0, -1),
+    }
 
     def __init__(self, widget, canvas=None):
         self.widget = widget
@@ -641,8 +1170,12 @@ class PickerCoordsOnMap(QgsMapTool):
             self.widget.latitude.setValue(point.y())
 
             if self.widget.auto_generate_plot.isChecked():
-                self.widget.new_plot()
+                self.widget.schedule_new_plot()
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_Escape:
             self.widget.pick_on_map.click()
+        elif event.key() in self.PIXEL_STEPS:
+            # accepted, or the canvas also pans the map with the same key
+            event.accept()
+            self.widget.step_pixel(*self.PIXEL_STEPS[event.key()])
@@ -0,0 +1,218 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+with the collaboration of Daniel Moraes <moraesd90@gmail.com>
+
+"""
+
+import os
+import threading
+import weakref
+
+from qgis.core import (
+    Qgis,
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsField,
+    QgsMessageLog,
+    QgsPointXY,
+    QgsProject,
+    QgsTask,
+    QgsVectorDataProvider,
+)
+from qgis.PyQt import uic
+from qgis.PyQt.QtCore import QTimer
+from qgis.PyQt.QtWidgets import QDialog
+
+# plugin path
+plugin_folder = os.path.dirname(os.path.dirname(__file__))
+FORM_CLASS, _ = uic.loadUiType(os.path.join(plugin_folder, "ui", "batch_dialog.ui"))
+
+
+from CCD_Plugin.core.batch import BATCH_FIELDS, BatchProgress, run_points, split_points  # noqa: E402
+from CCD_Plugin.core.gee_session import endpoint_run, endpoint_url  # noqa: E402
+from CCD_Plugin.processing_provider.fields import FIELD_TYPES  # noqa: E402
+from CCD_Plugin.utils.config import get_plugin_config  # noqa: E402
+from CCD_Plugin.utils.system_utils import error_handler  # noqa: E402
+
+# how often the progress bar and the ETA are refreshed while a batch runs
+REFRESH_MS = 500
+
+
+def layer_points(layer, selected_only=False, decimals=None):
+    """(feature id, (lon, lat)) of every feature of a point layer with a geometry.
+
+    Rounded like the dock's coordinate boxes when `decimals` is given, so a batch point and the
+    same point picked in the dock share one cache entry.
+    """
+    to_wgs84 = QgsCoordinateTransform(layer.crs(), QgsCoordinateReferenceSystem(4326), QgsProject.instance())
+    features = layer.getSelectedFeatures() if selected_only else layer.getFeatures()
+    points = []
+    for feature in features:
+        geometry = feature.geometry()
+        if geometry.isEmpty():
+            continue
+        # the point itself, or the first part of a multipoint
+        vertex = geometry.vertexAt(0)
+        point = to_wgs84.transform(QgsPointXY(vertex.x(), vertex.y()))
+        lon, lat = point.x(), point.y()
+        if decimals is not None:
+            lon, lat = round(lon, decimals), round(lat, decimals)
+        points.append((feature.id(), (lon, lat)))
+    return points
+
+
+def write_results(layer, results):
+    """Write the BATCH_FIELDS of each feature in `results`, adding the fields the layer lacks."""
+    provider = layer.dataProvider()
+    missing = [QgsField(name, FIELD_TYPES[kind]) for name, kind in BATCH_FIELDS if layer.fields().indexOf(name) < 0]
+    if missing:
+        provider.addAttributes(missing)
+        layer.updateFields()
+    indexes = {name: layer.fields().indexOf(name) for name, _ in BATCH_FIELDS}
+    provider.changeAttributeValues(
+        {
+            feature_id: {indexes[name]: value for name, value in attributes.items()}
+            for feature_id, attributes in results.items()
+        }
+    )
+    layer.triggerRepaint()
+
+
+def is_writable(layer):
+    capabilities = layer.dataProvider().capabilities()
+    return bool(capabilities & QgsVectorDataProvider.Capability.AddAttributes) and bool(
+        capabilities & QgsVectorDataProvider.Capability.ChangeAttributeValues
+    )
+
+
+class BatchDialog(QDialog, FORM_CLASS):
+    """Run the dock's CCD settings at every feature of a point layer, and write the results back.
+
+    The run is one QgsTask with a subtask per share of the points, as many as the batch
+    concurrency allows at once; the attributes are written when the last of them finishes.
+    """
+
+    def __init__(self, id, connect, decimals=None):
+        super().__init__()
+        self.setupUi(self)
+        self.id = id
+        # initializes Earth Engine and the request limits for a configuration, as a plot run does
+        self.connect = connect
+        self.decimals = decimals
+        self.task = None
+        self.progress_state = None
+        self.layer.setFilters(Qgis.LayerFilter.PointLayer)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(REFRESH_MS)
+        self.refresh_timer.timeout.connect(self.refresh_progress)
+        self.run_button.clicked.connect(lambda: self.run())
+        self.cancel_button.clicked.connect(self.cancel)
+
+    @error_handler
+    def run(self):
+        layer = self.layer.currentLayer()
+        if layer is None or self.task is not None:
+            return
+        config = get_plugin_config(self.id)
+        if not config:
+            return
+        if not is_writable(layer):
+            self.status.setText(f"{layer.name()} cannot be written to. Save it as a GeoPackage first.")
+            return
+        points = layer_points(layer, self.selected_only.isChecked(), self.decimals)
+        if not points:
+            self.status.setText(f"{layer.name()} has no point features to compute.")
+            return
+        self.connect(config)
+
+        progress = BatchProgress(len(points))
+        results = {}
+        results_lock = threading.Lock()
+        layer_id = layer.id()
+        dialog_ref = weakref.ref(self)
+        task_holder = []
+
+        def finished(exception, result=None):
+            dialog = dialog_ref()
+            if dialog is not None:
+                dialog.batch_completed(task_holder[0], layer_id, results, progress)
+
+        task = QgsTask.fromFunction(f"CCD batch: {layer.name()}", lambda task: True, on_finished=finished)
+        for share in split_points(points, config["batch_concurrency"]):
+            subtask = QgsTask.fromFunction(
+                f"CCD batch: {layer.name()} ({len(share)} points)",
+                self.run_share,
+                points=share,
+                config=config,
+                progress=progress,
+                results=results,
+                results_lock=results_lock,
+            )
+            task.addSubTask(subtask, [], QgsTask.SubTaskDependency.ParentDependsOnSubTask)
+        task_holder.append(task)
+        self.task = task
+        self.progress_state = progress
+        self.run_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.refresh_progress()
+        self.refresh_timer.start()
+        QgsApplication.taskManager().addTask(task)
+
+    @staticmethod
+    def run_share(task, points, config, progress, results, results_lock):
+        with endpoint_run(endpoint_url(config["high_volume_endpoint"], config["endpoint_url"])):
+            share = run_points(points, config, progress, task.isCanceled)
+        with results_lock:
+            results.update(share)
+        return len(share)
+
+    def refresh_progress(self):
+        progress = self.progress_state
+        if progress is None:
+            return
+        self.progress.setValue(int(progress.percent))
+        self.status.setText(progress.summary())
+        if self.task is not None:
+            self.task.setProgress(progress.percent)
+
+    def batch_completed(self, task, layer_id, results, progress):
+        if task is not self.task:
+            return
+        self.refresh_timer.stop()
+        self.refresh_progress()
+        self.task = None
+        self.run_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        layer = QgsProject.instance().mapLayer(layer_id)
+        if layer is None:
+            self.status.setText("The layer was removed before the batch finished; nothing was written.")
+            return
+        # whatever finished is kept, cancelled or not: it took Earth Engine work to get
+        if results:
+            write_results(layer, results)
+        outcome = "Cancelled" if task.isCanceled() else "Finished"
+        message = f"{outcome}: {progress.summary()}. Written to {len(results)} features of {layer.name()}."
+        self.status.setText(message)
+        QgsMessageLog.logMessage(f"CCD batch on {layer.name()}: {message}", "CCD-Plugin", level=Qgis.MessageLevel.Info)
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
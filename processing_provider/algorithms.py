@@ -0,0 +1,336 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+Processing algorithms running CCD at a point and at every feature of a point layer.
+
+Both take the parameters of make_cache_key and go through core.batch.run_points, like the batch
+dialog: every point holds a batch_limit slot, queues in the batch lane and is served from the
+results cache when the plugin already computed it.
+"""
+
+from CCD_Plugin.core.batch import BATCH_FIELDS, BatchProgress, run_parallel
+from CCD_Plugin.core.ccd_process import DATASET_AVAILABILITY, DEFAULT_BREAKPOINT_BANDS, DEFAULT_TMASK_BANDS
+from CCD_Plugin.core.gee_common import CCD_BANDS
+from CCD_Plugin.core.gee_data_sentinel import CLOUD_FILTERS, DEFAULT_CLOUD_FILTER
+from CCD_Plugin.core.gee_session import (
+    DEFAULT_BATCH_CONCURRENCY,
+    MAX_BATCH_CONCURRENCY,
+    batch_limit,
+    endpoint_run,
+    endpoint_url,
+    initialize_earth_engine,
+)
+from CCD_Plugin.processing_provider.fields import FIELD_TYPES
+from qgis.core import (
+    Qgis,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsFeature,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterDateTime,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterPoint,
+    QgsProcessingParameterString,
+)
+from qgis.PyQt.QtCore import QDate, QMetaType
+
+DATASETS = tuple(DATASET_AVAILABILITY)
+WGS84 = QgsCoordinateReferenceSystem("EPSG:4326")
+# how often the progress bar follows the points while the shares run
+PROGRESS_SECONDS = 0.5
+
+
+class CcdAlgorithm(QgsProcessingAlgorithm):
+    """The CCD settings every algorithm shares, in the order make_cache_key takes them."""
+
+    START_DATE = "START_DATE"
+    END_DATE = "END_DATE"
+    START_DOY = "START_DOY"
+    END_DOY = "END_DOY"
+    DATASET = "DATASET"
+    BREAKPOINT_BANDS = "BREAKPOINT_BANDS"
+    NUM_OBS = "NUM_OBS"
+    CHI_SQUARE = "CHI_SQUARE"
+    MIN_YEARS = "MIN_YEARS"
+    LAMBDA_LASSO = "LAMBDA_LASSO"
+    TMASK_BANDS = "TMASK_BANDS"
+    CLOUD_FILTER = "CLOUD_FILTER"
+    HIGH_VOLUME = "HIGH_VOLUME"
+    ENDPOINT_URL = "ENDPOINT_URL"
+    CONCURRENCY = "CONCURRENCY"
+    OUTPUT = "OUTPUT"
+
+    def add_ccd_parameters(self):
+        date_type = Qgis.ProcessingDateTimeParameterDataType.Date
+        integer = Qgis.ProcessingNumberParameterType.Integer
+        double = Qgis.ProcessingNumberParameterType.Double
+        self.addParameter(QgsProcessingParameterDateTime(self.START_DATE, "Start date", date_type, QDate(2010, 1, 1)))
+        self.addParameter(QgsProcessingParameterDateTime(self.END_DATE, "End date", date_type, QDate.currentDate()))
+        self.addParameter(QgsProcessingParameterNumber(self.START_DOY, "Start day of year", integer, 1, False, 1, 366))
+        self.addParameter(QgsProcessingParameterNumber(self.END_DOY, "End day of year", integer, 365, False, 1, 366))
+        self.addParameter(QgsProcessingParameterEnum(self.DATASET, "Dataset", list(DATASETS), defaultValue=0))
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.BREAKPOINT_BANDS,
+                "Breakpoint bands",
+                list(CCD_BANDS),
+                allowMultiple=True,
+                defaultValue=[CCD_BANDS.index(band) for band in DEFAULT_BREAKPOINT_BANDS],
+            )
+        )
+        self.addParameter(QgsProcessingParameterNumber(self.NUM_OBS, "Minimum observations", integer, 6, False, 1, 999))
+        self.addParameter(
+            QgsProcessingParameterNumber(self.CHI_SQUARE, "Chi-square probability", double, 0.99, False, 0, 1)
+        )
+        self.addParameter(QgsProcessingParameterNumber(self.MIN_YEARS, "Minimum years", double, 1.33, False, 0, 2))
+        self.addParameter(QgsProcessingParameterNumber(self.LAMBDA_LASSO, "Lasso lambda", double, 0.002, False, 0, 0.1))
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.CLOUD_FILTER,
+                "Sentinel-2 cloud mask",
+                list(CLOUD_FILTERS),
+                defaultValue=CLOUD_FILTERS.index(DEFAULT_CLOUD_FILTER),
+            )
+        )
+        advanced = [
+            QgsProcessingParameterEnum(
+                self.TMASK_BANDS,
+                "TMask bands",
+                list(CCD_BANDS),
+                allowMultiple=True,
+                defaultValue=[CCD_BANDS.index(band) for band in DEFAULT_TMASK_BANDS],
+            ),
+            QgsProcessingParameterBoolean(self.HIGH_VOLUME, "Use the high-volume Earth Engine endpoint", False),
+            QgsProcessingParameterString(
+                self.ENDPOINT_URL, "High-volume endpoint URL (empty for Google's)", "", optional=True
+            ),
+            QgsProcessingParameterNumber(
+                self.CONCURRENCY,
+                "Points computed at once",
+                integer,
+                DEFAULT_BATCH_CONCURRENCY,
+                False,
+                1,
+                MAX_BATCH_CONCURRENCY,
+            ),
+        ]
+        for parameter in advanced:
+            parameter.setFlags(parameter.flags() | Qgis.ProcessingParameterFlag.Advanced)
+            self.addParameter(parameter)
+
+    def ccd_config(self, parameters, context):
+        """The settings as the config dict run_points reads, the dock's keys and values."""
+
+        def bands(name):
+            return [CCD_BANDS[index] for index in self.parameterAsEnums(parameters, name, context)]
+
+        def date(name):
+            return self.parameterAsDate(parameters, name, context).toString("yyyy-MM-dd")
+
+        return {
+            "start_date": date(self.START_DATE),
+            "end_date": date(self.END_DATE),
+            "start_doy": self.parameterAsInt(parameters, self.START_DOY, context),
+            "end_doy": self.parameterAsInt(parameters, self.END_DOY, context),
+            "dataset": DATASETS[self.parameterAsEnum(parameters, self.DATASET, context)],
+            "breakpoint_bands": bands(self.BREAKPOINT_BANDS),
+            "tmask_bands": bands(self.TMASK_BANDS) or None,
+            "num_obs": self.parameterAsInt(parameters, self.NUM_OBS, context),
+            "chi_square": self.parameterAsDouble(parameters, self.CHI_SQUARE, context),
+            "min_years": self.parameterAsDouble(parameters, self.MIN_YEARS, context),
+            "lambda_lasso": self.parameterAsDouble(parameters, self.LAMBDA_LASSO, context),
+            "cloud_filter": CLOUD_FILTERS[self.parameterAsEnum(parameters, self.CLOUD_FILTER, context)],
+            "band_or_index_to_plot": None,
+        }
+
+    def connect_earth_engine(self, parameters, context):
+        """The endpoint to run on, as the dock's advanced settings pick it, after initializing ee."""
+        url = endpoint_url(
+            self.parameterAsBoolean(parameters, self.HIGH_VOLUME, context),
+            self.parameterAsString(parameters, self.ENDPOINT_URL, context),
+        )
+        try:
+            # like the dock's own runs, this leaves the endpoint alone while one of them is in flight
+            initialize_earth_engine(url)
+        except Exception as err:
+            raise QgsProcessingException(
+                f"Error initializing Earth Engine, check the installation and credentials: {err}"
+            )
+        batch_limit.set_limit(self.parameterAsInt(parameters, self.CONCURRENCY, context))
+        return url
+
+    @staticmethod
+    def result_fields(fields=None):
+        """`fields` with the BATCH_FIELDS it lacks appended."""
+        fields = QgsFields(fields) if fields is not None else QgsFields()
+        for name, kind in BATCH_FIELDS:
+            if fields.indexOf(name) < 0:
+                fields.append(QgsField(name, FIELD_TYPES[kind]))
+        return fields
+
+    @staticmethod
+    def run(points, config, feedback, url):
+        """The points computed batch_limit.limit at a time on `url`, with the progress bar following them."""
+        progress = BatchProgress(len(points))
+        with endpoint_run(url):
+            results = run_parallel(
+                points,
+                config,
+                progress,
+                batch_limit.limit,
+                feedback.isCanceled,
+                on_wait=lambda: feedback.setProgress(progress.percent),
+                wait_seconds=PROGRESS_SECONDS,
+            )
+        feedback.pushInfo(progress.summary())
+        return results
+
+    def groupId(self):
+        return ""
+
+    def group(self):
+        return ""
+
+
+class CcdPointAlgorithm(CcdAlgorithm):
+    POINT = "POINT"
+
+    def name(self):
+        return "ccdpoint"
+
+    def displayName(self):
+        return "CCD at a point"
+
+    def shortHelpString(self):
+        return (
+            "Runs CCDC at one point and writes its segment count, confirmed break dates and change "
+            "probabilities to a single-feature point layer."
+        )
+
+    def createInstance(self):
+        return CcdPointAlgorithm()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterPoint(self.POINT, "Point"))
+        self.add_ccd_parameters()
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(self.OUTPUT, "CCD result", QgsProcessing.SourceType.TypeVectorPoint)
+        )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        point = self.parameterAsPoint(parameters, self.POINT, context, WGS84)
+        config = self.ccd_config(parameters, context)
+        url = self.connect_earth_engine(parameters, context)
+
+        results = self.run([(0, (point.x(), point.y()))], config, feedback, url)
+        if feedback.isCanceled():
+            return {}
+        attributes = results[0]
+        if attributes["ccd_status"]:
+            raise QgsProcessingException(attributes["ccd_status"])
+
+        fields = QgsFields()
+        fields.append(QgsField("lon", QMetaType.Type.Double))
+        fields.append(QgsField("lat", QMetaType.Type.Double))
+        fields = self.result_fields(fields)
+        sink, dest_id = self.parameterAsSink(parameters, self.OUTPUT, context, fields, Qgis.WkbType.Point, WGS84)
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+        feature = QgsFeature(fields)
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(point.x(), point.y())))
+        feature["lon"], feature["lat"] = point.x(), point.y()
+        for name, value in attributes.items():
+            feature[name] = value
+        sink.addFeature(feature, QgsFeatureSink.Flag.FastInsert)
+        return {self.OUTPUT: dest_id}
+
+
+class CcdBatchAlgorithm(CcdAlgorithm):
+    INPUT = "INPUT"
+
+    def name(self):
+        return "ccdbatch"
+
+    def displayName(self):
+        return "CCD at every point of a layer"
+
+    def shortHelpString(self):
+        return (
+            "Runs CCDC at every feature of a point layer (the first point of a multipoint) and "
+            "copies the features with their segment count, confirmed break dates, change "
+            "probabilities and, for the points without a result, why."
+        )
+
+    def createInstance(self):
+        return CcdBatchAlgorithm()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(self.INPUT, "Points", [QgsProcessing.SourceType.TypeVectorPoint])
+        )
+        self.add_ccd_parameters()
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(self.OUTPUT, "CCD results", QgsProcessing.SourceType.TypeVectorPoint)
+        )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        source = self.parameterAsSource(parameters, self.INPUT, context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT))
+        config = self.ccd_config(parameters, context)
+        fields = self.result_fields(source.fields())
+        sink, dest_id = self.parameterAsSink(
+            parameters, self.OUTPUT, context, fields, source.wkbType(), source.sourceCrs()
+        )
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        to_wgs84 = QgsCoordinateTransform(source.sourceCrs(), WGS84, context.transformContext())
+        points = []
+        for feature in source.getFeatures():
+            geometry = feature.geometry()
+            if geometry.isEmpty():
+                continue
+            vertex = geometry.vertexAt(0)
+            point = to_wgs84.transform(QgsPointXY(vertex.x(), vertex.y()))
+            points.append((feature.id(), (point.x(), point.y())))
+        url = self.connect_earth_engine(parameters, context)
+        results = self.run(points, config, feedback, url)
+
+        # whatever finished is written, cancelled or not: it took Earth Engine work to get
+        for feature in source.getFeatures():
+            output = QgsFeature(fields)
+            output.setGeometry(feature.geometry())
+            for name in source.fields().names():
+                output[name] = feature[name]
+            for name, value in results.get(feature.id(), {}).items():
+                output[name] = value
+            sink.addFeature(output, QgsFeatureSink.Flag.FastInsert)
+        return {self.OUTPUT: dest_id}
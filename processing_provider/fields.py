@@ -0,0 +1,29 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+
+The QGIS field types of the batch result attributes, shared by the Processing algorithms and the
+batch dialog. Kept apart from both: importing the dialog loads its .ui file, which a headless
+qgis_process run must not need.
+"""
+
+from qgis.PyQt.QtCore import QMetaType
+
+# core.batch.BATCH_FIELDS types each field as a Python type, so the core stays free of Qt
+FIELD_TYPES = {int: QMetaType.Type.Int, float: QMetaType.Type.Double, str: QMetaType.Type.QString}
@@ -0,0 +1,43 @@
+"""
+/***************************************************************************
+ CCD Plugin
+                                 A QGIS plugin
+ Continuous Change Detection Plugin
+                              -------------------
+        copyright            : (C) 2019-2026 by Xavier Corredor Llano, SMByC
+        email                : xavier.corredor.llano@gmail.com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+The CCD Processing provider, so CCD runs in models, in batch and headless through qgis_process.
+"""
+
+from CCD_Plugin.processing_provider.algorithms import CcdBatchAlgorithm, CcdPointAlgorithm
+from qgis.core import QgsProcessingProvider
+from qgis.PyQt.QtGui import QIcon
+
+
+class CcdProvider(QgsProcessingProvider):
+    def loadAlgorithms(self):
+        self.addAlgorithm(CcdPointAlgorithm())
+        self.addAlgorithm(CcdBatchAlgorithm())
+
+    def id(self):
+        return "ccd"
+
+    def name(self):
+        return "CCD"
+
+    def longName(self):
+        return "Continuous Change Detection (CCDC)"
+
+    def icon(self):
+        return QIcon(":/plugins/CCD_Plugin/icons/ccd_plugin.svg")
@@ -18,7 +18,7 @@ FILES = (
     "resources.py",
     "screenshot.webp",
 )
-DIRECTORIES = ("core", "gui", "icons", "ui", "utils")
+DIRECTORIES = ("core", "gui", "icons", "processing_provider", "ui", "utils")
 
 
 def stage_plugin(source: Path, stage: Path) -> None:
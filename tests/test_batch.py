@@ -0,0 +1,307 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+import core.batch as batch_module
+from core.batch import (
+    BATCH_FIELDS,
+    BatchProgress,
+    collapse_pixels,
+    plan_clusters,
+    run_pipeline,
+    run_points,
+    split_points,
+    summarize,
+)
+from core.ccd_process import CCDComputationError, FetchedPoints
+
+DAY_MS = 24 * 60 * 60 * 1000
+# 2010-01-01, 2015-06-01 and 2020-03-01 in epoch milliseconds
+START, BREAK, PENDING = 14610 * DAY_MS, 16587 * DAY_MS, 18322 * DAY_MS
+
+CONFIG = {
+    "start_date": "2010-01-01",
+    "end_date": "2021-01-01",
+    "start_doy": 1,
+    "end_doy": 365,
+    "dataset": "Landsat C2",
+    "breakpoint_bands": ["Green", "Red", "NIR", "SWIR1", "SWIR2"],
+    "num_obs": 6,
+    "chi_square": 0.99,
+    "min_years": 1.33,
+    "lambda_lasso": 0.002,
+    "cloud_filter": "Cloud Score+",
+    "band_or_index_to_plot": "SWIR1",
+}
+
+
+# a Landsat grid in UTM zone 18N, and two points in one of its pixels near Bogota
+GRID = {"crs": "EPSG:32618", "crsTransform": [30, 0, 601845, 0, -30, 509595]}
+SAME_PIXEL = ((-74.0817, 4.6097), (-74.08168, 4.60968))
+
+
+def ccdc_info(starts, breaks, probabilities):
+    return {"tStart": [starts], "tBreak": [breaks], "changeProb": [probabilities]}
+
+
+class SummarizeTest(unittest.TestCase):
+    def test_only_confirmed_breaks_are_reported_as_breaks(self):
+        # Given: a confirmed break, then a last segment with a change still accumulating.
+        info = ccdc_info([START, BREAK], [BREAK, PENDING], [1, 0.5])
+
+        summary = summarize(info)
+
+        # Then: both segments count, one break is dated, and the pending change shows in the probabilities.
+        self.assertEqual(summary["ccd_segs"], 2)
+        self.assertEqual(summary["ccd_breaks"], 1)
+        self.assertEqual(summary["ccd_dates"], "2015-06-01")
+        self.assertEqual(summary["ccd_probs"], "1;0.5")
+        self.assertEqual(summary["ccd_maxpr"], 1)
+        self.assertEqual(summary["ccd_status"], "")
+
+    def test_a_point_without_a_model_has_no_segments(self):
+        summary = summarize({})
+
+        self.assertEqual(summary["ccd_segs"], 0)
+        self.assertIsNone(summary["ccd_maxpr"])
+
+    def test_every_field_is_filled_and_fits_a_shapefile(self):
+        summary = summarize(ccdc_info([START], [0], [0]))
+
+        self.assertEqual(set(summary), {name for name, _ in BATCH_FIELDS})
+        self.assertTrue(all(len(name) <= 10 for name, _ in BATCH_FIELDS))
+
+
+class PlanTest(unittest.TestCase):
+    def test_neighbours_are_clustered_and_distant_points_are_not(self):
+        # Given: two points a few hundred metres apart, one 100 km away, one across the equator.
+        points = [(1, (-74.08, 4.61)), (2, (-73.2, 4.61)), (3, (-74.079, 4.612)), (4, (-74.08, -4.61))]
+
+        # Then: the neighbours share a cluster, in the order they first appear.
+        self.assertEqual(
+            plan_clusters(points), [[(3, (-74.079, 4.612)), (1, (-74.08, 4.61))], [points[1]], [points[3]]]
+        )
+
+    def test_a_large_cluster_is_cut_into_requests_of_bounded_size(self):
+        points = [(index, (-74.08 + index * 1e-4, 4.61)) for index in range(7)]
+
+        self.assertEqual([len(cluster) for cluster in plan_clusters(points, max_points=3)], [3, 3, 1])
+
+    def test_points_in_one_native_pixel_are_computed_once(self):
+        # Given: two points in the same 30 m pixel and one 100 m south-east.
+        points = [(1, SAME_PIXEL[0]), (2, SAME_PIXEL[1]), (3, (-74.0808, 4.6091))]
+
+        # Then: on the grid they make two pixels; without one, only identical points would merge.
+        self.assertEqual(collapse_pixels(points, GRID), [(SAME_PIXEL[0], [1, 2]), ((-74.0808, 4.6091), [3])])
+        self.assertEqual(len(collapse_pixels(points)), 3)
+
+
+class SplitPointsTest(unittest.TestCase):
+    def test_clusters_stay_whole_and_shares_stay_even(self):
+        # Given: a cluster of three neighbours and two lone points far apart.
+        near = [(index, (-74.08 + index * 1e-3, 4.61)) for index in range(3)]
+        lone = [(10, (-60.0, 4.61)), (11, (-50.0, 4.61))]
+
+        shares = split_points([*near, *lone], 2)
+
+        # Then: the cluster is one share, the lone points the other.
+        self.assertEqual(sorted(map(len, shares)), [2, 3])
+        self.assertIn(sorted(near), [sorted(share) for share in shares])
+
+    def test_there_are_never_empty_shares(self):
+        points = [(1, (-74.0, 4.6)), (2, (-60.0, 4.6))]
+        self.assertEqual(len(split_points(points, 8)), 2)
+        self.assertEqual(split_points([], 4), [])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BatchProgressTest(unittest.TestCase):
+    def test_the_eta_follows_the_pace_so_far(self):
+        # Given: a ten-point run whose first two points took 30 s.
+        clock = FakeClock()
+        progress = BatchProgress(10, clock=clock)
+        self.assertIsNone(progress.eta_seconds())
+        clock.now = 30
+        progress.advance()
+        progress.advance(failed=True)
+
+        # Then: the other eight are expected to take 120 s.
+        self.assertEqual(progress.eta_seconds(), 120)
+        self.assertEqual(progress.percent, 20)
+        self.assertEqual(progress.summary(), "2 of 10 points, 1 without a result, about 2 min 00 s left")
+
+
+class RunPointsTest(unittest.TestCase):
+    def test_each_point_is_summarized_and_a_failure_does_not_stop_the_run(self):
+        # Given: three points, the second with no images.
+        def fake_compute_ccd(coords, diagnostics, **_):
+            if coords == (2, 2):
+                raise CCDComputationError("No images at this point for the selected date and DOY range.")
+            if coords == (3, 3):
+                diagnostics.count("cache_hits")
+            return ccdc_info([START], [0], [0]), {}
+
+        progress = BatchProgress(3)
+
+        # When: they are run.
+        with patch.object(batch_module, "compute_ccd", side_effect=fake_compute_ccd) as compute:
+            results = run_points([(10, (1, 1)), (11, (2, 2)), (12, (3, 3))], CONFIG, progress)
+
+        # Then: every feature has attributes, the failure says why, and batch requests queue last.
+        self.assertEqual(results[10]["ccd_segs"], 1)
+        self.assertIn("No images", results[11]["ccd_status"])
+        self.assertEqual(results[12]["ccd_segs"], 1)
+        self.assertEqual((progress.done, progress.failed, progress.cached), (3, 1, 1))
+        self.assertEqual(compute.call_args.kwargs["priority"], batch_module.Priority.BATCH)
+
+    def test_a_cancelled_run_stops_at_the_next_point(self):
+        progress = BatchProgress(2)
+
+        with patch.object(batch_module, "compute_ccd", return_value=None):
+            results = run_points([(10, (1, 1)), (11, (2, 2))], CONFIG, progress)
+
+        self.assertEqual(results, {})
+        self.assertEqual(progress.done, 0)
+
+    def test_neighbours_share_one_request_and_a_shared_pixel_one_result(self):
+        # Given: three features, two of them in one pixel, and a neighbour 100 m south-east.
+        points = [(1, SAME_PIXEL[0]), (2, SAME_PIXEL[1]), (3, (-74.0808, 4.6091))]
+        stored = {}
+
+        def fake_compute_ccd(coords, diagnostics, **_):
+            if coords in stored:
+                diagnostics.count("cache_hits")
+            return ccdc_info([START], [0], [0]), {}
+
+        def fake_fetch_ccd_points(points, grid, **_):
+            return FetchedPoints(points, [], (), grid, [], {})
+
+        def fake_store_ccd_points(fetched, cancelled):
+            stored.update(dict.fromkeys(fetched.points))
+            return [(ccdc_info([START], [0], [0]), {}) for _ in fetched.points]
+
+        progress = BatchProgress(3)
+
+        # When: they are run, the first point sampled on GRID.
+        with (
+            patch.object(batch_module, "compute_ccd", side_effect=fake_compute_ccd) as compute,
+            patch.object(batch_module, "fetch_ccd_points", side_effect=fake_fetch_ccd_points) as fetch,
+            patch.object(batch_module, "store_ccd_points", side_effect=fake_store_ccd_points),
+            patch.object(batch_module, "lookup_grid", return_value=GRID),
+            patch.object(batch_module, "lookup_result", return_value=None),
+        ):
+            results = run_points(points, CONFIG, progress)
+
+        # Then: the neighbour comes from one multi-point request on the first point's grid.
+        self.assertEqual(fetch.call_args.args[:2], ([(-74.0808, 4.6091)], GRID))
+        self.assertEqual(fetch.call_args.kwargs["priority"], batch_module.Priority.BATCH)
+        # And: the second feature is given the first one's result, the neighbour the parsed one,
+        # without a run of their own.
+        self.assertEqual([call.kwargs["coords"] for call in compute.call_args_list], [SAME_PIXEL[0]])
+        self.assertEqual(results[2], results[1])
+        # And: every feature counts once, none of them as already cached.
+        self.assertEqual((progress.done, progress.cached), (3, 0))
+
+    def test_parsing_a_cluster_makes_no_request(self):
+        # Given: a neighbour the multi-point fetch has no observations for.
+        points = [(1, SAME_PIXEL[0]), (2, (-74.0808, 4.6091))]
+        fetch_done = threading.Event()
+
+        def fake_compute_ccd(coords, **_):
+            # the fetch stage is the only place a run may start
+            self.assertFalse(fetch_done.is_set())
+            return ccdc_info([START], [0], [0]), {}
+
+        def fake_fetch_ccd_points(points, grid, **_):
+            return FetchedPoints(points, [], (), grid, [], {})
+
+        def fake_store_ccd_points(fetched, cancelled):
+            fetch_done.set()
+            return [CCDComputationError("No observations at this point.")]
+
+        results = {}
+
+        # When: the run goes through the pipeline.
+        with (
+            patch.object(batch_module, "compute_ccd", side_effect=fake_compute_ccd) as compute,
+            patch.object(batch_module, "fetch_ccd_points", side_effect=fake_fetch_ccd_points),
+            patch.object(batch_module, "store_ccd_points", side_effect=fake_store_ccd_points),
+            patch.object(batch_module, "lookup_grid", return_value=GRID),
+            patch.object(batch_module, "lookup_result", return_value=None),
+        ):
+            run_pipeline(
+                points,
+                CONFIG,
+                BatchProgress(2),
+                workers=1,
+                on_result=lambda feature_id, attributes, _: results.update({feature_id: attributes}),
+            )
+
+        # Then: the neighbour fails with the reason the fetch gave, and only the first point was run.
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(results[2]["ccd_status"], "No observations at this point.")
+        self.assertEqual(results[1]["ccd_status"], "")
+
+
+# points in three clusters, one of them with two features
+CLUSTERED = ((1, (-74.08, 4.61)), (2, (-60.0, 4.61)), (3, (-74.079, 4.609)), (4, (-50.0, 4.61)))
+
+
+class RunPipelineTest(unittest.TestCase):
+    def test_every_point_is_handed_on_once_on_the_calling_thread(self):
+        # Given: a run whose third cluster has no images.
+        def fake_compute_ccd(coords, **_):
+            if coords == (-50.0, 4.61):
+                raise CCDComputationError("No images at this point for the selected date and DOY range.")
+            return ccdc_info([START], [0], [0]), {}
+
+        delivered = []
+        progress = BatchProgress(len(CLUSTERED))
+
+        # When: it goes through the pipeline with two fetch workers.
+        with patch.object(batch_module, "compute_ccd", side_effect=fake_compute_ccd):
+            result = run_pipeline(
+                CLUSTERED,
+                CONFIG,
+                progress,
+                workers=2,
+                on_result=lambda feature_id, *_: delivered.append((feature_id, threading.current_thread())),
+                wait_seconds=0.01,
+            )
+
+        # Then: each feature arrives once, on this thread, and nothing is kept for a return value.
+        self.assertIsNone(result)
+        self.assertEqual(sorted(feature_id for feature_id, _ in delivered), [1, 2, 3, 4])
+        self.assertTrue(all(thread is threading.current_thread() for _, thread in delivered))
+        self.assertEqual((progress.done, progress.failed), (4, 1))
+
+    def test_a_failing_result_handler_stops_the_run_and_is_raised(self):
+        progress = BatchProgress(len(CLUSTERED))
+
+        def on_result(*_):
+            raise OSError("disk full")
+
+        with (
+            patch.object(batch_module, "compute_ccd", return_value=(ccdc_info([START], [0], [0]), {})),
+            self.assertRaises(OSError),
+        ):
+            run_pipeline(CLUSTERED, CONFIG, progress, workers=2, on_result=on_result, wait_seconds=0.01)
+
+    def test_a_cancelled_run_stops(self):
+        progress = BatchProgress(len(CLUSTERED))
+
+        with patch.object(batch_module, "compute_ccd", return_value=None):
+            run_pipeline(CLUSTERED, CONFIG, progress, workers=2, wait_seconds=0.01)
+
+        self.assertEqual(progress.done, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+
+import numpy as np
+
+import core.ccd_area as area_module
+from core.ccd_area import (
+    AREA_MAX_SEGMENTS,
+    SEGMENTS_BAND,
+    AreaResult,
+    area_results_for,
+    clear_area_results,
+    decimal_years,
+    pixel_window,
+    register_area_result,
+    tiles,
+    window_transform,
+)
+from core.plot_data import CCDC_COEFFICIENT_COUNT, build_model_segments
+
+DAY_MS = 24 * 60 * 60 * 1000
+# 2010-01-01, 2015-06-01, 2018-01-01 and 2021-01-01 in epoch milliseconds
+START, BREAK, LATER, END = 14610 * DAY_MS, 16587 * DAY_MS, 17532 * DAY_MS, 18628 * DAY_MS
+# a north-up 30 m grid, as Earth Engine reports a Landsat UTM projection
+TRANSFORM = [30, 0, 500000, 0, -30, 4000000]
+
+
+def area(pixels, shape=(1, 2), bands=("SWIR1",)):
+    """An AreaResult whose pixels, in row-major order, have the given (start, end, break, prob, mag) segments."""
+    names = ["tStart", "tEnd", "tBreak", "changeProb", *(f"{band}_rmse" for band in bands), "SWIR1_magnitude"]
+    layers = {f"{name}_{slot}": np.zeros(shape) for name in names for slot in range(AREA_MAX_SEGMENTS)}
+    for band in bands:
+        for slot in range(AREA_MAX_SEGMENTS):
+            for index in range(CCDC_COEFFICIENT_COUNT):
+                layers[f"{band}_coefs_{slot}_{index}"] = np.zeros(shape)
+    layers[SEGMENTS_BAND] = np.zeros(shape)
+    for position, segments in enumerate(pixels):
+        row, column = divmod(position, shape[1])
+        layers[SEGMENTS_BAND][row, column] = len(segments)
+        for slot, (start, end, moment, probability, magnitude) in enumerate(segments[:AREA_MAX_SEGMENTS]):
+            for name, value in zip(names[:4], (start, end, moment, probability), strict=True):
+                layers[f"{name}_{slot}"][row, column] = value
+            layers[f"SWIR1_magnitude_{slot}"][row, column] = magnitude
+            layers[f"SWIR1_rmse_{slot}"][row, column] = 0.01
+            layers[f"SWIR1_coefs_{slot}_0"][row, column] = 0.2 + slot
+    grid = {"crs": "EPSG:32618", "crsTransform": TRANSFORM}
+    return AreaResult(layers, grid, bands, "SWIR1", indices=())
+
+
+class WindowTest(unittest.TestCase):
+    def test_the_window_covers_every_pixel_the_rectangle_touches(self):
+        # Given: corners 45 m and 75 m into the grid, cutting pixels 1 and 2 of each axis.
+        corners = [(500045, 3999955), (500075, 3999955), (500075, 3999925), (500045, 3999925)]
+
+        # Then: columns and rows 1..2 are fetched.
+        self.assertEqual(pixel_window(corners, TRANSFORM), (1, 1, 2, 2))
+
+    def test_the_window_transform_starts_at_its_top_left_pixel(self):
+        self.assertEqual(window_transform(TRANSFORM, 2, 3), [30, 0, 500060, 0, -30, 3999910])
+
+    def test_tiles_cover_the_window_exactly_once(self):
+        # Given: a window that is not a whole number of tiles.
+        covered = np.zeros((70, 130), dtype=int)
+
+        for column, row, width, height in tiles(130, 70, size=64):
+            covered[row : row + height, column : column + width] += 1
+
+        # Then: every pixel is in exactly one tile, the ragged edge ones included.
+        self.assertTrue((covered == 1).all())
+        self.assertEqual(len(tiles(130, 70, size=64)), 6)
+
+
+class SummaryTest(unittest.TestCase):
+    def test_breaks_are_summarised_from_confirmed_changes_only(self):
+        # Given: a pixel with two confirmed breaks and a pending change, next to a stable one.
+        result = area(
+            [
+                [(START, BREAK, BREAK, 1, 0.05), (BREAK, LATER, LATER, 1, -0.2), (LATER, END, END, 0.5, 0.9)],
+                [(START, END, 0, 0, 0)],
+            ]
+        )
+
+        summary = result.summary()
+
+        # Then: the first pixel reports both breaks and the largest confirmed magnitude, sign kept.
+        self.assertEqual(summary["breaks"].tolist(), [[2, 0]])
+        self.assertAlmostEqual(summary["first_break"][0, 0], decimal_years(BREAK))
+        self.assertAlmostEqual(summary["last_break"][0, 0], decimal_years(LATER))
+        self.assertAlmostEqual(summary["magnitude"][0, 0], -0.2)
+        # And: the stable pixel has no break date or magnitude.
+        self.assertTrue(np.isnan(summary["first_break"][0, 1]))
+        self.assertTrue(np.isnan(summary["magnitude"][0, 1]))
+
+    def test_decimal_years_place_a_date_within_its_year(self):
+        self.assertAlmostEqual(float(decimal_years(BREAK)), 2015.41, places=2)
+
+
+class PixelFitTest(unittest.TestCase):
+    def test_a_pixel_fit_plots_like_a_reduce_region_result(self):
+        # Given: a pixel with a break, and an empty one beside it.
+        result = area([[(START, BREAK, BREAK, 1, 0.1), (BREAK, END, 0, 0, 0)], []])
+
+        info = result.ccdc_info_at(0, 0)
+
+        # Then: only its real segments come back, shaped for build_model_segments.
+        segments = build_model_segments(info, "SWIR1")
+        self.assertEqual([segment.start_ms for segment in segments], [START, BREAK])
+        self.assertTrue(segments[0].is_confirmed_break)
+        self.assertEqual(result.ccdc_info_at(1, 0)["tStart"], [[]])
+
+    def test_a_pixel_with_more_segments_than_downloaded_has_no_fit(self):
+        # Given: a pixel whose segments overflow the slots that were fetched.
+        result = area([[(START, END, 0, 0, 0)] * (AREA_MAX_SEGMENTS + 1), []])
+
+        # Then: a pick there has to fetch the full fit.
+        self.assertIsNone(result.ccdc_info_at(0, 0))
+
+    def test_a_point_is_located_on_the_native_grid(self):
+        result = area([[], []])
+
+        self.assertEqual(result.pixel_at(500045, 3999985), (1, 0))
+        self.assertIsNone(result.pixel_at(500075, 3999985))
+
+
+class RegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(clear_area_results)
+
+    def test_results_are_found_only_under_their_settings_and_indices(self):
+        # Given: a result computed with one set of settings and without any index.
+        result = area([[], []])
+        register_area_result(("settings",), result)
+
+        # Then: it serves those settings for optical bands only.
+        self.assertEqual(area_results_for(("settings",)), [result])
+        self.assertEqual(area_results_for(("other",)), [])
+        self.assertEqual(area_results_for(("settings",), ("NDVI",)), [])
+
+    def test_the_oldest_result_is_dropped_past_the_limit(self):
+        results = [area([[], []]) for _ in range(area_module.AREA_RESULTS_MAX + 1)]
+        for result in results:
+            register_area_result(("settings",), result)
+
+        self.assertNotIn(results[0], area_results_for(("settings",)))
+        self.assertEqual(area_results_for(("settings",))[0], results[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
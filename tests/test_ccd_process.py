@@ -6,15 +6,23 @@ import unittest
 from collections import OrderedDict
 from unittest.mock import Mock, patch
 
+import numpy as np
+
 import core.ccd_process as ccd_process_module
 from core.ccd_process import (
     DATASET_AVAILABILITY,
     _no_images_message,
+    _split_region_rows,
+    _store_grid,
     _store_result,
     ccd_results,
     clear_results_cache,
     compute_ccd,
+    compute_ccd_points,
+    lookup_derived,
+    lookup_grid,
     lookup_result,
+    make_cache_key,
     resolve_computed_indices,
 )
 
@@ -106,6 +114,20 @@ class CacheLookupTest(unittest.TestCase):
         self.assertEqual(lookup_result("k", ("NDVI",)), ("wide", "series"))
         self.assertEqual(lookup_result("k", ()), ("wide", "series"))
 
+    def test_an_index_the_run_did_not_build_is_derived_from_its_optical_bands(self):
+        # Given: a run that built no index, so its series holds only the optical bands.
+        bands = {"Blue": 0.03, "Green": 0.06, "Red": 0.04, "NIR": 0.35, "SWIR1": 0.18, "SWIR2": 0.09}
+        timeseries = {"id": np.array(["1_LC08_a"], dtype=object), **{b: np.array([v]) for b, v in bands.items()}}
+        _store_result("k", (), ({"Red_coefs": "fit"}, timeseries))
+
+        # When: a view needing NDVI looks it up.
+        ccdc_info, derived = lookup_derived("k", ("NDVI",), "Landsat C2")
+
+        # Then: the observations are there, computed locally, next to the run's own fit.
+        self.assertEqual(ccdc_info["Red_coefs"], "fit")
+        self.assertAlmostEqual(derived["NDVI"][0], 0.31 / 0.39)
+        self.assertIsNone(lookup_result("k", ("NDVI",)))
+
     def test_missing_key_is_a_miss(self):
         self.assertIsNone(lookup_result("nothing here", ()))
 
@@ -226,5 +248,193 @@ class CacheLookupTest(unittest.TestCase):
             )
 
 
+RUN = {
+    "date_range": ("2020-01-01", "2021-01-01"),
+    "doy_range": (1, 365),
+    "dataset": "Landsat C2",
+    "breakpoint_bands": ("Green", "Red", "NIR", "SWIR1", "SWIR2"),
+    "tmask_bands": None,
+    "num_obs": 6,
+    "chi_square": 0.99,
+    "min_years": 1.33,
+    "lambda_lasso": 0.002,
+}
+
+
+def key_at(coords):
+    return make_cache_key(coords, **{name: value for name, value in RUN.items() if name != "tmask_bands"})
+
+
+class NeighbourTest(unittest.TestCase):
+    def setUp(self):
+        clear_results_cache()
+        self.addCleanup(clear_results_cache)
+        fake_ee = types.SimpleNamespace(Geometry=types.SimpleNamespace(Point=lambda coords: coords))
+        self.enterContext(patch.dict(sys.modules, {"ee": fake_ee}))
+
+        def no_earth_engine(*_args):
+            raise AssertionError("Earth Engine was asked")
+
+        self.enterContext(patch.object(ccd_process_module, "get_gee_data_landsat", no_earth_engine))
+
+    def test_a_prefetched_point_is_served_without_asking_earth_engine(self):
+        # Given: a point the neighbour prefetch already stored.
+        _store_result(key_at((-74.1, 4.6)), (), ("fit", "series"))
+
+        # When: the user steps onto it.
+        result = compute_ccd(coords=(-74.1, 4.6), **RUN)
+
+        # Then: the stored result is returned as it is.
+        self.assertEqual(result, ("fit", "series"))
+
+    def test_a_run_asked_for_more_indices_is_not_served_by_a_narrower_entry(self):
+        # Given: the interactive run at a point, which built no index.
+        _store_result(key_at((-74.1, 4.6)), (), ("fit", "series"))
+
+        # When: the follow-up asks for every index there.
+        # Then: it goes to Earth Engine rather than returning the narrower result.
+        with self.assertRaisesRegex(AssertionError, "Earth Engine was asked"):
+            compute_ccd(coords=(-74.1, 4.6), extra_indices=("NDVI", "NBR"), **RUN)
+
+    def test_a_prefetch_of_points_all_cached_sends_nothing(self):
+        # Given: every neighbour already cached.
+        points = [(-74.1, 4.6), (-74.2, 4.6)]
+        for coords in points:
+            _store_result(key_at(coords), (), ("fit", "series"))
+
+        # Then: there is nothing to fetch and no collection is built.
+        self.assertEqual(compute_ccd_points(points, grid={}, **RUN), 0)
+
+    def test_the_grid_goes_with_the_results_cache(self):
+        _store_grid("k", {"crs": "EPSG:32618", "crsTransform": [30, 0, 15, 0, -30, 15]})
+        self.assertEqual(lookup_grid("k")["crs"], "EPSG:32618")
+
+        clear_results_cache()
+
+        self.assertIsNone(lookup_grid("k"))
+
+
+# Landsat scenes as (id, time, west, east): "a" holds only the anchor, "b" only the member, "c" both
+SCENES = (("a", 1, -74.5, -73.8), ("b", 2, -73.7, -73.0), ("c", 3, -74.5, -73.0))
+ANCHOR, MEMBER = (-74.0, 4.6), (-73.5, 4.6)
+
+
+def _points(geometry):
+    return [geometry] if isinstance(geometry[0], float) else list(geometry)
+
+
+def _covers(scene, point):
+    return scene[2] <= point[0] <= scene[3]
+
+
+class FakeCollection:
+    """The scenes filterBounds would keep at a point or points, sampled the way Earth Engine does."""
+
+    def __init__(self, at):
+        self.scenes = [scene for scene in SCENES if any(_covers(scene, point) for point in _points(at))]
+
+    def first(self):
+        return self.scenes[0] if self.scenes else None
+
+    def size(self):
+        return len(self.scenes)
+
+    def aggregate_sum(self, _name):
+        return types.SimpleNamespace(subtract=lambda _size: 0)
+
+    def getRegion(self, geometry, **_grid):
+        # only the scenes whose footprint holds a point give that point a row
+        rows = [["id", "longitude", "latitude", "time", "Red"]]
+        for scene in self.scenes:
+            rows.extend([scene[0], *point, scene[1], 0.1 * scene[1]] for point in geometry if _covers(scene, point))
+        return rows
+
+
+class FakeFit:
+    def __init__(self, collection):
+        self.scenes = collection.scenes
+
+    def fit_at(self, point):
+        times = [scene[1] for scene in self.scenes if _covers(scene, point)]
+        return {"tStart": [min(times)], "numObs": [len(times)]}
+
+    def reduceRegion(self, _reducer, geometry, **_grid):
+        return self.fit_at(geometry[0])
+
+    def reduceRegions(self, features, _reducer, **_grid):
+        return {"features": [{"properties": {**properties, **self.fit_at(point)}} for point, properties in features]}
+
+
+class ClusterCollectionTest(unittest.TestCase):
+    def setUp(self):
+        clear_results_cache()
+        self.addCleanup(clear_results_cache)
+        image = types.SimpleNamespace(
+            select=lambda _band: image, projection=lambda: {"crs": "EPSG:32618", "transform": [30, 0, 15, 0, -30, 15]}
+        )
+        fake_ee = types.SimpleNamespace(
+            Geometry=types.SimpleNamespace(Point=lambda coords: [tuple(coords)], MultiPoint=_points),
+            Algorithms=types.SimpleNamespace(If=lambda condition, then, otherwise: then if condition else otherwise),
+            Dictionary=lambda value: value,
+            List=lambda value: value,
+            Image=lambda _first: image,
+            Projection=lambda crs: crs,
+            Reducer=types.SimpleNamespace(toList=lambda: None),
+            Feature=lambda geometry, properties: (geometry[0], properties),
+            FeatureCollection=lambda features: features,
+        )
+        self.enterContext(patch.dict(sys.modules, {"ee": fake_ee}))
+        self.enterContext(patch.object(ccd_process_module, "get_gee_data_landsat", lambda at, *_: FakeCollection(at)))
+        self.enterContext(
+            patch.object(ccd_process_module, "templated_collection", lambda _key, at, build, _: build(at))
+        )
+        self.enterContext(patch.object(ccd_process_module, "_ccdc", lambda collection, *_: FakeFit(collection)))
+        self.enterContext(patch.object(ccd_process_module, "get_info", lambda computed, *_: computed))
+
+    def test_a_member_gets_the_rows_and_fit_a_run_of_its_own_would(self):
+        # Given: a member covered by a scene that misses the anchor, and missed by one that holds it.
+        compute_ccd(coords=ANCHOR, **RUN)
+
+        # When: it is fetched along with the anchor's cluster, on the anchor's grid.
+        self.assertEqual(compute_ccd_points([MEMBER], grid=lookup_grid(key_at(ANCHOR)), **RUN), 1)
+        clustered_fit, clustered_series = lookup_result(key_at(MEMBER), ())
+        clear_results_cache()
+        single_fit, single_series = compute_ccd(coords=MEMBER, **RUN)
+
+        # Then: it has the rows and the fit of a single-point run there, the anchor's scene not among them.
+        self.assertEqual(list(clustered_series["id"]), ["b", "c"])
+        self.assertEqual(list(clustered_series["id"]), list(single_series["id"]))
+        np.testing.assert_array_equal(clustered_series["Red"], single_series["Red"])
+        np.testing.assert_array_equal(clustered_fit.t_start, single_fit.t_start)
+        np.testing.assert_array_equal(clustered_fit.num_obs, single_fit.num_obs)
+
+
+class SplitRegionRowsTest(unittest.TestCase):
+    def test_each_row_goes_to_the_point_whose_pixel_it_sampled(self):
+        # Given: one getRegion over two points a pixel apart, reporting the pixel centres it sampled.
+        header = ["id", "longitude", "latitude", "time", "Red"]
+        west, east = (-74.00030, 4.6), (-74.00003, 4.6)
+        rows = [
+            header,
+            ["a", -74.00028, 4.60001, 1, 0.1],
+            ["a", -74.00001, 4.60001, 1, 0.2],
+            ["b", -74.00028, 4.60001, 2, 0.3],
+        ]
+
+        # When: the rows are split by point.
+        west_rows, east_rows = _split_region_rows(rows, [west, east])
+
+        # Then: each point gets its own observations, under the shared header.
+        self.assertEqual([row[4] for row in west_rows[1:]], [0.1, 0.3])
+        self.assertEqual([row[4] for row in east_rows[1:]], [0.2])
+        self.assertEqual(west_rows[0], header)
+
+    def test_no_rows_leaves_every_point_empty(self):
+        self.assertEqual(
+            _split_region_rows([["id", "longitude", "latitude"]], [(0, 0), (1, 1)])[1],
+            [["id", "longitude", "latitude"]],
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
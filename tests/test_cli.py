@@ -0,0 +1,182 @@
+import csv
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+import core.batch as batch_module
+import core.cli as cli_module
+from core.ccd_process import CCDComputationError
+from core.cli import DEFAULT_JOB, ResultWriter, mask_profiles, read_job, run_job
+from core.gee_data_landsat import DEFAULT_MASK_PROFILE, MaskProfile
+
+DAY_MS = 24 * 60 * 60 * 1000
+# 2010-01-01, 2015-06-01 and 2021-01-01 in epoch milliseconds
+START, BREAK, END = 14610 * DAY_MS, 16587 * DAY_MS, 18628 * DAY_MS
+FIT = {
+    "tStart": [[START, BREAK]],
+    "tEnd": [[BREAK, END]],
+    "tBreak": [[BREAK, 0]],
+    "changeProb": [[1, 0]],
+    "SWIR1_coefs": [[[0.2] + [0] * 7, [0.3] + [0] * 7]],
+    "SWIR1_rmse": [[0.01, 0.02]],
+}
+
+
+class ReadJobTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+
+    def test_a_saved_configuration_is_a_one_point_job(self):
+        # Given: a configuration as the dock saves it, with an unquoted date.
+        job = self.directory / "job.yaml"
+        job.write_text("lon: -74.1\nlat: 4.6\ndataset: Sentinel-2\nstart_date: 2018-01-01\nnum_obs: 8\n")
+
+        [(config, points)] = read_job(job)
+
+        # Then: its own point, its settings, and the dock's defaults for the rest.
+        self.assertEqual(points, [("0", (-74.1, 4.6))])
+        self.assertEqual(config["dataset"], "Sentinel-2")
+        self.assertEqual(config["start_date"], "2018-01-01")
+        self.assertEqual(config["num_obs"], 8)
+        self.assertEqual(config["chi_square"], DEFAULT_JOB["chi_square"])
+        self.assertNotIn("lon", config)
+
+    def test_csv_rows_override_the_settings_and_are_grouped_by_them(self):
+        # Given: three points, one of them with its own breakpoint bands.
+        job = self.directory / "job.csv"
+        job.write_text("id,lon,lat,breakpoint_bands\na,1,2,\nb,3,4,NDVI;NBR\nc,5,6,\n")
+
+        groups = read_job(job, {"dataset": "Landsat C2", "num_obs": "7"})
+
+        # Then: two runs, the override typed as a list, the settings as numbers.
+        self.assertEqual([[point_id for point_id, _ in points] for _, points in groups], [["a", "c"], ["b"]])
+        self.assertEqual(groups[1][0]["breakpoint_bands"], ["NDVI", "NBR"])
+        self.assertEqual(groups[0][0]["num_obs"], 7)
+
+    def test_tmask_bands_from_a_csv_row_are_a_list(self):
+        job = self.directory / "job.csv"
+        job.write_text("lon,lat,tmask_bands\n1,2,Green;SWIR1\n")
+
+        [(config, _)] = read_job(job)
+
+        # Then: compute_ccd gets the bands, not the raw cell.
+        self.assertEqual(config["tmask_bands"], ["Green", "SWIR1"])
+
+    def test_an_unknown_setting_is_rejected_and_the_docks_own_ignored(self):
+        typo = self.directory / "typo.yaml"
+        typo.write_text("lon: 1\nlat: 2\nnum_ob: 8\n")
+        saved_from_dock = self.directory / "dock.yaml"
+        saved_from_dock.write_text("lon: 1\nlat: 2\nauto_generate_plot: true\nprefetch_neighbours: false\n")
+
+        with self.assertRaisesRegex(ValueError, "num_ob"):
+            read_job(typo)
+        [(config, _)] = read_job(saved_from_dock)
+        self.assertNotIn("auto_generate_plot", config)
+
+    def test_a_point_without_coordinates_is_rejected(self):
+        job = self.directory / "job.yaml"
+        job.write_text("points:\n  - {id: x, lon: 1}\n")
+
+        with self.assertRaises(ValueError):
+            read_job(job)
+
+    def test_mask_profiles_are_read_from_the_yaml(self):
+        job = self.directory / "job.yaml"
+        job.write_text(
+            "lon: 1\nlat: 2\nmask_profiles:\n  no_haze: {haze: false}\n  strict: {qa_pixel_bits: [0, 1, 9]}\n"
+        )
+
+        [(config, _)] = read_job(job)
+
+        # Then: the run's own profile comes first, then each named one.
+        self.assertEqual(
+            mask_profiles(config),
+            {
+                "default": DEFAULT_MASK_PROFILE,
+                "no_haze": MaskProfile(haze=False),
+                "strict": MaskProfile(qa_pixel_bits=(0, 1, 9)),
+            },
+        )
+
+    def test_a_mask_profile_that_cannot_be_built_or_applied_is_rejected(self):
+        unknown_field = self.directory / "unknown.yaml"
+        unknown_field.write_text("lon: 1\nlat: 2\nmask_profiles:\n  typo: {hase: false}\n")
+        sentinel = self.directory / "sentinel.yaml"
+        sentinel.write_text("lon: 1\nlat: 2\ndataset: Sentinel-2\nmask_profiles:\n  no_haze: {haze: false}\n")
+        in_csv = self.directory / "job.csv"
+        in_csv.write_text("lon,lat,mask_profiles\n1,2,no_haze\n")
+
+        for job in (unknown_field, sentinel, in_csv):
+            with self.subTest(job=job.name), self.assertRaises(ValueError):
+                read_job(job)
+
+
+class RunJobTest(unittest.TestCase):
+    def test_every_point_is_streamed_to_the_output(self):
+        # Given: a job with a point that fits and one without images.
+        directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        config = {**DEFAULT_JOB, "end_date": "2021-01-01"}
+        groups = [(config, [("ok", (1.0, 2.0)), ("empty", (3.0, 4.0))])]
+
+        def fake_compute_ccd(coords, **_):
+            if coords == (3.0, 4.0):
+                raise CCDComputationError("No images at this point for the selected date and DOY range.")
+            return FIT, {}
+
+        # When: the job runs.
+        writer = ResultWriter(directory)
+        with (
+            patch.object(batch_module, "compute_ccd", side_effect=fake_compute_ccd),
+            patch.object(cli_module, "connect"),
+        ):
+            progress = run_job(groups, writer, workers=2)
+        writer.close()
+
+        # Then: both points are summarised, and the fitted one has a row per segment.
+        with open(directory / "points.csv") as stream:
+            points = {row["id"]: row for row in csv.DictReader(stream)}
+        with open(directory / "segments.csv") as stream:
+            segments = list(csv.DictReader(stream))
+        self.assertEqual(points["ok"]["ccd_dates"], "2015-06-01")
+        self.assertIn("No images", points["empty"]["ccd_status"])
+        self.assertEqual(
+            [(row["id"], row["segment"], row["break"]) for row in segments],
+            [("ok", "1", "2015-06-01"), ("ok", "2", "")],
+        )
+        self.assertEqual((progress.done, progress.failed), (2, 1))
+
+    def test_mask_profiles_are_compared_from_one_unmasked_fetch(self):
+        # Given: a point whose unmasked series has a clear scene and a hazy one (opacity 0.4).
+        directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        config = {**DEFAULT_JOB, "end_date": "2021-01-01", "mask_profiles": {"no_haze": {"haze": False}}}
+        raw = {
+            "id": np.array(["1_LT05_a", "1_LT05_b"], dtype=object),
+            "time": np.array([START, START + DAY_MS], dtype=float),
+            **{band: np.full(2, 0.2) for band in ("Blue", "Green", "Red", "NIR", "SWIR1", "SWIR2")},
+            "QA_PIXEL": np.full(2, 1 << 6, dtype=float),
+            "QA_RADSAT": np.zeros(2),
+            "AEROSOL": np.array([100.0, 400.0]),
+        }
+
+        # When: the job runs.
+        writer = ResultWriter(directory)
+        with (
+            patch.object(batch_module, "compute_ccd", return_value=(FIT, {})),
+            patch.object(cli_module, "connect"),
+            patch.object(cli_module, "fetch_landsat_raw", return_value=raw) as fetch,
+        ):
+            run_job([(config, [("p", (1.0, 2.0))])], writer, workers=1)
+        writer.close()
+
+        # Then: one fetch, and a row per profile with what it keeps.
+        with open(directory / "mask_profiles.csv") as stream:
+            rows = [(row["id"], row["profile"], row["observations"], row["kept"]) for row in csv.DictReader(stream)]
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(rows, [("p", "default", "2", "1"), ("p", "no_haze", "2", "2")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from core.ccd_process import (
+    _store_result,
+    clear_results_cache,
+    lookup_result,
+    make_cache_key,
+    set_persistent_cache,
+)
+from core.disk_cache import DiskCache
+
+KEY = make_cache_key(
+    (-74.1, 4.6), ("2010-01-01", "2020-01-01"), (1, 365), "Landsat C2", ["SWIR1"], 6, 0.99, 1.33, 0.002
+)
+FIT = {"tStart": [[1.0e12]], "SWIR1_coefs": [[[0.1] * 8]]}
+
+
+def series():
+    return {
+        "id": np.array(["LC08_1", "LC08_2"], dtype=object),
+        "time": np.array([1.0e12, 1.1e12]),
+        "NDVI": np.array([0.5, np.nan]),
+    }
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.cache = DiskCache(self.directory)
+
+    def test_a_stored_result_reads_back_the_same(self):
+        # Given: a result with a text column and a masked value.
+        self.cache.store(KEY, ("NDVI",), FIT, series())
+
+        # When: a new cache over the same directory reads it, as the next run would.
+        built, ccdc_info, timeseries = DiskCache(self.directory).load(KEY, ("NDVI",))
+
+        # Then: the fit, the ids and the NaN all survive.
+        self.assertEqual(built, ("NDVI",))
+        self.assertEqual(ccdc_info, FIT)
+        self.assertEqual(list(timeseries["id"]), ["LC08_1", "LC08_2"])
+        self.assertEqual(timeseries["id"].dtype, object)
+        np.testing.assert_array_equal(timeseries["NDVI"], [0.5, np.nan])
+
+    def test_an_entry_without_a_needed_index_is_a_miss(self):
+        self.cache.store(KEY, (), FIT, series())
+
+        self.assertIsNone(self.cache.load(KEY, ("NBR",)))
+        self.assertIsNone(self.cache.load(("other",), ()))
+
+    def test_a_narrower_result_never_replaces_a_wider_one(self):
+        # Given: a result built with NDVI on disk.
+        self.cache.store(KEY, ("NDVI",), FIT, series())
+
+        # When: a run that built no index stores the same key.
+        self.cache.store(KEY, (), {"tStart": [[]]}, series())
+
+        # Then: the wider entry stays.
+        self.assertEqual(self.cache.load(KEY, ())[1], FIT)
+
+    def test_an_unreadable_file_is_a_miss(self):
+        self.cache.path(KEY).write_bytes(b"truncated")
+
+        self.assertIsNone(self.cache.load(KEY, ()))
+
+
+class PersistentTierTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        clear_results_cache()
+        set_persistent_cache(DiskCache(self.directory))
+        self.addCleanup(set_persistent_cache, None)
+        self.addCleanup(clear_results_cache)
+
+    def test_a_result_outlives_the_memory_cache(self):
+        # Given: a result stored while the disk tier is set.
+        _store_result(KEY, ("NDVI",), (FIT, series()))
+
+        # When: the memory cache is emptied, as a new process starts with it empty.
+        clear_results_cache()
+
+        # Then: the lookup is served from disk, and memory holds it again.
+        ccdc_info, _ = lookup_result(KEY, ("NDVI",))
+        self.assertEqual(ccdc_info, FIT)
+        set_persistent_cache(None)
+        self.assertIsNotNone(lookup_result(KEY, ("NDVI",)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from core.export import ColumnarExport, TableStream, observation_columns, segment_columns
+from core.plot_data import CCDC_COEFFICIENT_COUNT
+
+DAY_MS = 24 * 60 * 60 * 1000
+# 2010-01-01, 2015-06-01 and 2021-01-01 in epoch milliseconds
+START, BREAK, END = 14610 * DAY_MS, 16587 * DAY_MS, 18628 * DAY_MS
+
+TIMESERIES = {
+    "id": np.array(["LC08_1", "LC08_2"], dtype=object),
+    "longitude": np.array([-74.1, -74.1]),
+    "latitude": np.array([4.6, 4.6]),
+    "time": np.array([START, END], dtype=float),
+    "SWIR1": np.array([0.2, np.nan]),
+}
+CCDC_INFO = {
+    "tStart": [[START, BREAK]],
+    "tEnd": [[BREAK, END]],
+    "tBreak": [[BREAK, 0]],
+    "changeProb": [[1, 0]],
+    "numObs": [[40, 30]],
+    "SWIR1_coefs": [[[0.2] * CCDC_COEFFICIENT_COUNT, [0.3] * CCDC_COEFFICIENT_COUNT]],
+    "SWIR1_rmse": [[0.01, 0.02]],
+    "SWIR1_magnitude": [[0.1, 0]],
+}
+
+
+class RecordingSink:
+    def __init__(self):
+        self.groups = []
+        self.closed = False
+
+    def write(self, columns):
+        self.groups.append(columns)
+
+    def close(self):
+        self.closed = True
+
+
+class TablesTest(unittest.TestCase):
+    def test_observations_keep_every_column_of_the_series(self):
+        columns = observation_columns(7, TIMESERIES)
+
+        self.assertEqual(columns["point_id"].tolist(), ["7", "7"])
+        self.assertEqual(columns["scene_id"].tolist(), ["LC08_1", "LC08_2"])
+        self.assertTrue(np.isnan(columns["SWIR1"][1]))
+
+    def test_segments_have_a_row_each_with_the_coefficients_of_every_band(self):
+        columns = segment_columns("a", CCDC_INFO)
+
+        self.assertEqual(columns["segment"].tolist(), [1, 2])
+        self.assertEqual(columns["tBreak"].tolist(), [BREAK, 0])
+        self.assertEqual(columns["SWIR1_coef_0"].tolist(), [0.2, 0.3])
+        self.assertEqual(columns["SWIR1_coef_7"].tolist(), [0.2, 0.3])
+
+    def test_missing_and_malformed_values_are_nan(self):
+        # Given: a result without numObs and with a ragged coefficient row.
+        info = {**CCDC_INFO, "SWIR1_coefs": [[[0.2] * CCDC_COEFFICIENT_COUNT, [0.3]]]}
+        del info["numObs"]
+
+        columns = segment_columns("a", info)
+
+        # Then: numObs is NaN, and so is the ragged segment's model, as the plot skips it.
+        self.assertTrue(np.isnan(columns["numObs"]).all())
+        self.assertEqual(columns["SWIR1_coef_0"][0], 0.2)
+        self.assertTrue(np.isnan(columns["SWIR1_coef_0"][1]))
+
+
+class TableStreamTest(unittest.TestCase):
+    def test_tables_are_written_a_row_group_at_a_time(self):
+        # Given: a stream writing groups of three rows.
+        sink = RecordingSink()
+        stream = TableStream(sink, row_group_rows=3)
+
+        # When: four points of two observations each are appended.
+        for point_id in range(4):
+            stream.append(observation_columns(point_id, TIMESERIES))
+
+        # Then: each group was written once it was full, and closing writes the rest.
+        self.assertEqual([len(group["time"]) for group in sink.groups], [4, 4])
+        stream.append(observation_columns(4, TIMESERIES))
+        stream.close()
+        self.assertEqual([len(group["time"]) for group in sink.groups], [4, 4, 2])
+        self.assertTrue(sink.closed)
+
+    def test_every_group_has_the_first_tables_columns(self):
+        sink = RecordingSink()
+        stream = TableStream(sink, row_group_rows=10)
+
+        # Given: a second point whose series has NDVI instead of SWIR1.
+        other = {name: values for name, values in TIMESERIES.items() if name != "SWIR1"}
+        other["NDVI"] = np.array([0.5, 0.6])
+
+        stream.append(observation_columns(1, TIMESERIES))
+        stream.append(observation_columns(2, other))
+        stream.close()
+
+        # Then: the group has the first point's columns, SWIR1 empty for the second point.
+        group = sink.groups[0]
+        self.assertNotIn("NDVI", group)
+        self.assertEqual(len(group["SWIR1"]), 4)
+        self.assertTrue(np.isnan(group["SWIR1"][2:]).all())
+
+
+class ColumnarExportTest(unittest.TestCase):
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_a_parquet_export_reads_back(self):
+        import pyarrow.parquet as pq
+
+        directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        export = ColumnarExport(directory, "parquet", row_group_rows=2)
+        for point_id in range(3):
+            export.write(point_id, CCDC_INFO, TIMESERIES)
+        export.close()
+
+        self.assertEqual(pq.read_table(directory / "observations.parquet").num_rows, 6)
+        self.assertEqual(pq.ParquetFile(directory / "segments.parquet").num_row_groups, 3)
+
+    @unittest.skipUnless(importlib.util.find_spec("osgeo"), "GDAL is not installed")
+    def test_a_geopackage_export_reads_back(self):
+        from osgeo import ogr
+
+        # Given: three points exported two rows per transaction.
+        directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        export = ColumnarExport(directory, "gpkg", row_group_rows=2)
+        for point_id in range(3):
+            export.write(point_id, CCDC_INFO, TIMESERIES)
+        export.close()
+
+        dataset = ogr.Open(str(directory / "ccd_results.gpkg"))
+        observations = list(dataset.GetLayerByName("observations"))
+        segments = dataset.GetLayerByName("segments")
+
+        # Then: every observation is a point at its pixel, and the missing SWIR1 value is NULL.
+        self.assertEqual(len(observations), 6)
+        geometry = observations[0].GetGeometryRef()
+        self.assertEqual((geometry.GetX(), geometry.GetY()), (-74.1, 4.6))
+        self.assertEqual(observations[0]["SWIR1"], 0.2)
+        self.assertTrue(observations[1].IsFieldNull("SWIR1"))
+        # And: the segment numbers are 64-bit integers, written as such.
+        definition = segments.GetLayerDefn()
+        self.assertEqual(definition.GetFieldDefn(definition.GetFieldIndex("segment")).GetType(), ogr.OFTInteger64)
+        self.assertEqual([feature["segment"] for feature in segments], [1, 2] * 3)
+
+    def test_an_unknown_format_is_refused(self):
+        with self.assertRaises(ValueError):
+            ColumnarExport(self.enterContext(tempfile.TemporaryDirectory()), "xlsx")
+
+
+if __name__ == "__main__":
+    unittest.main()
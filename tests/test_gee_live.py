@@ -2,6 +2,7 @@ import importlib
 import math
 import os
 import sys
+import time
 import types
 import unittest
 from dataclasses import dataclass
@@ -35,6 +36,8 @@ class CcdcConfig:
 
 LANDSAT_CONFIG: Final = CollectionConfig(("2018-01-01", "2023-01-01"), (150, 250))
 SENTINEL_CONFIG: Final = CollectionConfig(("2022-01-01", "2023-01-01"), (1, 365))
+# long enough that linking the quality images, not sampling, dominates the request
+SENTINEL_LONG_CONFIG: Final = CollectionConfig(("2019-01-01", "2024-01-01"), (1, 365))
 CCDC_CONFIG: Final = CcdcConfig()
 
 
@@ -87,6 +90,22 @@ class LiveGoogleEarthEngineTest(unittest.TestCase):
             self.assertGreaterEqual(day_of_year, LANDSAT_CONFIG.doy_range[0])
             self.assertLessEqual(day_of_year, LANDSAT_CONFIG.doy_range[1])
 
+    def test_landsat_series_has_one_observation_per_sensor_and_day(self) -> None:
+        # Given: the merged Landsat collection, whose ids carry the sensor collection as a prefix.
+        collection = self.get_gee_data_landsat(POINT, LANDSAT_CONFIG.date_range, LANDSAT_CONFIG.doy_range)
+
+        # When: it is evaluated at the point.
+        region = self._get_region(collection, ("SWIR1",), scale=30)
+
+        # Then: overlapping rows of one acquisition were collapsed into a single observation.
+        header = region[0]
+        id_index, time_index = header.index("id"), header.index("time")
+        days = [
+            (row[id_index].split("_")[0], datetime.fromtimestamp(row[time_index] / 1000, tz=UTC).date())
+            for row in region[1:]
+        ]
+        self.assertEqual(len(days), len(set(days)))
+
     def test_every_sentinel_cloud_filter_returns_clear_optical_observations(self) -> None:
         # Given: a full-year Sentinel-2 query for each selectable cloud filter.
         from CCD_Plugin.core.gee_data_sentinel import CLOUD_FILTERS
@@ -126,6 +145,82 @@ class LiveGoogleEarthEngineTest(unittest.TestCase):
                 self.assertGreater(count, 0, f"{name} removed every observation")
                 self.assertLessEqual(count, unmasked)
 
+    def test_linking_quality_bands_matches_the_outer_join_it_replaced(self) -> None:
+        # Given: five years of Sentinel-2 scenes, and the outer saveFirst join the quality images
+        # used to be attached with, unwrapped into the same band a link adds.
+        from CCD_Plugin.core.gee_common import filter_collection
+        from CCD_Plugin.core.gee_data_sentinel import (
+            CLOUD_SCORE_PLUS,
+            CS_PLUS_BAND,
+            S2_CLOUD_PROBABILITY,
+            S2_CLOUD_PROBABILITY_BAND,
+            S2_SR,
+            _link_quality_band,
+        )
+
+        ee = self.ee
+        point = ee.Geometry.Point(POINT)
+        dates, doy = SENTINEL_LONG_CONFIG.date_range, SENTINEL_LONG_CONFIG.doy_range
+        scenes = filter_collection(S2_SR, point, dates, doy).select("B4")
+
+        def joined(quality_name, band):
+            quality = filter_collection(quality_name, point, dates, doy).select(band)
+            linked = ee.Join.saveFirst(matchKey="quality", outer=True).apply(
+                primary=scenes,
+                secondary=quality,
+                condition=ee.Filter.equals(leftField="system:index", rightField="system:index"),
+            )
+
+            def unwrap(image):
+                image = ee.Image(image)
+                missing = ee.Image.constant(0).selfMask().rename(band)
+                return image.addBands(ee.Image(ee.Algorithms.If(image.get("quality"), image.get("quality"), missing)))
+
+            return ee.ImageCollection(linked).map(unwrap).select(["B4", band])
+
+        for quality_name, band in ((CLOUD_SCORE_PLUS, CS_PLUS_BAND), (S2_CLOUD_PROBABILITY, S2_CLOUD_PROBABILITY_BAND)):
+            with self.subTest(quality=quality_name):
+                # When: both are sampled at the point.
+                timings = {}
+                regions = {}
+                for name, collection in (
+                    ("join", joined(quality_name, band)),
+                    ("link", _link_quality_band(scenes, quality_name, point, dates, doy, band).select(["B4", band])),
+                ):
+                    start = time.perf_counter()
+                    regions[name] = self._get_region(collection, ("B4", band), scale=10)
+                    timings[name] = time.perf_counter() - start
+                print(f"\n{band}: join {timings['join']:.2f}s, link {timings['link']:.2f}s", file=sys.stderr)
+
+                # Then: every scene is kept, with the same quality value, whichever way it was attached.
+                self.assertEqual(sorted(map(tuple, regions["link"][1:])), sorted(map(tuple, regions["join"][1:])))
+
+    def test_point_local_masks_match_the_unclipped_ones(self) -> None:
+        # Given: five years of Sentinel-2 scenes under each filter that reads a neighbourhood.
+        for cloud_filter in ("s2cloudless", "Sen2Cor"):
+            with self.subTest(cloud_filter=cloud_filter):
+                # When: the series is sampled with the quality inputs clipped around the point, and without.
+                timings = {}
+                regions = {}
+                for point_local in (False, True):
+                    collection = self.get_gee_data_sentinel(
+                        POINT,
+                        SENTINEL_LONG_CONFIG.date_range,
+                        SENTINEL_LONG_CONFIG.doy_range,
+                        "Sentinel-2",
+                        cloud_filter,
+                        point_local=point_local,
+                    )
+                    start = time.perf_counter()
+                    regions[point_local] = self._get_region(collection, OPTICAL_BANDS, scale=10)
+                    timings[point_local] = time.perf_counter() - start
+                print(
+                    f"\n{cloud_filter}: full {timings[False]:.2f}s, point-local {timings[True]:.2f}s", file=sys.stderr
+                )
+
+                # Then: the clip changed nothing at the point.
+                self.assertEqual(regions[True], regions[False])
+
     def test_day_of_year_window_wrapping_the_new_year_returns_data(self) -> None:
         # Given: a DOY window that crosses the new year, which a single dayOfYear filter cannot express.
         collection = self.get_gee_data_landsat(POINT, ("2018-01-01", "2023-01-01"), (330, 45))
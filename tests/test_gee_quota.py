@@ -0,0 +1,126 @@
+import threading
+import time
+import unittest
+
+from core.gee_quota import MAX_CONCURRENT_REQUESTS, Priority, RequestQuota
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def give_up_after_one_look():
+    """A cancelled() that lets acquire check once, then cancels the wait."""
+    looks = iter([False])
+    return lambda: next(looks, True)
+
+
+class RequestQuotaTest(unittest.TestCase):
+    def wait_until_queued(self, quota, waiting):
+        deadline = time.monotonic() + 2
+        while len(quota._waiting) < waiting:
+            self.assertLess(time.monotonic(), deadline, "the waiters never queued up")
+            time.sleep(0.005)
+
+    def test_a_burst_is_capped_at_one_second_of_requests(self):
+        # Given: a quota of five requests per second on a clock that does not move.
+        clock = FakeClock()
+        quota = RequestQuota(requests_per_second=5, max_concurrent=100, clock=clock)
+
+        # When: a burst of six arrives, each one giving up if it has to wait.
+        sent = sum(quota.acquire(cancelled=give_up_after_one_look(), poll_seconds=0) for _ in range(6))
+
+        # Then: the bucket's worth went out at once, and the next one has to wait for a refill.
+        self.assertEqual(sent, 5)
+        clock.now += 0.2
+        self.assertTrue(quota.acquire(cancelled=give_up_after_one_look()))
+
+    def test_waiters_are_paced_at_the_configured_rate(self):
+        # Given: an emptied bucket refilling at 20 requests per second.
+        quota = RequestQuota(requests_per_second=20, max_concurrent=100)
+        quota.throttle(0)
+
+        # When: four more requests are sent.
+        start = time.monotonic()
+        for _ in range(4):
+            self.assertTrue(quota.acquire())
+
+        # Then: they were spread over the refill time rather than sent together.
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_no_more_than_max_concurrent_are_in_flight(self):
+        # Given: room for one request at a time, and one in flight.
+        quota = RequestQuota(requests_per_second=100, max_concurrent=1)
+        self.assertTrue(quota.acquire())
+
+        # Then: a second cannot start until the first is released.
+        self.assertFalse(quota.acquire(cancelled=give_up_after_one_look(), poll_seconds=0))
+        quota.release()
+        self.assertTrue(quota.acquire())
+
+    def test_the_interactive_plot_jumps_ahead_of_queued_work(self):
+        # Given: one request in flight, and batch then background work queued behind it.
+        quota = RequestQuota(requests_per_second=100, max_concurrent=1)
+        self.assertTrue(quota.acquire())
+        served = []
+
+        def request(priority):
+            with quota.slot(priority):
+                served.append(priority)
+
+        threads = []
+        for waiting, priority in enumerate((Priority.BATCH, Priority.BACKGROUND, Priority.INTERACTIVE), start=1):
+            thread = threading.Thread(target=request, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            self.wait_until_queued(quota, waiting)
+
+        # When: the slot frees up.
+        quota.release()
+        for thread in threads:
+            thread.join(timeout=2)
+
+        # Then: the plot the user clicked last went first, and the batch work last.
+        self.assertEqual(served, [Priority.INTERACTIVE, Priority.BACKGROUND, Priority.BATCH])
+
+    def test_a_cancelled_waiter_leaves_the_queue(self):
+        # Given: a request stuck behind a full quota.
+        quota = RequestQuota(requests_per_second=100, max_concurrent=1)
+        self.assertTrue(quota.acquire())
+
+        # When: it is cancelled while waiting.
+        with quota.slot(Priority.INTERACTIVE, cancelled=lambda: True) as acquired:
+            pass
+
+        # Then: it holds nothing and blocks no one behind it.
+        self.assertFalse(acquired)
+        self.assertEqual(quota._waiting, [])
+
+    def test_a_throttle_holds_every_new_request(self):
+        # Given: a full bucket.
+        clock = FakeClock()
+        quota = RequestQuota(requests_per_second=10, max_concurrent=10, clock=clock)
+
+        # When: Earth Engine reports the quota exhausted.
+        quota.throttle(1.0)
+
+        # Then: nothing is sent until the pause is over.
+        self.assertFalse(quota.acquire(cancelled=give_up_after_one_look(), poll_seconds=0))
+        clock.now = 1.0
+        self.assertTrue(quota.acquire(cancelled=give_up_after_one_look(), poll_seconds=0))
+
+    def test_limits_are_clamped(self):
+        quota = RequestQuota()
+
+        quota.configure(requests_per_second=0, max_concurrent=10_000)
+
+        self.assertGreater(quota.requests_per_second, 0)
+        self.assertEqual(quota.max_concurrent, MAX_CONCURRENT_REQUESTS)
+
+
+if __name__ == "__main__":
+    unittest.main()
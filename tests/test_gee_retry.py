@@ -0,0 +1,270 @@
+import sys
+import time
+import types
+import unittest
+from unittest.mock import patch
+
+from core import gee_session
+from core.diagnostics import RunDiagnostics
+from core.gee_quota import Priority, RequestQuota, RunPriority
+from core.gee_retry import (
+    CircuitBreaker,
+    DeadlineExceeded,
+    EarthEngineUnavailable,
+    RetryPolicy,
+    call_with_retry,
+    is_transient,
+)
+from core.gee_session import get_info, run_diagnostics
+
+
+class FakeEEException(Exception):
+    pass
+
+
+class FakeHttpError(Exception):
+    """googleapiclient's HttpError as far as the retry policy looks at it."""
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.resp = types.SimpleNamespace(status=status)
+
+
+def translated(status):
+    """The EEException ee raises for an HttpError: only the message survives, the cause is chained."""
+    try:
+        raise FakeHttpError(status)
+    except FakeHttpError:
+        try:
+            raise FakeEEException("Earth Engine said no")
+        except FakeEEException as error:
+            return error
+
+
+class FlakyComputation:
+    """A ComputedObject whose getInfo fails with each scripted fault in turn, then answers."""
+
+    def __init__(self, *faults, value="result"):
+        self.faults = list(faults)
+        self.value = value
+        self.calls = 0
+
+    def getInfo(self):
+        self.calls += 1
+        if self.faults:
+            raise self.faults.pop(0)
+        return self.value
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+FAST = RetryPolicy(attempts=4, base_delay=0.001, max_delay=0.002)
+
+
+class RetryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.enterContext(patch.dict(sys.modules, {"ee": types.SimpleNamespace(EEException=FakeEEException)}))
+
+
+class TransientErrorTest(RetryTestCase):
+    def test_server_trouble_and_throttling_are_transient(self):
+        for status in (429, 500, 503):
+            with self.subTest(status=status):
+                self.assertTrue(is_transient(translated(status)))
+
+    def test_a_bad_request_is_not(self):
+        # Then: retrying an invalid expression would fail the same way every time.
+        self.assertFalse(is_transient(translated(400)))
+        self.assertFalse(is_transient(FakeEEException("Image.select: Pattern 'NDVI' did not match any bands.")))
+
+    def test_dropped_connections_and_busy_messages_are_transient(self):
+        self.assertTrue(is_transient(ConnectionError("reset by peer")))
+        self.assertTrue(is_transient(TimeoutError("read timed out")))
+        self.assertTrue(is_transient(FakeEEException("Too many concurrent aggregations.")))
+
+    def test_an_exhausted_deadline_is_final(self):
+        self.assertFalse(is_transient(DeadlineExceeded("out of time")))
+
+
+class CallWithRetryTest(RetryTestCase):
+    def test_transient_faults_are_retried_and_counted(self):
+        # Given: a request that fails twice the way a struggling Earth Engine does.
+        computation = FlakyComputation(translated(503), ConnectionError("reset"))
+        diagnostics = RunDiagnostics()
+
+        # When: it is called under the retry policy.
+        value = call_with_retry(computation.getInfo, policy=FAST, diagnostics=diagnostics)
+
+        # Then: the run still gets its value, and the retries show up in its diagnostics.
+        self.assertEqual(value, "result")
+        self.assertEqual(computation.calls, 3)
+        self.assertEqual(diagnostics.counters["retries"], 2)
+        self.assertIn("retry_wait", diagnostics.timings)
+
+    def test_a_permanent_fault_fails_at_once(self):
+        computation = FlakyComputation(translated(400))
+
+        with self.assertRaises(FakeEEException):
+            call_with_retry(computation.getInfo, policy=FAST)
+
+        self.assertEqual(computation.calls, 1)
+
+    def test_the_last_error_surfaces_once_attempts_run_out(self):
+        faults = [translated(503) for _ in range(FAST.attempts)]
+        computation = FlakyComputation(*faults)
+
+        with self.assertRaises(FakeEEException) as raised:
+            call_with_retry(computation.getInfo, policy=FAST)
+
+        self.assertIs(raised.exception, faults[-1])
+        self.assertEqual(computation.calls, FAST.attempts)
+
+    def test_no_retry_is_made_past_the_deadline(self):
+        # Given: a call whose deadline falls before the first pause would end.
+        computation = FlakyComputation(translated(503))
+        policy = RetryPolicy(attempts=4, base_delay=10, max_delay=10)
+
+        # Then: it fails now instead of sleeping through its deadline.
+        with self.assertRaises(FakeEEException):
+            call_with_retry(computation.getInfo, policy=policy, deadline=time.monotonic() + 0.01)
+        self.assertEqual(computation.calls, 1)
+
+    def test_cancelling_during_the_backoff_stops_the_retries(self):
+        # Given: a long backoff after the first failure.
+        computation = FlakyComputation(translated(503))
+        policy = RetryPolicy(attempts=4, base_delay=30, max_delay=30)
+        start = time.monotonic()
+
+        # When: the run is cancelled while it waits.
+        value = call_with_retry(computation.getInfo, cancelled=lambda: time.monotonic() - start > 0.05, policy=policy)
+
+        # Then: it returns promptly without sending the retry.
+        self.assertIsNone(value)
+        self.assertEqual(computation.calls, 1)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_backoff_is_jittered_and_bounded(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=8)
+
+        self.assertEqual([policy.delay(retry, rand=lambda: 1.0) for retry in range(6)], [0.5, 1, 2, 4, 8, 8])
+        self.assertEqual(policy.delay(3, rand=lambda: 0.25), 1.0)
+
+
+class CircuitBreakerTest(RetryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(threshold=3, cooldown=30, clock=self.clock)
+
+    def fail(self, times):
+        for _ in range(times):
+            with self.assertRaises(FakeEEException):
+                call_with_retry(
+                    FlakyComputation(translated(503)).getInfo, policy=RetryPolicy(attempts=1), breaker=self.breaker
+                )
+
+    def test_consistent_failures_make_later_calls_fail_fast(self):
+        # Given: Earth Engine failing every request.
+        self.fail(3)
+        computation = FlakyComputation()
+        diagnostics = RunDiagnostics()
+
+        # When: the next run asks for something.
+        with self.assertRaises(EarthEngineUnavailable) as raised:
+            call_with_retry(computation.getInfo, policy=FAST, breaker=self.breaker, diagnostics=diagnostics)
+
+        # Then: nothing was sent, and the user is told why.
+        self.assertEqual(computation.calls, 0)
+        self.assertIn("looks unavailable", str(raised.exception))
+        self.assertEqual(diagnostics.counters["circuit_open"], 1)
+
+    def test_user_errors_do_not_open_it(self):
+        for _ in range(5):
+            with self.assertRaises(FakeEEException):
+                call_with_retry(FlakyComputation(translated(400)).getInfo, policy=FAST, breaker=self.breaker)
+
+        self.assertFalse(self.breaker.is_open)
+
+    def test_it_lets_calls_through_again_after_the_cooldown(self):
+        # Given: an open breaker whose cooldown has passed.
+        self.fail(3)
+        self.clock.now += 31
+
+        # When: a call succeeds.
+        value = call_with_retry(FlakyComputation().getInfo, policy=FAST, breaker=self.breaker)
+
+        # Then: it closes, and a single failure no longer opens it.
+        self.assertEqual(value, "result")
+        self.fail(1)
+        self.assertFalse(self.breaker.is_open)
+
+    def test_a_failed_trial_reopens_it(self):
+        self.fail(3)
+        self.clock.now += 31
+
+        self.fail(1)
+
+        self.assertTrue(self.breaker.is_open)
+
+
+class GetInfoRetryTest(RetryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.quota = RequestQuota(requests_per_second=100)
+        self.enterContext(patch.object(gee_session, "request_quota", self.quota))
+        self.enterContext(patch.object(gee_session, "circuit_breaker", CircuitBreaker()))
+
+    def test_each_attempt_queues_for_the_quota_again(self):
+        # Given: a request that fails once before answering.
+        computation = FlakyComputation(translated(429))
+        diagnostics = RunDiagnostics()
+
+        # When: the run fetches it.
+        with run_diagnostics(diagnostics):
+            value = get_info(computation, policy=FAST)
+
+        # Then: it got its value on the second attempt, and left no slot behind.
+        self.assertEqual(value, "result")
+        self.assertEqual(diagnostics.counters["retries"], 1)
+        self.assertEqual(self.quota._in_flight, 0)
+
+    def test_a_demoted_run_retries_in_the_lower_lane(self):
+        # Given: a run that fails once, and is demoted before it retries.
+        priority = RunPriority()
+        lanes = []
+        acquire = self.quota.acquire
+
+        def recording_acquire(lane, cancelled):
+            lanes.append(lane)
+            priority.demote()
+            return acquire(lane, cancelled)
+
+        self.quota.acquire = recording_acquire
+
+        # When: it is fetched.
+        get_info(FlakyComputation(translated(503)), priority, policy=FAST)
+
+        # Then: the retry queued behind interactive work.
+        self.assertEqual(lanes, [Priority.INTERACTIVE, Priority.BACKGROUND])
+
+    def test_the_call_deadline_reaches_the_transport(self):
+        # Given: a computation that reports the deadline the transport would see.
+        seen = []
+        computation = types.SimpleNamespace(getInfo=lambda: seen.append(gee_session._call_deadline.get()))
+
+        # When: it is fetched under a 60 s deadline.
+        get_info(computation, policy=RetryPolicy(call_deadline=60))
+
+        # Then: the transport was handed an instant about a minute away, and it was cleared after.
+        self.assertAlmostEqual(seen[0] - time.monotonic(), 60, delta=1)
+        self.assertIsNone(gee_session._call_deadline.get())
+
+
+if __name__ == "__main__":
+    unittest.main()
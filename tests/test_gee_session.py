@@ -0,0 +1,484 @@
+import concurrent.futures
+import importlib.util
+import threading
+import time
+import types
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from core import gee_session
+from core.diagnostics import RunDiagnostics
+from core.gee_cancel import RequestCancelled
+from core.gee_quota import Priority, RequestQuota
+from core.gee_session import (
+    HIGH_VOLUME_URL,
+    ConcurrencyLimit,
+    PooledTransport,
+    endpoint_stats,
+    endpoint_url,
+    get_info,
+    run_diagnostics,
+    shared_executor,
+    shutdown_executor,
+    submit,
+)
+from core.lifecycle import TaskLifecycle
+
+HTTP_CLIENT_AVAILABLE = all(importlib.util.find_spec(name) for name in ("requests", "httplib2"))
+
+
+class CountingServer(ThreadingHTTPServer):
+    """A local Earth Engine stand-in that counts the TCP connections it accepts."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), CountingHandler)
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        # what a slow request waits for before it is answered
+        self.release = threading.Event()
+
+    def handle_error(self, request, client_address):
+        # a client that aborted its request on purpose is not a failure of the stand-in
+        pass
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/projects/p/value:compute"
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the server keeps a connection open for the next request, as Google's front end does
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.requests += 1
+        if self.path.endswith("/slow"):
+            # a long CCDC fit: nothing comes back for a while
+            self.server.release.wait(10)
+        body = b'{"result": 1}'
+        self.send_response({"fail": 500, "busy": 429}.get(self.path.rsplit("/", 1)[-1], 200))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_args):
+        pass
+
+
+@unittest.skipUnless(HTTP_CLIENT_AVAILABLE, "requests and httplib2 come with earthengine-api")
+class PooledTransportTest(unittest.TestCase):
+    REQUESTS = 24
+    CONCURRENCY = 6
+
+    def setUp(self):
+        self.server = CountingServer()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def run_requests(self, send):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.CONCURRENCY) as executor:
+            responses = list(executor.map(lambda _: send(), range(self.REQUESTS)))
+        self.assertEqual(self.server.requests, self.REQUESTS)
+        return responses
+
+    def test_connections_are_reused_across_requests(self):
+        # Given: the shared transport and a run's worth of concurrent requests.
+        transport = PooledTransport(pool_size=self.CONCURRENCY)
+        self.addCleanup(transport.close)
+
+        # When: they are all sent through it.
+        responses = self.run_requests(lambda: transport.request(self.server.url, "POST", body="{}"))
+
+        # Then: at most one handshake per concurrent request, not one per request.
+        self.assertLessEqual(self.server.connections, self.CONCURRENCY)
+        self.assertTrue(all(response.status == 200 for response, _content in responses))
+
+    def test_a_fresh_session_per_request_pays_a_handshake_every_time(self):
+        # Given: the behaviour the shared transport replaces - nothing kept between requests.
+        import requests
+
+        # When: the same requests are sent, each on its own session.
+        self.run_requests(lambda: requests.Session().post(self.server.url, data="{}"))
+
+        # Then: every request opened its own connection.
+        self.assertEqual(self.server.connections, self.REQUESTS)
+
+    def test_responses_keep_httplib2_semantics(self):
+        # Given: the transport googleapiclient is handed.
+        transport = PooledTransport()
+        self.addCleanup(transport.close)
+
+        # When: a request completes.
+        response, content = transport.request(self.server.url, "POST", body="{}", headers={"x-test": "1"})
+
+        # Then: the status and body come back the way httplib2 reports them.
+        self.assertEqual(response.status, 200)
+        self.assertEqual(content, b'{"result": 1}')
+
+    def test_a_refused_connection_is_reported_as_transient(self):
+        # Given: nothing listening any more.
+        transport = PooledTransport()
+        self.addCleanup(transport.close)
+        url = self.server.url
+        self.server.shutdown()
+        self.server.server_close()
+
+        # Then: googleapiclient sees the ConnectionError it retries, not a requests exception.
+        with self.assertRaises(ConnectionError):
+            transport.request(url, "POST", body="{}")
+
+
+@unittest.skipUnless(HTTP_CLIENT_AVAILABLE, "requests and httplib2 come with earthengine-api")
+class EndpointStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.server = CountingServer()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.transport = PooledTransport()
+        self.addCleanup(self.transport.close)
+        endpoint_stats.clear()
+        self.addCleanup(endpoint_stats.clear)
+        self.addCleanup(shutdown_executor)
+        self.host = f"127.0.0.1:{self.server.server_address[1]}"
+
+    def test_requests_and_errors_are_counted_per_host(self):
+        # When: one request succeeds and one is answered with a server error.
+        self.transport.request(self.server.url, "POST", body="{}")
+        self.transport.request(self.server.url + "/fail", "POST", body="{}")
+
+        # Then: both count against the host, and only the second as an error.
+        stats = endpoint_stats.snapshot()[self.host]
+        self.assertEqual((stats["requests"], stats["errors"]), (2, 1))
+        self.assertGreater(stats["seconds"], 0)
+
+    def test_requests_on_the_pool_are_attributed_to_the_run_that_submitted_them(self):
+        # Given: a run that overlaps two requests on the shared pool, as compute_ccd does.
+        diagnostics = RunDiagnostics()
+        send = lambda: self.transport.request(self.server.url, "POST", body="{}")  # noqa: E731
+
+        # When: they are submitted inside the run, and another request is sent outside it.
+        with run_diagnostics(diagnostics):
+            futures = [submit(send), submit(send)]
+        for future in futures:
+            future.result(timeout=5)
+        send()
+
+        # Then: the run saw its own two requests, and the process-wide stats all three.
+        self.assertEqual(diagnostics.counters, {f"{self.host} requests": 2})
+        self.assertIn(f"{self.host} latency", diagnostics.timings)
+        self.assertEqual(endpoint_stats.snapshot()[self.host]["requests"], 3)
+
+    def test_a_quota_error_pauses_every_new_request(self):
+        # Given: a fresh request quota with tokens to spare.
+        quota = RequestQuota()
+        self.enterContext(patch.object(gee_session, "request_quota", quota))
+
+        # When: Earth Engine answers that the quota is spent.
+        self.transport.request(self.server.url + "/busy", "POST", body="{}")
+
+        # Then: the next request has to wait for the pause, whatever its priority.
+        looks = iter([False])
+        self.assertFalse(quota.acquire(Priority.INTERACTIVE, cancelled=lambda: next(looks, True), poll_seconds=0))
+
+
+class GetInfoTest(unittest.TestCase):
+    def setUp(self):
+        self.enterContext(patch.object(gee_session, "request_quota", RequestQuota(max_concurrent=1)))
+
+    def test_the_value_comes_back_and_the_wait_is_recorded(self):
+        # Given: a run being measured.
+        diagnostics = RunDiagnostics()
+
+        # When: a value is fetched through the quota.
+        with run_diagnostics(diagnostics):
+            value = get_info(types.SimpleNamespace(getInfo=lambda: 42))
+
+        # Then: it is the getInfo result, and the time spent queuing is on the run.
+        self.assertEqual(value, 42)
+        self.assertIn("quota_wait", diagnostics.timings)
+
+    def test_a_run_cancelled_while_queued_sends_nothing(self):
+        # Given: the only request slot taken.
+        gee_session.request_quota.acquire()
+        sent = []
+
+        # When: a cancelled run's request is queued behind it.
+        value = get_info(types.SimpleNamespace(getInfo=lambda: sent.append(1)), cancelled=lambda: True)
+
+        # Then: no request went out.
+        self.assertIsNone(value)
+        self.assertEqual(sent, [])
+
+
+class FakeTask:
+    def __init__(self):
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+    def isCanceled(self):
+        return self.canceled
+
+
+@unittest.skipUnless(HTTP_CLIENT_AVAILABLE, "requests and httplib2 come with earthengine-api")
+class InFlightCancellationTest(unittest.TestCase):
+    def setUp(self):
+        self.server = CountingServer()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(self.server.release.set)
+        self.transport = PooledTransport()
+        self.addCleanup(self.transport.close)
+        self.quota = RequestQuota()
+        self.enterContext(patch.object(gee_session, "request_quota", self.quota))
+        self.slow = types.SimpleNamespace(
+            getInfo=lambda: self.transport.request(self.server.url + "/slow", "POST", body="{}")
+        )
+
+    def test_cancelling_aborts_the_request_on_the_wire(self):
+        # Given: a request Earth Engine takes ten seconds to answer.
+        start = time.monotonic()
+
+        # When: its run is cancelled a moment after it was sent.
+        value = get_info(self.slow, cancelled=lambda: time.monotonic() - start > 0.2)
+
+        # Then: the call returns right away instead of waiting for the answer, and holds no quota.
+        self.assertIsNone(value)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(self.quota._in_flight, 0)
+
+    def test_the_transport_keeps_working_after_an_abort(self):
+        # Given: a request that was aborted mid-flight.
+        start = time.monotonic()
+        get_info(self.slow, cancelled=lambda: time.monotonic() - start > 0.1)
+
+        # When: the next run uses the same transport.
+        response, content = self.transport.request(self.server.url, "POST", body="{}")
+
+        # Then: it is answered normally; the aborted connection was not handed out again.
+        self.assertEqual((response.status, content), (200, b'{"result": 1}'))
+
+    def test_an_aborted_request_is_not_a_network_error(self):
+        # Given: the transport used directly, under a run cancelled mid-flight.
+        start = time.monotonic()
+        token = gee_session._call_cancelled.set(lambda: time.monotonic() - start > 0.1)
+        self.addCleanup(gee_session._call_cancelled.reset, token)
+
+        # Then: googleapiclient sees an error it does not retry, rather than a dropped connection.
+        with self.assertRaises(RequestCancelled):
+            self.transport.request(self.server.url + "/slow", "POST", body="{}")
+
+    def test_a_run_cancelled_before_sending_sends_nothing(self):
+        token = gee_session._call_cancelled.set(lambda: True)
+        self.addCleanup(gee_session._call_cancelled.reset, token)
+
+        with self.assertRaises(RequestCancelled):
+            self.transport.request(self.server.url, "POST", body="{}")
+
+        self.assertEqual(self.server.requests, 0)
+
+    def test_starting_a_new_task_frees_the_previous_ones_request(self):
+        # Given: a dock task blocked on a slow request.
+        lifecycle = TaskLifecycle()
+        previous = FakeTask()
+        lifecycle.start(previous)
+        results = []
+        worker = threading.Thread(target=lambda: results.append(get_info(self.slow, cancelled=previous.isCanceled)))
+        worker.start()
+        while self.server.requests < 1:
+            time.sleep(0.01)
+
+        # When: the user picks another point, which starts a new task.
+        lifecycle.start(FakeTask())
+
+        # Then: the previous task's request is abandoned at once and its thread is free.
+        worker.join(timeout=2)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(results, [None])
+
+
+class EndpointUrlTest(unittest.TestCase):
+    def test_interactive_mode_keeps_the_default_endpoint(self):
+        # Then: a custom URL without high-volume mode is ignored, so ee picks its own default.
+        self.assertIsNone(endpoint_url(False, "https://example.test"))
+
+    def test_high_volume_mode_defaults_to_googles_endpoint(self):
+        self.assertEqual(endpoint_url(True), HIGH_VOLUME_URL)
+        self.assertEqual(endpoint_url(True, "  "), HIGH_VOLUME_URL)
+
+    def test_a_custom_high_volume_url_is_normalized(self):
+        self.assertEqual(endpoint_url(True, " https://example.test/ "), "https://example.test")
+
+
+class InitializeEarthEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        state = {"initialized": False}
+
+        def initialize(url=None, http_transport=None):
+            # slow enough for a second thread to reach the check meanwhile
+            time.sleep(0.01)
+            self.calls.append(url)
+            state["initialized"] = True
+
+        data = types.SimpleNamespace(is_initialized=lambda: state["initialized"], setMaxRetries=lambda retries: None)
+        fake_ee = types.SimpleNamespace(Initialize=initialize, data=data)
+        for patcher in (
+            patch.dict("sys.modules", {"ee": fake_ee}),
+            patch.object(gee_session, "shared_transport", return_value=None),
+            patch.object(gee_session, "_initialized_url", None),
+            patch.object(gee_session, "_endpoint_runs", 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_the_same_endpoint_is_initialized_once(self):
+        # Given: two threads asking for the same endpoint at once.
+        threads = [
+            threading.Thread(target=gee_session.initialize_earth_engine, args=(HIGH_VOLUME_URL,)) for _ in range(2)
+        ]
+
+        # When: both connect.
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Then: ee was initialized once.
+        self.assertEqual(self.calls, [HIGH_VOLUME_URL])
+
+    def test_a_pick_during_a_batch_keeps_the_batchs_endpoint(self):
+        # Given: a batch running on the high-volume endpoint.
+        with gee_session.endpoint_run(HIGH_VOLUME_URL):
+            # When: a point is picked meanwhile.
+            gee_session.initialize_earth_engine()
+
+        # Then: ee was not re-initialized under the batch.
+        self.assertEqual(self.calls, [HIGH_VOLUME_URL])
+
+    def test_a_pick_after_a_batch_goes_back_to_the_default_endpoint(self):
+        # Given: a batch that ran on the high-volume endpoint.
+        with gee_session.endpoint_run(HIGH_VOLUME_URL):
+            pass
+
+        # When: a point is picked afterwards.
+        with gee_session.endpoint_run():
+            pass
+
+        # Then: the pick runs on ee's default endpoint.
+        self.assertEqual(self.calls, [HIGH_VOLUME_URL, None])
+
+    def test_a_batch_does_not_switch_under_a_pick_in_flight(self):
+        # Given: a pick running on the default endpoint.
+        with gee_session.endpoint_run():
+            # When: a batch starts meanwhile.
+            with gee_session.endpoint_run(HIGH_VOLUME_URL):
+                pass
+
+            # Then: it ran on the pick's endpoint.
+            self.assertEqual(self.calls, [None])
+
+        # And: the next batch switches.
+        gee_session.initialize_earth_engine(HIGH_VOLUME_URL)
+        self.assertEqual(self.calls, [None, HIGH_VOLUME_URL])
+
+
+class ConcurrencyLimitTest(unittest.TestCase):
+    def run_concurrently(self, limit, jobs):
+        """Peak number of jobs holding a slot at once."""
+        peak = active = 0
+        lock = threading.Lock()
+
+        def job():
+            nonlocal peak, active
+            with limit.slot():
+                with lock:
+                    active += 1
+                    peak = max(peak, active)
+                threading.Event().wait(0.02)
+                with lock:
+                    active -= 1
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(lambda _: job(), range(jobs)))
+        return peak
+
+    def test_no_more_than_the_limit_hold_a_slot(self):
+        # Then: twelve batch points under a limit of three never run more than three at once.
+        self.assertLessEqual(self.run_concurrently(ConcurrencyLimit(3), 12), 3)
+
+    def test_the_limit_can_be_raised_and_is_clamped(self):
+        # Given: a limit changed from the advanced settings.
+        limit = ConcurrencyLimit(1)
+
+        # When: it is raised, or set beyond what the endpoint accepts.
+        limit.set_limit(6)
+        raised = limit.limit
+        limit.set_limit(10_000)
+
+        # Then: the new size applies, within bounds.
+        self.assertEqual(raised, 6)
+        self.assertEqual(limit.limit, gee_session.MAX_BATCH_CONCURRENCY)
+        limit.set_limit(0)
+        self.assertEqual(limit.limit, 1)
+
+    def test_a_cancelled_waiter_gives_up_without_a_slot(self):
+        # Given: every slot taken.
+        limit = ConcurrencyLimit(1)
+        self.assertTrue(limit.acquire())
+
+        # When: a waiter is cancelled before one frees up.
+        with limit.slot(cancelled=lambda: True) as acquired:
+            pass
+
+        # Then: it did not get one, and releasing the holder frees the only slot.
+        self.assertFalse(acquired)
+        limit.release()
+        self.assertTrue(limit.acquire(poll_seconds=0.01))
+
+
+class SharedExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(shutdown_executor)
+
+    def test_every_caller_gets_the_same_bounded_pool(self):
+        # When: two callers (two docks, or a dock and a batch job) ask for the pool.
+        first, second = shared_executor(), shared_executor()
+
+        # Then: they share one pool of a fixed size.
+        self.assertIs(first, second)
+        self.assertEqual(first._max_workers, gee_session.EXECUTOR_MAX_WORKERS)
+
+    def test_shutdown_hands_out_a_fresh_pool_next_time(self):
+        # Given: a pool that was released on unload.
+        released = shared_executor()
+        shutdown_executor()
+
+        # Then: the next caller gets a working pool rather than a shut-down one.
+        fresh = shared_executor()
+        self.assertIsNot(fresh, released)
+        self.assertEqual(fresh.submit(lambda: 42).result(timeout=2), 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
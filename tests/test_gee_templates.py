@@ -0,0 +1,107 @@
+import sys
+import types
+import unittest
+
+from core import gee_templates
+from core.diagnostics import RunDiagnostics
+from core.gee_templates import PLACEHOLDER_COORDS, GraphTemplate, clear_templates, templated_collection
+
+
+def _restore_module(name, previous):
+    if previous is None:
+        sys.modules.pop(name, None)
+    else:
+        sys.modules[name] = previous
+
+
+def _encoded_graph(coords):
+    """The shape of a cloud-API encoding: the point appears once per use, as a constant."""
+    point = {
+        "functionInvocationValue": {
+            "functionName": "GeometryConstructors.Point",
+            "arguments": {"coordinates": {"constantValue": list(coords)}},
+        }
+    }
+    return {"result": "0", "values": {"0": {"filterBounds": point, "join": [point, {"constantValue": [1.0, 2.0]}]}}}
+
+
+class GraphTemplateTest(unittest.TestCase):
+    def test_every_use_of_the_point_is_substituted(self):
+        # Given: a graph that references the point twice, next to an unrelated coordinate pair.
+        template = GraphTemplate(_encoded_graph(PLACEHOLDER_COORDS))
+
+        # When: it is instantiated for a real point.
+        expression = template.instantiate((-75.5, 4.25))
+
+        # Then: both uses carry the point and nothing else was touched.
+        self.assertEqual(expression, _encoded_graph((-75.5, 4.25)))
+
+    def test_instances_do_not_share_state(self):
+        # Given: one template instantiated for two points.
+        template = GraphTemplate(_encoded_graph(PLACEHOLDER_COORDS))
+        first = template.instantiate((1.0, 2.0))
+
+        # When: a second point is substituted.
+        template.instantiate((3.0, 4.0))
+
+        # Then: the first expression still holds its own point.
+        self.assertEqual(first, _encoded_graph((1.0, 2.0)))
+
+    def test_a_graph_without_the_point_is_refused(self):
+        # Then: a template that would silently return the same graph for every point cannot exist.
+        with self.assertRaises(ValueError):
+            GraphTemplate({"result": "0", "values": {}})
+
+
+class TemplatedCollectionTest(unittest.TestCase):
+    def setUp(self):
+        clear_templates()
+        self.addCleanup(clear_templates)
+        module = types.ModuleType("ee")
+        module.serializer = types.SimpleNamespace(encode=lambda graph, for_cloud_api: graph)
+        module.deserializer = types.SimpleNamespace(decodeCloudApi=lambda expression: expression)
+        module.ImageCollection = lambda decoded: ("collection", decoded)
+        self.addCleanup(_restore_module, "ee", sys.modules.get("ee"))
+        sys.modules["ee"] = module
+        self.builds = []
+
+    def build(self, coords):
+        self.builds.append(coords)
+        return _encoded_graph(coords)
+
+    def test_the_graph_is_built_once_per_configuration(self):
+        # Given: two points queried with the same configuration.
+        diagnostics = RunDiagnostics()
+
+        # When: both collections are requested.
+        first = templated_collection("landsat", (1.0, 2.0), self.build, diagnostics)
+        second = templated_collection("landsat", (3.0, 4.0), self.build, diagnostics)
+
+        # Then: the builder ran once, around the placeholder, and each point got its own graph.
+        self.assertEqual(self.builds, [PLACEHOLDER_COORDS])
+        self.assertEqual(first, ("collection", _encoded_graph((1.0, 2.0))))
+        self.assertEqual(second, ("collection", _encoded_graph((3.0, 4.0))))
+        self.assertEqual(diagnostics.counters, {"graph_template_misses": 1, "graph_template_hits": 1})
+        self.assertIn("graph_build", diagnostics.timings)
+        self.assertIn("graph_instantiate", diagnostics.timings)
+
+    def test_a_different_configuration_builds_its_own_graph(self):
+        # When: the same point is queried under two configurations.
+        templated_collection("landsat", (1.0, 2.0), self.build)
+        templated_collection("sentinel", (1.0, 2.0), self.build)
+
+        # Then: each configuration traced its own graph.
+        self.assertEqual(len(self.builds), 2)
+
+    def test_templates_are_bounded(self):
+        # When: more configurations are seen than the cache holds.
+        for index in range(gee_templates.TEMPLATE_MAX_ENTRIES + 3):
+            templated_collection(("config", index), (1.0, 2.0), self.build)
+
+        # Then: the oldest ones were evicted.
+        self.assertEqual(len(gee_templates._templates), gee_templates.TEMPLATE_MAX_ENTRIES)
+        self.assertNotIn(("config", 0), gee_templates._templates)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+
+import numpy as np
+
+from core.gee_data_landsat import MaskProfile
+from core.landsat_masks import apply_mask_profile, observation_mask, sensor_of
+
+CLEAR_TM = 0b0000_0000_0100_0000  # bit 6: clear
+CLOUD = 1 << 3
+CIRRUS = 1 << 2
+HIGH_AEROSOL = 0b1100_0000
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def raw_series(rows):
+    """A raw_qa series from (id, QA_PIXEL, QA_RADSAT, AEROSOL, reflectance) rows."""
+    columns = {
+        "id": np.array([row[0] for row in rows], dtype=object),
+        "time": np.arange(len(rows), dtype=float) * DAY_MS,
+    }
+    for band in ("Blue", "Green", "Red", "NIR", "SWIR1", "SWIR2"):
+        columns[band] = np.array([row[4] for row in rows], dtype=float)
+    for index, band in enumerate(("QA_PIXEL", "QA_RADSAT", "AEROSOL"), start=1):
+        columns[band] = np.array([np.nan if row[index] is None else row[index] for row in rows], dtype=float)
+    return columns
+
+
+class ObservationMaskTest(unittest.TestCase):
+    def test_the_default_profile_applies_the_server_rules(self):
+        series = raw_series(
+            [
+                ("1_LT05_a", CLEAR_TM, 0, 100, 0.2),  # clear
+                ("1_LT05_b", CLOUD, 0, 100, 0.2),  # cloud
+                ("1_LT05_c", CLEAR_TM, 1, 100, 0.2),  # Blue saturated
+                ("1_LT05_d", CLEAR_TM, 0, 400, 0.2),  # hazy: opacity 0.4
+                ("1_LT05_e", CLEAR_TM, 0, None, 0.2),  # no opacity retrieval: kept, as unmask() does
+                ("1_LT05_f", CLEAR_TM, 0, 100, 1.2),  # above the valid range
+                ("3_LC08_g", CIRRUS, 0, 0, 0.2),  # cirrus, flagged on OLI only
+                ("3_LC08_h", 0, 0, HIGH_AEROSOL, 0.2),  # high aerosol
+                ("3_LC08_i", 0, 0, 0b0100_0000, 0.2),  # low aerosol
+            ]
+        )
+
+        self.assertEqual(
+            observation_mask(series).tolist(), [True, False, False, False, True, False, False, False, True]
+        )
+
+    def test_a_profile_can_relax_a_rule_without_another_fetch(self):
+        # Given: the hazy and saturated observations the default profile rejects.
+        series = raw_series([("1_LT05_d", CLEAR_TM, 0, 400, 0.2), ("1_LT05_c", CLEAR_TM, 1, 100, 0.2)])
+
+        # When: they are masked under profiles that skip those tests.
+        # Then: each keeps the observation its rule no longer rejects.
+        self.assertEqual(observation_mask(series, MaskProfile(haze=False)).tolist(), [True, False])
+        self.assertEqual(observation_mask(series, MaskProfile(saturation=False)).tolist(), [False, True])
+
+    def test_a_profile_can_reject_more_bits(self):
+        # Given: a clear TM scene flagged with medium cloud confidence (bits 8-9 = 0b10).
+        series = raw_series([("1_LT05_a", CLEAR_TM | (0b10 << 8), 0, 100, 0.2)])
+
+        self.assertTrue(observation_mask(series)[0])
+        self.assertFalse(observation_mask(series, MaskProfile(qa_pixel_bits=(0, 1, 3, 4, 5, 9)))[0])
+
+    def test_a_scene_from_an_unknown_sensor_or_without_qa_is_rejected(self):
+        series = raw_series([("mystery", 0, 0, 0, 0.2), ("1_LT05_a", None, 0, 100, 0.2)])
+
+        self.assertEqual(observation_mask(series).tolist(), [False, False])
+        self.assertIsNone(sensor_of("mystery"))
+
+
+class ApplyMaskProfileTest(unittest.TestCase):
+    def test_the_result_looks_like_a_masked_fetch(self):
+        series = raw_series([("1_LT05_a", CLEAR_TM, 0, 100, 0.2), ("1_LT05_b", CLOUD, 0, 100, 0.2)])
+
+        masked = apply_mask_profile(series, indices=("NDVI",))
+
+        # Then: the rejected scene keeps its row with no values, and the QA columns are gone.
+        self.assertEqual(masked["Red"][0], 0.2)
+        self.assertTrue(np.isnan(masked["Red"][1]))
+        self.assertTrue(np.isnan(masked["NDVI"][1]))
+        self.assertNotIn("QA_PIXEL", masked)
+        self.assertEqual(len(masked["time"]), 2)
+
+    def test_overlapping_rows_of_one_day_collapse_to_the_clear_one(self):
+        # Given: one TM overpass seen on two rows, cloudy on the first, and an OLI scene that day.
+        series = raw_series(
+            [("1_LT05_a", CLOUD, 0, 100, 0.4), ("1_LT05_b", CLEAR_TM, 0, 100, 0.2), ("3_LC08_c", 0, 0, 0, 0.3)]
+        )
+        series["time"][:] = 0
+
+        masked = apply_mask_profile(series)
+
+        # Then: the TM day is one observation, the clear row's under the first row's id, and the
+        # other sensor keeps its own.
+        self.assertEqual(masked["Red"].tolist(), [0.2, 0.3])
+        self.assertEqual(masked["id"].tolist(), ["1_LT05_a", "3_LC08_c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,7 +2,7 @@ import tempfile
 import unittest
 from pathlib import Path
 
-from core.lifecycle import PlotFileLifecycle, PlotLoadController, TaskLifecycle
+from core.lifecycle import PickScheduler, PlotFileLifecycle, PlotLoadController, TaskLifecycle
 
 
 class FakeTask:
@@ -151,6 +151,65 @@ class TaskLifecycleTest(unittest.TestCase):
         self.assertTrue(previous.cancelled)
         self.assertIs(lifecycle.active_task, replacement)
 
+    def test_a_previous_task_can_be_left_to_finish(self):
+        # Given: a task is already active.
+        lifecycle = TaskLifecycle()
+        previous = FakeTask()
+        replacement = FakeTask()
+        lifecycle.start(previous)
+
+        # When: a replacement starts without cancelling it.
+        left_running = lifecycle.start(replacement, cancel_previous=False)
+
+        # Then: it keeps running, handed back to the caller, but can no longer finish the lifecycle.
+        self.assertIs(left_running, previous)
+        self.assertFalse(previous.cancelled)
+        self.assertFalse(lifecycle.finish(previous))
+        self.assertIs(lifecycle.active_task, replacement)
+
+
+class PickSchedulerTest(unittest.TestCase):
+    def test_a_burst_of_picks_runs_only_the_last(self):
+        # Given: three quick clicks across the map.
+        scheduler = PickScheduler(delay_ms=300)
+        delays = [scheduler.pick({"lon": lon}) for lon in (1, 2, 3)]
+
+        # When: the debounce timer runs out.
+        latest, superseded = scheduler.fire()
+
+        # Then: every click restarted the same delay, the last point runs, and the others are handed back.
+        self.assertEqual(delays, [300, 300, 300])
+        self.assertEqual(latest, {"lon": 3})
+        self.assertEqual(superseded, [{"lon": 1}, {"lon": 2}])
+        self.assertFalse(scheduler.pending)
+
+    def test_repeated_points_are_not_superseded(self):
+        # Given: the same pixel clicked twice, around another one.
+        scheduler = PickScheduler()
+        for lon in (1, 2, 1, 1):
+            scheduler.pick({"lon": lon})
+
+        # Then: only the distinct point that was replaced comes back.
+        self.assertEqual(scheduler.fire(), ({"lon": 1}, [{"lon": 2}]))
+
+    def test_superseded_picks_are_bounded(self):
+        # Given: a long sweep of clicks.
+        scheduler = PickScheduler(max_superseded=2)
+        for lon in range(10):
+            scheduler.pick({"lon": lon})
+
+        # Then: only the most recent replaced picks are kept.
+        self.assertEqual(scheduler.fire()[1], [{"lon": 7}, {"lon": 8}])
+
+    def test_cancel_drops_everything(self):
+        scheduler = PickScheduler()
+        scheduler.pick({"lon": 1})
+        scheduler.pick({"lon": 2})
+
+        scheduler.cancel()
+
+        self.assertEqual(scheduler.fire(), (None, []))
+
 
 class PlotLoadControllerTest(unittest.TestCase):
     def test_only_matching_generation_and_url_can_commit(self):
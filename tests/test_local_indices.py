@@ -0,0 +1,96 @@
+import unittest
+
+import numpy as np
+
+from core.gee_data_landsat import TC_OLI, TC_TM
+from core.gee_data_sentinel import TC_S2
+from core.local_indices import index_columns, with_indices
+
+# one clear vegetated observation per sensor family, then a masked one
+OPTICAL = {
+    "Blue": [0.03, 0.03, np.nan],
+    "Green": [0.06, 0.06, np.nan],
+    "Red": [0.04, 0.04, np.nan],
+    "NIR": [0.35, 0.35, np.nan],
+    "SWIR1": [0.18, 0.18, np.nan],
+    "SWIR2": [0.09, 0.09, np.nan],
+}
+
+
+def series(ids, **overrides):
+    columns = {"id": np.array(ids, dtype=object), "time": np.arange(len(ids), dtype=float)}
+    columns.update({band: np.array(values[: len(ids)], dtype=float) for band, values in OPTICAL.items()})
+    columns.update({band: np.array(values, dtype=float) for band, values in overrides.items()})
+    return columns
+
+
+class IndexColumnsTest(unittest.TestCase):
+    def test_the_ratios_match_the_earth_engine_arithmetic(self):
+        columns = index_columns(series(["1_LT05_008058_19900101"]), ["NDVI", "NBR", "EVI", "EVI2"], "Landsat C2")
+
+        self.assertAlmostEqual(columns["NDVI"][0], (0.35 - 0.04) / (0.35 + 0.04))
+        self.assertAlmostEqual(columns["NBR"][0], (0.35 - 0.09) / (0.35 + 0.09))
+        self.assertAlmostEqual(columns["EVI"][0], 2.5 * 0.31 / (0.35 + 0.24 - 0.225 + 1))
+        self.assertAlmostEqual(columns["EVI2"][0], 2.5 * 0.31 / (0.35 + 0.096 + 1))
+
+    def test_a_masked_observation_stays_masked_in_every_index(self):
+        columns = index_columns(series(["1_LT05_a", "1_LT05_b", "1_LT05_c"]), ["NDVI", "EVI", "WETNESS"], "Landsat C2")
+
+        for name, values in columns.items():
+            with self.subTest(index=name):
+                self.assertTrue(np.isnan(values[2]))
+
+    def test_normalized_differences_mask_negative_inputs_like_earth_engine(self):
+        # Given: a dark water pixel with a slightly negative retrieval in the red band.
+        columns = index_columns(series(["1_LT05_a"], Red=[-0.01]), ["NDVI"], "Landsat C2")
+
+        # Then: normalizedDifference would have masked it, so it is NaN here too.
+        self.assertTrue(np.isnan(columns["NDVI"][0]))
+
+    def test_evi_is_clamped_to_the_index_range(self):
+        # Given: a hazy cloud edge that drives the EVI denominator towards zero.
+        columns = index_columns(series(["1_LT05_a"], Blue=[0.17], Red=[0.01], NIR=[0.3]), ["EVI"], "Landsat C2")
+
+        self.assertEqual(columns["EVI"][0], 1.0)
+
+    def test_tasseled_cap_uses_each_scenes_sensor(self):
+        # Given: a TM scene and an OLI scene with identical reflectance, merged into one series.
+        ids = ["1_LT05_008058_19900101", "3_LC08_008058_20150101"]
+        columns = index_columns(series(ids), ["BRIGHTNESS"], "Landsat C2")
+
+        # Then: each got its own sensor's coefficients.
+        reflectance = np.array([OPTICAL[band][0] for band in ("Blue", "Green", "Red", "NIR", "SWIR1", "SWIR2")])
+        self.assertAlmostEqual(columns["BRIGHTNESS"][0], reflectance @ TC_TM["BRIGHTNESS"], places=6)
+        self.assertAlmostEqual(columns["BRIGHTNESS"][1], reflectance @ TC_OLI["BRIGHTNESS"], places=6)
+
+    def test_sentinel_2_has_one_set_of_coefficients(self):
+        columns = index_columns(series(["20200101T152639_20200101T152636_T18NWL"]), ["GREENNESS"], "Sentinel-2")
+
+        reflectance = np.array([OPTICAL[band][0] for band in ("Blue", "Green", "Red", "NIR", "SWIR1", "SWIR2")])
+        self.assertAlmostEqual(columns["GREENNESS"][0], reflectance @ TC_S2["GREENNESS"], places=6)
+
+    def test_a_scene_from_an_unknown_sensor_gets_no_tasseled_cap(self):
+        self.assertTrue(np.isnan(index_columns(series(["mystery"]), ["WETNESS"], "Landsat C2")["WETNESS"][0]))
+
+
+class WithIndicesTest(unittest.TestCase):
+    def test_only_missing_columns_are_added_and_the_cached_series_is_untouched(self):
+        # Given: a cached series that already carries an NDVI column from Earth Engine.
+        cached = series(["1_LT05_a"], NDVI=[0.5])
+
+        # When: a view needing NDVI and NBR derives what it lacks.
+        derived = with_indices(cached, ["NDVI", "NBR"], "Landsat C2")
+
+        # Then: NBR is added, Earth Engine's NDVI is kept, and the cache entry is not modified.
+        self.assertEqual(derived["NDVI"][0], 0.5)
+        self.assertIn("NBR", derived)
+        self.assertNotIn("NBR", cached)
+
+    def test_an_empty_series_derives_empty_columns(self):
+        derived = with_indices(series([]), ["NDVI", "BRIGHTNESS"], "Landsat C2")
+
+        self.assertEqual(derived["BRIGHTNESS"].shape, (0,))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from core.pixel_grid import NEIGHBOUR_STEPS, north_step, pixel_centre, pixel_of, step, utm_xy, utm_zone, zone_of
+
+# a Landsat UTM grid: 30 m pixels, north-up, origin on the 15 m panchromatic lattice
+LANDSAT = (30, 0, 344985, 0, -30, 4500015)
+
+
+class PixelGridTest(unittest.TestCase):
+    def test_a_point_falls_in_the_pixel_whose_bounds_hold_it(self):
+        # Given: a point just inside the second column and third row of the grid.
+        # Then: it belongs to that pixel, whose centre is 15 m in from its corner.
+        self.assertEqual(pixel_of(345015.5, 4499954.5, LANDSAT), (1, 2))
+        self.assertEqual(pixel_centre(1, 2, LANDSAT), (345030.0, 4499940.0))
+
+    def test_stepping_lands_on_the_next_pixel_centre_wherever_the_point_was(self):
+        # Given: two points in the same pixel, one near a corner and one near the centre.
+        # When: each is stepped one column east.
+        # Then: both land on the same centre, exactly one pixel over.
+        self.assertEqual(step(345016, 4499954, LANDSAT, 1, 0), (345060.0, 4499940.0))
+        self.assertEqual(step(345029, 4499941, LANDSAT, 1, 0), (345060.0, 4499940.0))
+
+    def test_north_is_up_the_rows_on_a_north_up_grid(self):
+        # Given: the usual grid, whose rows run south, and one flipped to run north.
+        self.assertEqual(north_step(LANDSAT), -1)
+        self.assertEqual(north_step((30, 0, 0, 0, 30, 0)), 1)
+
+        # Then: stepping north on the usual grid raises y by a pixel.
+        _, y = step(345030, 4499940, LANDSAT, 0, north_step(LANDSAT))
+        self.assertEqual(y, 4499970.0)
+
+    def test_the_neighbours_are_the_eight_pixels_around_one(self):
+        self.assertEqual(len(set(NEIGHBOUR_STEPS)), 8)
+        self.assertNotIn((0, 0), NEIGHBOUR_STEPS)
+        self.assertTrue(all(max(abs(column), abs(row)) == 1 for column, row in NEIGHBOUR_STEPS))
+
+
+class UtmTest(unittest.TestCase):
+    def test_points_project_as_the_kruger_series_places_them(self):
+        # Given: points north and south of the equator, some on the zone edge 3° off the central
+        # meridian and at the ends of the UTM latitudes, and their coordinates from Krüger's series.
+        # Then: the projection agrees to the millimetre.
+        for (lon, lat, zone, southern), expected in (
+            ((2.2945, 48.8584, 31, False), (448252.0014, 5411954.9099)),
+            ((151.2153, -33.8568, 56, True), (334900.5697, 6252288.7529)),
+            ((-75, 4.6, 18, False), (500000.0, 508449.1679)),
+            ((-72, 0, 18, False), (833978.5569, 0.0)),
+            ((-72, 60, 18, False), (667294.8211, 6655205.4836)),
+            ((-72, 84, 18, False), (534994.6551, 9329005.1824)),
+            ((-72, -80, 18, True), (558132.2151, 1116915.0441)),
+        ):
+            x, y = utm_xy(lon, lat, zone, southern)
+            self.assertAlmostEqual(x, expected[0], delta=0.001)
+            self.assertAlmostEqual(y, expected[1], delta=0.001)
+
+    def test_zones_come_from_the_crs_code_or_the_longitude(self):
+        self.assertEqual(utm_zone("EPSG:32618"), (18, False))
+        self.assertEqual(utm_zone("epsg:32756"), (56, True))
+        self.assertIsNone(utm_zone("EPSG:4326"))
+        self.assertEqual(zone_of(-74.1, 4.6), (18, False))
+        self.assertEqual(zone_of(180, -1), (60, True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import ast
 import math
+import sys
 import tempfile
 import unittest
 from itertools import pairwise
@@ -33,6 +34,7 @@ from core.plot import (
     sample_segment_dates,
     write_plot_html,
 )
+from core.plot_data import CCDC_COEFFICIENT_COUNT, CcdcResult, refit_harmonic_model
 
 
 def _representative_figure(style=PlotStyle.LIGHT):
@@ -209,6 +211,165 @@ class PlotHelpersTest(unittest.TestCase):
         self.assertEqual(segments[0].end_ms, 50.0)
 
 
+class CcdcResultTest(unittest.TestCase):
+    day_ms = 24 * 60 * 60 * 1000
+
+    def result_info(self, segments=3):
+        """A reduceRegion(toList()) CCDC result with `segments` segments of two bands."""
+        bounds = [index * 400.0 * self.day_ms for index in range(segments + 1)]
+        return {
+            "tStart": [bounds[:-1]],
+            "tEnd": [bounds[1:]],
+            "tBreak": [[*bounds[1:-1], 0]],
+            "changeProb": [[1.0] * (segments - 1) + [0.0]],
+            "numObs": [[40] * segments],
+            "B4_coefs": [[[0.1 * index] * 8 for index in range(segments)]],
+            "B4_rmse": [[0.01] * segments],
+            "B4_magnitude": [[0.05] * segments],
+            "B5_coefs": [[[0.2] * 8] * segments],
+            "B5_rmse": [[None] * segments],
+        }
+
+    def test_the_lists_are_parsed_into_segment_arrays(self):
+        result = CcdcResult(self.result_info())
+
+        self.assertEqual(result.segments, 3)
+        self.assertEqual(result.bands, ("B4", "B5"))
+        self.assertEqual(result.coefficients.shape, (3, 2, 8))
+        self.assertEqual(result.rmse[:, 0].tolist(), [0.01] * 3)
+        # And: an unreported value, and a magnitude CCDC gives only for breakpoint bands, are NaN.
+        self.assertTrue(np.isnan(result.rmse[:, 1]).all())
+        self.assertTrue(np.isnan(result.magnitude[:, 1]).all())
+
+    def test_it_reads_back_as_the_dict_it_was_parsed_from(self):
+        result_info = self.result_info()
+
+        self.assertEqual(dict(CcdcResult(result_info)), result_info)
+        self.assertNotIn("B5_magnitude", CcdcResult(result_info))
+
+    def test_a_masked_pixel_reads_back_empty(self):
+        # Given: reduceRegion over a masked pixel, every layer an empty list.
+        result_info = {name: [] for name in self.result_info()}
+
+        result = CcdcResult(result_info)
+
+        # Then: no segments, and the empty layers come back as they were, so they stay falsy.
+        self.assertEqual(result.segments, 0)
+        self.assertEqual(dict(result), result_info)
+        self.assertFalse(result.get("tBreak"))
+
+    def test_segments_are_built_the_same_from_the_parsed_result(self):
+        result_info = self.result_info()
+
+        parsed = build_model_segments(CcdcResult(result_info), "B4")
+        raw = build_model_segments(result_info, "B4")
+
+        self.assertEqual([segment.break_ms for segment in parsed], [400.0 * self.day_ms, 800.0 * self.day_ms, None])
+        for left, right in zip(parsed, raw, strict=True):
+            np.testing.assert_array_equal(left.values, right.values)
+            self.assertEqual(
+                (left.number, left.rmse, left.change_probability), (right.number, right.rmse, right.change_probability)
+            )
+
+    def test_it_holds_a_fraction_of_the_nested_lists(self):
+        # Given: a long run of 30 segments, the size of its lists counted object by object.
+        result_info = self.result_info(30)
+
+        def size(value):
+            if isinstance(value, list):
+                return sys.getsizeof(value) + sum(size(item) for item in value)
+            return sys.getsizeof(value)
+
+        self.assertLess(CcdcResult(result_info).nbytes * 3, sum(size(value) for value in result_info.values()))
+
+    def test_a_refit_merges_into_a_new_result(self):
+        # Given: a parsed result and a locally fitted band it lacks.
+        result = CcdcResult(self.result_info())
+
+        merged = result.merged({"NDVI_coefs": [[[0.5] * 8] * 3], "NDVI_rmse": [[0.02] * 3]})
+
+        self.assertEqual(merged.bands, ("B4", "B5", "NDVI"))
+        self.assertNotIn("NDVI_coefs", result)
+        with self.assertRaises(ValueError):
+            merged.coefficients[0, 0, 0] = 1.0
+
+
+class RefitHarmonicModelTest(unittest.TestCase):
+    day_ms = 24 * 60 * 60 * 1000
+
+    def series(self, coefficients, start_ms, days):
+        times = start_ms + np.arange(0, days, 8) * self.day_ms
+        return times, evaluate_ccdc_model(times, coefficients)
+
+    def test_a_noiseless_segment_gives_back_the_model_it_was_drawn_from(self):
+        # Given: eight years of observations drawn exactly from a full harmonic model.
+        truth = [0.3, 1e-13, 0.05, -0.02, 0.01, 0.004, -0.003, 0.002]
+        start = 1_400_000_000_000
+        times, values = self.series(truth, start, 8 * 365)
+        result_info = {"tStart": [[start]], "tEnd": [[times[-1]]]}
+
+        # When: the model is refitted for that band.
+        refit = refit_harmonic_model(result_info, {"time": times, "NDVI": values}, ["NDVI"])
+
+        # Then: the coefficients evaluate to the same curve, with no residual.
+        fitted = refit["NDVI_coefs"][0][0]
+        np.testing.assert_allclose(evaluate_ccdc_model(times, fitted), values, atol=1e-9)
+        self.assertAlmostEqual(refit["NDVI_rmse"][0][0], 0.0, places=9)
+
+    def test_every_segment_and_band_is_fitted_on_its_own_observations(self):
+        # Given: two segments at different levels, and a band with a masked observation.
+        first, second = [0.2, 0, 0, 0, 0, 0, 0, 0], [0.6, 0, 0, 0, 0, 0, 0, 0]
+        times_a, values_a = self.series(first, 1_300_000_000_000, 3 * 365)
+        times_b, values_b = self.series(second, times_a[-1] + self.day_ms, 3 * 365)
+        times, red = np.concatenate([times_a, times_b]), np.concatenate([values_a, values_b])
+        nir = red * 2
+        nir[3] = np.nan
+        result_info = {"tStart": [[times_a[0], times_b[0]]], "tEnd": [[times_a[-1], times_b[-1]]]}
+
+        # When: both bands are refitted at once.
+        refit = refit_harmonic_model(result_info, {"time": times, "Red": red, "NIR": nir}, ["Red", "NIR"])
+
+        # Then: each segment and each band has its own level, and the masked value was ignored.
+        segments = build_model_segments(refit | result_info, "NIR")
+        self.assertEqual(len(segments), 2)
+        np.testing.assert_allclose(segments[0].values, 0.4, atol=1e-9)
+        np.testing.assert_allclose(segments[1].values, 1.2, atol=1e-9)
+        np.testing.assert_allclose(build_model_segments(refit | result_info, "Red")[1].values, 0.6, atol=1e-9)
+
+    def test_a_short_segment_uses_a_smaller_model_and_a_tiny_one_none(self):
+        # Given: a segment with 14 observations and one with 2.
+        times = 1_300_000_000_000 + np.arange(16) * 16 * self.day_ms
+        values = np.linspace(0.1, 0.2, 16)
+        result_info = {"tStart": [[times[0], times[14]]], "tEnd": [[times[13], times[15]]]}
+
+        refit = refit_harmonic_model(result_info, {"time": times, "EVI": values}, ["EVI"])
+
+        # Then: the first keeps only intercept, slope and the annual term, the second is not drawn.
+        short, tiny = refit["EVI_coefs"][0]
+        self.assertEqual(short[4:], [0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(tiny, [None] * CCDC_COEFFICIENT_COUNT)
+        self.assertEqual(len(build_model_segments(refit | result_info, "EVI")), 1)
+
+    def test_no_model_is_fitted_below_the_observations_ccdc_needs(self):
+        # Given: a segment of 11 observations, enough to pass four coefficients through, and one of 14.
+        times = 1_300_000_000_000 + np.arange(25) * 16 * self.day_ms
+        values = np.sin(np.arange(25))
+        result_info = {"tStart": [[times[0], times[11]]], "tEnd": [[times[10], times[24]]]}
+        timeseries = {"time": times, "EVI": values}
+
+        refit = refit_harmonic_model(result_info, timeseries, ["EVI"])
+        strict = refit_harmonic_model(result_info, timeseries, ["EVI"], num_obs=15)
+
+        # Then: the first has no model rather than one with no residual, and a higher num_obs drops both.
+        self.assertEqual(refit["EVI_rmse"][0][0], None)
+        self.assertGreater(refit["EVI_rmse"][0][1], 0)
+        self.assertEqual(strict["EVI_rmse"], [[None, None]])
+        self.assertEqual(build_model_segments(strict | result_info, "EVI"), [])
+
+    def test_a_run_without_segments_refits_nothing(self):
+        self.assertEqual(refit_harmonic_model({}, {"time": [1.0], "NDVI": [0.5]}, ["NDVI"]), {})
+
+
 class PlotFigureTest(unittest.TestCase):
     def test_light_theme_preserves_existing_exact_color_values(self):
         # Given: the established Light chart palette.
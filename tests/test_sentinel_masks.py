@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from core.gee_data_sentinel import CLOUD_FILTERS
+from core.sentinel_masks import apply_cloud_filter, filter_mask
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def flags(*kept_by):
+    return sum(1 << CLOUD_FILTERS.index(cloud_filter) for cloud_filter in kept_by)
+
+
+def flagged_series(values):
+    """A filter_flags series with one observation per CLOUD_FLAGS value (None: masked at the point)."""
+    columns = {"id": np.array([f"2020010{i + 1}T152639_T18NWL" for i in range(len(values))], dtype=object)}
+    columns["time"] = np.arange(len(values), dtype=float) * DAY_MS
+    for band in ("Blue", "Green", "Red", "NIR", "SWIR1", "SWIR2"):
+        columns[band] = np.full(len(values), 0.2)
+    columns["CLOUD_FLAGS"] = np.array([np.nan if value is None else value for value in values], dtype=float)
+    return columns
+
+
+class FilterMaskTest(unittest.TestCase):
+    def test_each_filter_reads_its_own_verdict(self):
+        # Given: a clear scene, one only Sen2Cor misses the cloud in, and one masked at the point.
+        series = flagged_series([flags(*CLOUD_FILTERS), flags("Sen2Cor", "No Mask"), None])
+
+        # Then: every filter is answered by the one fetch.
+        self.assertEqual(filter_mask(series, "Cloud Score+").tolist(), [True, False, False])
+        self.assertEqual(filter_mask(series, "s2cloudless").tolist(), [True, False, False])
+        self.assertEqual(filter_mask(series, "Sen2Cor").tolist(), [True, True, False])
+        self.assertEqual(filter_mask(series, "No Mask").tolist(), [True, True, False])
+
+    def test_an_unknown_filter_is_refused(self):
+        with self.assertRaises(ValueError):
+            filter_mask(flagged_series([0]), "Fmask")
+
+
+class ApplyCloudFilterTest(unittest.TestCase):
+    def test_the_result_looks_like_a_masked_fetch(self):
+        series = flagged_series([flags(*CLOUD_FILTERS), flags("No Mask")])
+
+        filtered = apply_cloud_filter(series, "Cloud Score+", indices=("NDVI",))
+
+        self.assertEqual(filtered["Red"][0], 0.2)
+        self.assertTrue(np.isnan(filtered["Red"][1]))
+        self.assertTrue(np.isnan(filtered["NDVI"][1]))
+        self.assertNotIn("CLOUD_FLAGS", filtered)
+        # the input is left as fetched, for the next filter
+        self.assertEqual(series["Red"][1], 0.2)
+
+    def test_overlapping_tiles_of_one_pass_collapse_to_the_one_the_filter_keeps(self):
+        # Given: one pass seen on two tiles, cloudy for Cloud Score+ on the first, then a later pass.
+        series = flagged_series([flags("No Mask"), flags(*CLOUD_FILTERS), flags(*CLOUD_FILTERS)])
+        series["id"][:2] = ["20200101T152639_T18NWL", "20200101T152639_T18NXL"]
+        series["time"][:2] = 0
+        series["Red"] = np.array([0.4, 0.2, 0.3])
+
+        filtered = apply_cloud_filter(series, "Cloud Score+")
+
+        # Then: the pass is one observation, with the clear tile's values under the first tile's id.
+        self.assertEqual(filtered["Red"].tolist(), [0.2, 0.3])
+        self.assertEqual(filtered["id"][0], "20200101T152639_T18NWL")
+        # And: a filter that keeps both copies keeps the first.
+        self.assertEqual(apply_cloud_filter(series, "No Mask")["Red"].tolist(), [0.4, 0.3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import sys
+import unittest
+
+import numpy as np
+
+from core.plot_data import normalize_observations
+from core.timeseries import TimeSeries
+
+DAY_MS = 24 * 60 * 60 * 1000
+# 2015-01-01 and 2015-01-17 in epoch milliseconds, at the time of day Landsat passes over
+FIRST, SECOND = 16436 * DAY_MS + 55_000_000, 16452 * DAY_MS + 55_000_000
+
+
+def landsat_columns(count=2):
+    """A getRegion series of `count` scenes of one path/row, as _column_array returns it."""
+    times = FIRST + np.arange(count) * 16 * DAY_MS
+    dates = np.datetime_as_string(times.astype("datetime64[ms]"), unit="D")
+    return {
+        "id": np.array([f"3_LC08_008058_{date.replace('-', '')}" for date in dates], dtype=object),
+        "longitude": np.full(count, -74.1),
+        "latitude": np.full(count, 4.6),
+        "time": times.astype(float),
+        "SWIR1": np.linspace(0.1, 0.3, count),
+        "QA_PIXEL": np.full(count, 21824.0),
+    }
+
+
+class TimeSeriesTest(unittest.TestCase):
+    def test_every_column_reads_back_as_it_was_built(self):
+        columns = landsat_columns()
+        columns["SWIR1"][1] = np.nan
+
+        series = TimeSeries(columns)
+
+        # Then: the same names in the same order, ids and times exact, bands to float32 precision.
+        self.assertEqual(list(series), list(columns))
+        self.assertEqual(series["id"].tolist(), columns["id"].tolist())
+        self.assertEqual(series["id"].dtype, object)
+        self.assertEqual(series["time"].tolist(), [FIRST, SECOND])
+        np.testing.assert_array_equal(series["longitude"], [-74.1, -74.1])
+        np.testing.assert_allclose(series["SWIR1"], columns["SWIR1"], rtol=1e-6)
+        self.assertEqual(series["QA_PIXEL"].tolist(), [21824, 21824])
+        self.assertNotIn("NDVI", series)
+
+    def test_scene_ids_of_one_path_row_share_a_vocabulary_entry(self):
+        # Given: ids of one path/row, a Sentinel-2 id, and one whose date is not the scene's.
+        columns = landsat_columns(3)
+        columns["id"] = np.array(
+            ["3_LC08_008058_20150101", "20150117T152639_20150117T152636_T18NWL", "LC08_19990101"], dtype=object
+        )
+
+        series = TimeSeries(columns)
+
+        # Then: every id still reads back exactly.
+        self.assertEqual(series["id"].tolist(), columns["id"].tolist())
+        # And: a long Landsat series needs a single entry.
+        self.assertEqual(len(TimeSeries(landsat_columns(500))._text["id"][1]), 1)
+
+    def test_the_cached_form_is_several_times_smaller(self):
+        # Given: twenty years of a Landsat path/row with the usual dozen bands and indices.
+        columns = landsat_columns(460)
+        columns.update({f"band_{index}": np.random.default_rng(index).random(460) for index in range(11)})
+        as_dict = sum(column.nbytes for column in columns.values()) + sum(sys.getsizeof(i) for i in columns["id"])
+
+        self.assertLess(TimeSeries(columns).nbytes * 3, as_dict)
+
+    def test_columns_are_read_only_since_every_reader_shares_them(self):
+        series = TimeSeries(landsat_columns())
+
+        with self.assertRaises(ValueError):
+            series["SWIR1"][0] = 1.0
+
+    def test_the_plot_reads_it_like_the_column_dict(self):
+        columns = landsat_columns()
+
+        times, values = normalize_observations(TimeSeries(columns), "SWIR1")
+
+        np.testing.assert_array_equal(times, columns["time"])
+        np.testing.assert_allclose(values, columns["SWIR1"], rtol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
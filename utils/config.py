@@ -61,6 +61,14 @@ def get_plugin_config(id):
     config["min_years"] = adv.min_years.value()
     config["lambda_lasso"] = adv.lambda_lasso.value()
     config["cloud_filter"] = adv.cloud_filter.currentText()
+    config["high_volume_endpoint"] = adv.high_volume_endpoint.isChecked()
+    config["endpoint_url"] = adv.endpoint_url.text()
+    config["batch_concurrency"] = adv.batch_concurrency.value()
+    config["requests_per_second"] = adv.requests_per_second.value()
+    config["max_concurrent_requests"] = adv.max_concurrent_requests.value()
+    config["finish_superseded_in_background"] = adv.finish_superseded_in_background.isChecked()
+    config["prefetch_neighbours"] = adv.prefetch_neighbours.isChecked()
+    config["precompute_indices"] = adv.precompute_indices.isChecked()
 
     # other configurations
     config["auto_generate_plot"] = CCD_Plugin.inst[id].widget.auto_generate_plot.isChecked()
@@ -100,6 +108,23 @@ def restore_plugin_config(id, config):
     # optional: configurations saved before the cloud mask was selectable keep the default
     if "cloud_filter" in config:
         adv.cloud_filter.setCurrentText(config["cloud_filter"])
+    # optional as well: the endpoint settings came later still
+    if "high_volume_endpoint" in config:
+        adv.high_volume_endpoint.setChecked(config["high_volume_endpoint"])
+    if "endpoint_url" in config:
+        adv.endpoint_url.setText(config["endpoint_url"])
+    if "batch_concurrency" in config:
+        adv.batch_concurrency.setValue(config["batch_concurrency"])
+    if "requests_per_second" in config:
+        adv.requests_per_second.setValue(config["requests_per_second"])
+    if "max_concurrent_requests" in config:
+        adv.max_concurrent_requests.setValue(config["max_concurrent_requests"])
+    if "finish_superseded_in_background" in config:
+        adv.finish_superseded_in_background.setChecked(config["finish_superseded_in_background"])
+    if "prefetch_neighbours" in config:
+        adv.prefetch_neighbours.setChecked(config["prefetch_neighbours"])
+    if "precompute_indices" in config:
+        adv.precompute_indices.setChecked(config["precompute_indices"])
 
     # other configurations
     CCD_Plugin.inst[id].widget.auto_generate_plot.setChecked(config["auto_generate_plot"])